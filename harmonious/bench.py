@@ -0,0 +1,304 @@
+"""
+Benchmarks for the hot paths: building chords, resolving towers, debouncing
+and TUIO intake, and for how long each entry point takes to import.
+
+Each benchmark is a function that sets up its inputs and returns a callable
+doing one batch of work, and how many operations a batch is. Batches are
+repeated until a run takes at least `min_time`, and the best of `repeat`
+runs is kept, so the numbers are per operation and not skewed by a slow
+first call or a noisy neighbour.
+
+  $ python -m harmonious.bench --json bench.json
+  $ python -m harmonious.bench --compare bench.json   # exits 1 on a regression
+
+Voicings are cached (see :music.configure_cache:), so after the first batch
+a cached function only measures the cache. Those are timed twice: `[hit]`
+with the caches on, as in a long session, and `[miss]` with them off, which
+is the cost of a chord the first time it is played.
+
+Startup is timed in fresh interpreters, as `python -c 'import module'` less
+a bare `python -c pass`, so it counts every import and table an entry point
+pulls in before it can do anything. An entry point that can't be imported
+here (the connector without liblo) is recorded as skipped.
+
+Results are JSON so releases can be compared; `--compare` flags every
+benchmark that got slower than `--threshold` times its baseline.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from harmonious import music
+from harmonious.fiducials import roots, layers, make_fiducial_chord_builder
+from harmonious.music import layers_mask
+from harmonious.pads import make_debouncer
+from harmonious.tuio import TuioSession
+
+Case = Tuple[Callable[[], None], int]
+
+BENCHMARKS : Dict[str, Callable[[], Case]] = {}
+
+def benchmark(name: str):
+  """register a benchmark: a function returning (one batch of work, operations per batch)"""
+  def register(setup):
+    BENCHMARKS[name] = setup
+    return setup
+  return register
+
+
+def cached_benchmark(name: str):
+  """register a benchmark of something the voicing caches serve as `name[hit]` and `name[miss]`"""
+  def register(setup):
+    BENCHMARKS[f'{name}[hit]'] = setup
+    BENCHMARKS[f'{name}[miss]'] = lambda: uncached(*setup())
+    return setup
+  return register
+
+
+def uncached(batch: Callable[[], None], ops: int) -> Case:
+  def cold():
+    size = music.cache_size()
+    music.configure_cache(0)
+    try:
+      batch()
+    finally:
+      music.configure_cache(size)
+  return cold, ops
+
+
+def measure(setup: Callable[[], Case], repeat: int = 5, min_time: float = 0.05) -> dict:
+  """time a benchmark, returning the best and median seconds per operation"""
+  batch, ops = setup()
+  batch()
+  number = 1
+  while True:
+    start = time.perf_counter()
+    for _ in range(number): batch()
+    elapsed = time.perf_counter() - start
+    if elapsed >= min_time: break
+    number *= 2 if elapsed == 0 else max(2, math.ceil(min_time / elapsed))
+  runs = [elapsed]
+  for _ in range(repeat - 1):
+    start = time.perf_counter()
+    for _ in range(number): batch()
+    runs.append(time.perf_counter() - start)
+  per_op = sorted(r / (number * ops) for r in runs)
+  return {'ops': number * ops, 'best_ns': per_op[0] * 1e9,
+          'median_ns': per_op[len(per_op) // 2] * 1e9, 'ops_per_sec': 1 / per_op[0]}
+
+
+def _interpreter_seconds(code: str) -> Optional[float]:
+  start = time.perf_counter()
+  done = subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  return time.perf_counter() - start if done.returncode == 0 else None
+
+
+def measure_startup(module: str, repeat: int = 5) -> dict:
+  """time importing a module in fresh interpreters, less the interpreter's own startup"""
+  bare, runs = [], []
+  for _ in range(max(1, repeat)):
+    # interleaved, so both see the same load on the machine
+    bare.append(_interpreter_seconds('pass'))
+    runs.append(_interpreter_seconds(f'import {module}'))
+    if runs[-1] is None: return {'skipped': f'{module} does not import here'}
+  base = min(bare)
+  per_op = sorted(r - base for r in runs)
+  return {'ops': len(runs), 'best_ns': per_op[0] * 1e9,
+          'median_ns': per_op[len(per_op) // 2] * 1e9, 'ops_per_sec': 1 / per_op[0]}
+
+
+def run(names: Optional[List[str]] = None, repeat: int = 5, min_time: float = 0.05) -> dict:
+  results = {}
+  for name in names if names is not None else [*BENCHMARKS, *STARTUP]:
+    if name in STARTUP:
+      results[name] = measure_startup(STARTUP[name], repeat)
+    else:
+      results[name] = measure(BENCHMARKS[name], repeat, min_time)
+  return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+          'machine': platform.machine(), 'time': time.time(), 'results': results}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 1.2) -> Dict[str, float]:
+  """the benchmarks in both runs whose best time grew by more than `threshold`, with the ratio"""
+  slower = {}
+  for name, r in current['results'].items():
+    before = baseline['results'].get(name)
+    if before is None or 'best_ns' not in before or 'best_ns' not in r: continue
+    ratio = r['best_ns'] / before['best_ns']
+    if ratio > threshold: slower[name] = ratio
+  return slower
+
+
+"""
+startup: the module each entry point runs, keyed by benchmark name
+"""
+STARTUP : Dict[str, str] = {f'startup.{m}': f'harmonious.{m}' for m in
+                            ('music', 'player', 'runtime', 'connector', 'render', 'recognize', 'catalog',
+                             'tuiolog')}
+
+
+"""
+music
+"""
+NOTES = [f'{n}{o}' for n in music.NoteValue.__members__ for o in range(7)]
+LAYER_STRINGS = list(music.symbol_layers.values()) + list(music.layers_voicings)
+TONE_STACKS = [tones for voicings in music.layers_voicings.values() for tones in voicings]
+ENCODED_STACKS = [music.encode_tones(tones) for tones in TONE_STACKS]
+
+@benchmark('music.note_midi')
+def bench_note_midi():
+  return lambda: [music.note_midi(n) for n in NOTES], len(NOTES)
+
+@cached_benchmark('music.normalize_layers')
+def bench_normalize_layers():
+  return lambda: [music.normalize_layers(l) for l in LAYER_STRINGS], len(LAYER_STRINGS)
+
+@cached_benchmark('music.tone_to_voicing')
+def bench_tone_to_voicing():
+  return lambda: [music.tone_to_voicing(t) for t in TONE_STACKS], len(TONE_STACKS)
+
+@benchmark('music.tone_to_voicing[encoded]')
+def bench_encoded_voicing():
+  return lambda: [music.encoded_voicing(c) for c in ENCODED_STACKS], len(ENCODED_STACKS)
+
+@cached_benchmark('music.voicing')
+def bench_voicing():
+  args = [(l, inv) for l in LAYER_STRINGS for inv in (False, True)]
+  return lambda: [music.voicing(l, inv) for l, inv in args], len(args)
+
+@cached_benchmark('music.chord')
+def bench_chord():
+  args = [(r, l) for r in range(48, 60) for l in LAYER_STRINGS]
+  return lambda: [music.chord(r, l) for r, l in args], len(args)
+
+@cached_benchmark('music.symbol_chord')
+def bench_symbol_chord():
+  args = [(r, s) for r in range(48, 60) for s in music.symbol_layers]
+  return lambda: [music.symbol_chord(r, s) for r, s in args], len(args)
+
+
+"""
+fiducials
+"""
+def tower_states() -> List[dict]:
+  """
+  A pad for every chord :fiducials.compile_fiducial_chords: can make: the
+  first arrangement of pieces found for each reachable layer stack, under a
+  root marker (one of the single roots, in turn) upright and then flipped.
+  """
+  up, down = [0.5, 0], [0.5, 3]
+  pieces = {0: {}}
+  for marker in sorted(set(k for k, _ in layers)):
+    options = [(layers_mask(layers[marker, flip]), {marker: down if flip else up})
+               for flip in (False, True) if (marker, flip) in layers]
+    for mask, state in list(pieces.items()):
+      for piece, placed in options:
+        pieces.setdefault(mask | piece, {**state, **placed})
+  single_roots = sorted(set(roots) - set(k for k, _ in layers))
+  # the root goes first, so it is the marker that sets the root and the inversion
+  return [{single_roots[i % len(single_roots)]: flip, **state}
+          for i, (_, state) in enumerate(sorted(pieces.items())) for flip in (up, down)]
+
+@cached_benchmark('fiducials.fiducial_chord')
+def bench_fiducial_chord():
+  fiducial_chord = make_fiducial_chord_builder(roots, layers)
+  states = tower_states()
+  return lambda: [fiducial_chord(s) for s in states], len(states)
+
+@benchmark('fiducials.fiducial_chord[compiled]')
+def bench_compiled_fiducial_chord():
+  fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+  states = tower_states()
+  return lambda: [fiducial_chord(s) for s in states], len(states)
+
+
+"""
+debouncing and TUIO intake, on synthetic frames
+"""
+FRAMES = 50
+OBJECT_COUNTS = (1, 10, 50, 200)
+
+def synthetic_frames(n: int, frames: int = FRAMES) -> List[list]:
+  """frames of n towers drifting and turning a little, as tracker noise does"""
+  return [[SimpleNamespace(sessionId=i, markerId=i, x=(i % 16) / 16, y=0.5 + 0.01 * math.sin(f + i),
+                           angle=(i + 0.2 * math.sin(f * i)) % (2 * math.pi))
+           for i in range(n)] for f in range(frames)]
+
+def bench_debouncer(n: int):
+  frames = synthetic_frames(n)
+  now = [0.0]
+  def clock():
+    now[0] += 1 / 60
+    return now[0]
+  debounce = make_debouncer(lambda changes: None, clock=clock)
+  def batch():
+    for objects in frames: debounce(objects)
+  return batch, len(frames)
+
+def tuio_messages(n: int, frames: int = FRAMES) -> List[list]:
+  """the OSC messages (path, args) of each frame, as a tracker sends them for 2Dobj"""
+  path = "/tuio/2Dobj"
+  return [[(path, ["alive", *(o.sessionId for o in objects)]),
+           *((path, ["set", o.sessionId, o.markerId, o.x, o.y, o.angle, 0.0, 0.0, 0.0, 0.0, 0.0])
+             for o in objects),
+           (path, ["fseq", -1])]
+          for objects in synthetic_frames(n, frames)]
+
+def tuio_handler():
+  """
+  TuioClient.handleObjectMessage, on a client that never opened its port, if
+  liblo is installed; otherwise the TuioSession.handle it delegates to.
+  """
+  try:
+    from harmonious.connector import TuioClient
+  except ImportError:
+    return TuioSession().handle
+  client = TuioClient.__new__(TuioClient)
+  client.session = TuioSession()
+  return lambda path, args: client.handleObjectMessage(path, args, None, None)
+
+def bench_tuio(n: int):
+  frames = tuio_messages(n)
+  handle = tuio_handler()
+  def batch():
+    for messages in frames:
+      for path, args in messages: handle(path, args)
+  return batch, len(frames)
+
+for _n in OBJECT_COUNTS:
+  benchmark(f'pads.debounce[{_n} objects]')(lambda n=_n: bench_debouncer(n))
+  benchmark(f'connector.handleObjectMessage[{_n} objects]')(lambda n=_n: bench_tuio(n))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='time the hot paths of harmonious')
+  parser.add_argument('-k', dest='match', default='', help='only run benchmarks whose name contains this')
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--min-time', type=float, default=0.05, help='seconds each run should take at least')
+  parser.add_argument('--json', help='write the results to this file')
+  parser.add_argument('--compare', help='a previous --json file to check for regressions against')
+  parser.add_argument('--threshold', type=float, default=1.2,
+                      help='how many times slower than the baseline counts as a regression')
+  args = parser.parse_args()
+
+  report = run([name for name in [*BENCHMARKS, *STARTUP] if args.match in name], args.repeat, args.min_time)
+  for name, r in report['results'].items():
+    if 'skipped' in r:
+      print(f"{name:48} skipped: {r['skipped']}")
+    else:
+      print(f"{name:48} {r['best_ns']:12.0f} ns/op {r['ops_per_sec']:14.0f} ops/s")
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(report, f, indent=2)
+  if args.compare:
+    with open(args.compare) as f:
+      slower = compare(json.load(f), report, args.threshold)
+    for name, ratio in slower.items():
+      print(f'regression: {name} is {ratio:.2f}x slower', file=sys.stderr)
+    sys.exit(1 if slower else 0)
@@ -0,0 +1,36 @@
+from harmonious.bench import BENCHMARKS, STARTUP, compare, measure_startup, run, tower_states
+from harmonious.fiducials import roots, layers, make_fiducial_chord_builder
+from harmonious import music
+
+
+def test_every_benchmark_runs():
+  report = run(repeat=1, min_time=0)
+  assert set(report['results']) == set(BENCHMARKS) | set(STARTUP)
+  assert all(r['best_ns'] > 0 for r in report['results'].values() if 'skipped' not in r)
+
+
+def test_startup_skips_what_does_not_import():
+  assert 'skipped' in measure_startup('harmonious.no_such_module', repeat=1)
+
+
+def test_tower_states_cover_every_compiled_chord():
+  fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+  states = tower_states()
+  specs = [fiducial_chord.spec(s) for s in states]
+  assert all(next(iter(s)) in roots and s.keys() - roots - {k for k, _ in layers} == set() for s in states)
+  assert sorted(mask << 1 | inverted for _, mask, inverted in specs) == sorted(fiducial_chord.table)
+
+
+def test_miss_benchmarks_restore_the_cache_size():
+  try:
+    music.configure_cache(64)
+    run(['music.voicing[miss]'], repeat=1, min_time=0)
+    assert music.cache_size() == 64 and music.cache_info()['voicing'].maxsize == 64
+  finally:
+    music.configure_cache()
+
+
+def test_compare_flags_only_slower_benchmarks():
+  before = {'results': {'a': {'best_ns': 100}, 'b': {'best_ns': 100}}}
+  after = {'results': {'a': {'best_ns': 130}, 'b': {'best_ns': 110}, 'c': {'best_ns': 1}, 'd': {'skipped': ''}}}
+  assert compare(before, after, 1.2) == {'a': 1.3}
@@ -0,0 +1,267 @@
+"""
+A catalog of ranked voicings for every layer stack a tower can make, in a memory-mapped index.
+
+:layers_voicings: lists hand written voicings for a handful of stacks, and
+everything else falls back to :default_voicing:, which piles the intervals
+into one close, muddy octave. The catalog is generated instead, for every
+stack the mat's pieces can make (:fiducials.reachable_masks:, 18630 of them)
+and every stack of at most one piece from each group of
+
+  0 | o 5 + | - Δ | _ ^ | 6 * ? | 8 | < 9 > | ~ ! | @ =
+
+(2*4*3*3*4*2*4*3*3 = 20736, which covers the low bass and pieces that are
+not on the mat yet), 34506 stacks in all. For each, every placement of
+its tones in the octaves above the root is tried, those that break the
+range and spacing rules are thrown out, and the best `k` by :score: are kept.
+The rules are
+
+  - nothing higher than `max_top` semitones above the root
+  - no gap wider than `max_gap` between neighbouring notes (the low bass
+    sits an octave under the root and is exempt)
+  - no gap narrower than `low_gap` in the octave above the root, where close
+    intervals turn to mud
+
+and the score prefers gaps that shrink from the bottom of the chord to the
+top, as the overtone series does, and a chord that doesn't sprawl.
+
+Generation is spread over processes and written to a binary file:
+
+  header   magic (8 bytes) | slots (uint32) | entries (uint32)
+  slots    per slot: mask + 1 (uint32, 0 is empty) | offset of its entry (uint32)
+  entries  count (uint8), then per voicing: length (uint8), notes (int8 * length)
+
+The slots are an open addressing hash table with linear probing, at most
+half full, so a lookup is a hash and a probe or two into the mapped file,
+and opening the catalog reads nothing but the header.
+
+  $ python -m harmonious.catalog build          # writes harmonious/voicings.idx
+  $ python -m harmonious.catalog show 5Δ*9
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import sys
+from contextlib import contextmanager
+from multiprocessing import Pool
+
+from harmonious import fiducials, music
+from harmonious.music import LAYER_BITS, LAYER_VALUES, ROOT_BIT, layers_mask, mask_layers
+
+Voicing = Tuple[int, ...]
+
+GROUPS = ('0', 'o5+', '-Δ', '_^', '6*?', '8', '<9>', '~!', '@=')
+
+MAGIC = b'HVIDX\x01\x00\x00'
+HEADER = struct.Struct('<8sII')
+SLOT = struct.Struct('<II')
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'voicings.idx')
+
+
+def reachable_stacks() -> List[int]:
+  """
+  the mask of every stack a tower on the mat can make, or of at most one
+  piece per group, in increasing order
+  """
+  choices = [[0] + [1 << LAYER_BITS[x] for x in group] for group in GROUPS]
+  grouped = {sum(c) for c in itertools.product(*choices)}
+  return sorted(grouped | fiducials.reachable_masks(fiducials.layers))
+
+
+def score(voicing: Voicing) -> float:
+  """
+  How far a voicing is from the ideal spacing; lower is better.
+
+  >>> score((0, 7, 12, 16)) < score((0, 4, 7, 12))
+  True
+  """
+  notes = [n for n in voicing if n >= 0]
+  gaps = [b - a for a, b in zip(notes, notes[1:])]
+  if not gaps: return 0.0
+  # ideal gaps shrink evenly from a fifth at the bottom to a minor third at the top
+  step = 4 / max(1, len(gaps) - 1)
+  return sum((g - (7 - i * step)) ** 2 for i, g in enumerate(gaps)) + notes[-1] / 4
+
+
+def rank_voicings(mask: int, k: int = 4, max_top: int = 36, max_gap: int = 12,
+                  low_gap: int = 3) -> List[Voicing]:
+  """
+  The best `k` voicings of a stack, as offsets from the root in increasing
+  order (with 0 for the root, and -12 for the low bass), like :voicing:.
+
+  >>> rank_voicings(layers_mask('5Δ8'), k=2)
+  [(0, 7, 12, 16), (0, 4, 7, 12)]
+  """
+  mask &= ~ROOT_BIT
+  bass = (-12,) if mask >> LAYER_BITS['0'] & 1 else ()
+  tones = [LAYER_VALUES[x] for x in mask_layers(mask) if x != '0']
+  # simple intervals can go up one or two octaves, compound ones (9ths and up) one
+  placements = [[v + 12*o for o in range(3 if v <= 12 else 2) if v + 12*o <= max_top] for v in tones]
+  # a doubled root is always an option
+  placements.append([None, 12])
+  best : List[Tuple[float, Voicing]] = []
+  for choice in itertools.product(*placements):
+    placed = [n for n in choice if n is not None]
+    notes = sorted({0, *placed})
+    # two tones on the same note is one tone short
+    if len(notes) != len(placed) + 1: continue
+    if any(b - a > max_gap or (a < 12 and b - a < low_gap) for a, b in zip(notes, notes[1:])): continue
+    voicing = (*bass, *notes)
+    item = (-score(voicing), tuple(-n for n in voicing))
+    if len(best) < k: heapq.heappush(best, item)
+    elif item > best[0]: heapq.heapreplace(best, item)
+  if not best:
+    # nothing satisfies the rules (a cluster of seconds, say), so fall back to stacking
+    return [tuple(sorted(bass + (0, *music.mask_default_voicing(mask & ~(1 << LAYER_BITS['0'])))))]
+  return [tuple(-n for n in v) for _, v in sorted(best, reverse=True)]
+
+
+def _rank(job):
+  mask, options = job
+  return mask, rank_voicings(mask, **options)
+
+
+def generate(masks: Optional[Iterable[int]] = None, processes: Optional[int] = None,
+             **options) -> Dict[int, List[Voicing]]:
+  """ranked voicings for each mask (every reachable stack by default), computed across processes"""
+  jobs = [(m, options) for m in (reachable_stacks() if masks is None else masks)]
+  if processes == 1:
+    return dict(map(_rank, jobs))
+  with Pool(processes) as pool:
+    return dict(pool.imap_unordered(_rank, jobs, chunksize=256))
+
+
+def _slot(mask: int, bits: int) -> int:
+  return ((mask * 2654435761) & 0xFFFFFFFF) >> (32 - bits)
+
+
+def write_index(path: str, catalog: Dict[int, List[Voicing]]):
+  bits = max(1, (2 * len(catalog) - 1).bit_length())
+  slots = [(0, 0)] * (1 << bits)
+  data = bytearray()
+  base = HEADER.size + SLOT.size * len(slots)
+  for mask, voicings in sorted(catalog.items()):
+    i = _slot(mask, bits)
+    while slots[i][0]: i = (i + 1) & (len(slots) - 1)
+    slots[i] = (mask + 1, base + len(data))
+    data.append(len(voicings))
+    for v in voicings:
+      data.append(len(v))
+      data += struct.pack(f'<{len(v)}b', *v)
+  tmp = path + '.tmp'
+  with open(tmp, 'wb') as f:
+    f.write(HEADER.pack(MAGIC, len(slots), len(catalog)))
+    for s in slots: f.write(SLOT.pack(*s))
+    f.write(data)
+  # readers that already mapped the old file keep their copy
+  os.replace(tmp, path)
+
+
+class Catalog:
+  """A voicing index, mapped into memory; look up a stack's ranked voicings with `catalog[mask]`."""
+  def __init__(self, path: str = DEFAULT_PATH):
+    with open(path, 'rb') as f:
+      self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, self.slots, self.entries = HEADER.unpack_from(self.buf, 0)
+    if magic != MAGIC: raise ValueError(f'{path} is not a voicing catalog')
+    self.bits = self.slots.bit_length() - 1
+
+  def _offset(self, mask: int) -> Optional[int]:
+    i = _slot(mask, self.bits)
+    while True:
+      key, offset = SLOT.unpack_from(self.buf, HEADER.size + SLOT.size * i)
+      if key == 0: return None
+      if key == mask + 1: return offset
+      i = (i + 1) & (self.slots - 1)
+
+  def get(self, mask: int, default=None) -> Optional[List[Voicing]]:
+    offset = self._offset(mask & ~ROOT_BIT)
+    if offset is None: return default
+    voicings = []
+    count = self.buf[offset]
+    offset += 1
+    for _ in range(count):
+      n = self.buf[offset]
+      voicings.append(struct.unpack_from(f'<{n}b', self.buf, offset + 1))
+      offset += 1 + n
+    return voicings
+
+  def __getitem__(self, mask: int) -> List[Voicing]:
+    voicings = self.get(mask)
+    if voicings is None: raise KeyError(mask)
+    return voicings
+
+  def __contains__(self, mask: int) -> bool:
+    return self._offset(mask & ~ROOT_BIT) is not None
+
+  def __len__(self) -> int:
+    return self.entries
+
+  def close(self):
+    self.buf.close()
+
+
+def install(catalog: Optional[Catalog]) -> Optional[Catalog]:
+  """
+  Voice every stack missing from :layers_voicings: with its best catalog
+  voicing (None goes back to :default_voicing:), clearing the voicing caches.
+  Returns the catalog that was installed before.
+  """
+  previous = music.use_catalog(catalog)
+  from harmonious import voiceleading
+  voiceleading.candidates.cache_clear()
+  voiceleading._costs.cache_clear()
+  return previous
+
+
+def load(path: Optional[str] = DEFAULT_PATH) -> Optional[Catalog]:
+  """map and install the catalog at path, if there is one"""
+  if path is None or not os.path.exists(path): return None
+  catalog = Catalog(path)
+  install(catalog)
+  return catalog
+
+
+@contextmanager
+def loaded(path: Optional[str] = DEFAULT_PATH) -> Iterator[Optional[Catalog]]:
+  """:load: the catalog at path for a `with` block, then put back the one installed before"""
+  if path is None or not os.path.exists(path):
+    yield None
+    return
+  catalog = Catalog(path)
+  previous = install(catalog)
+  try:
+    yield catalog
+  finally:
+    install(previous)
+    catalog.close()
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='generate or inspect the voicing catalog')
+  commands = parser.add_subparsers(dest='command', required=True)
+  b = commands.add_parser('build', help='rank voicings for every reachable stack')
+  b.add_argument('--output', default=DEFAULT_PATH)
+  b.add_argument('-k', type=int, default=4, help='voicings kept per stack')
+  b.add_argument('--max-top', type=int, default=36, help='highest note, in semitones above the root')
+  b.add_argument('--max-gap', type=int, default=12, help='widest gap between neighbouring notes')
+  b.add_argument('--low-gap', type=int, default=3, help='narrowest gap in the octave above the root')
+  b.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+  s = commands.add_parser('show', help='print the voicings of some stacks')
+  s.add_argument('layers', nargs='+')
+  s.add_argument('--index', default=DEFAULT_PATH)
+  args = parser.parse_args()
+
+  if args.command == 'build':
+    catalog = generate(processes=args.processes, k=args.k, max_top=args.max_top,
+                       max_gap=args.max_gap, low_gap=args.low_gap)
+    write_index(args.output, catalog)
+    print(f'wrote {len(catalog)} stacks to {args.output}', file=sys.stderr)
+  else:
+    catalog = Catalog(args.index)
+    for layers in args.layers:
+      print(mask_layers(layers_mask(layers) & ~ROOT_BIT), catalog.get(layers_mask(layers), []))
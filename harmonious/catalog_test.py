@@ -0,0 +1,69 @@
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from harmonious import music
+from harmonious.catalog import Catalog, generate, install, rank_voicings, reachable_stacks, write_index
+from harmonious import fiducials
+from harmonious.music import layers_mask, layers_voicings, mask_voicings, symbol_layers, voicing
+from harmonious.voiceleading import candidates
+
+stacks = reachable_stacks()
+
+
+def test_every_named_stack_is_reachable():
+  reachable = set(stacks)
+  for layers in [*symbol_layers.values(), *layers_voicings]:
+    assert layers_mask(layers) & ~music.ROOT_BIT in reachable
+
+
+def test_every_stack_on_the_mat_is_cataloged():
+  _, table = fiducials.compile_fiducial_chords(fiducials.layers)
+  assert {key >> 1 for key in table} <= set(stacks)
+  assert {layers_mask('5_<9@'), layers_mask('5+-?8')} <= set(stacks)
+
+
+@settings(max_examples=50, deadline=None)
+@given(st.sampled_from(stacks))
+def test_voicings_keep_to_the_rules(mask):
+  voicings = rank_voicings(mask, max_top=36, max_gap=12, low_gap=3)
+  assert 1 <= len(voicings) <= 4
+  for v in voicings:
+    assert list(v) == sorted(set(v)) and 0 in v
+    # every tone of the stack is there, in some octave
+    assert {n % 12 for n in v} == {n % 12 for n in [0, *music.mask_default_voicing(mask)]}
+    notes = [n for n in v if n >= 0]
+    assert notes[-1] <= 36
+    assert all(b - a <= 12 and (a >= 12 or b - a >= 3) for a, b in zip(notes, notes[1:]))
+
+
+def test_index_lookups_match_the_catalog(tmp_path):
+  path = str(tmp_path / 'voicings.idx')
+  # stacks of a few pieces rank quickly, and the index doesn't care what is in it
+  generated = generate([m for m in stacks if bin(m).count('1') <= 5][::20], processes=2, k=3)
+  write_index(path, generated)
+  catalog = Catalog(path)
+  try:
+    assert len(catalog) == len(generated)
+    for mask, voicings in generated.items():
+      assert catalog[mask] == voicings and mask in catalog
+      assert catalog.get(mask | music.ROOT_BIT) == voicings
+    assert catalog.get(1 << 16) is None and (1 << 16) not in catalog
+  finally:
+    catalog.close()
+
+
+def test_installed_catalog_voices_unlisted_stacks(tmp_path):
+  path = str(tmp_path / 'voicings.idx')
+  unlisted = layers_mask('5Δ*9')
+  write_index(path, generate([unlisted, layers_mask('5Δ8')], processes=1))
+  catalog = Catalog(path)
+  try:
+    install(catalog)
+    assert voicing(unlisted) == list(catalog[unlisted][0])
+    assert voicing('5Δ*9') == list(catalog[unlisted][0])
+    assert candidates(unlisted, False)[0] == (0, *catalog[unlisted][0])
+    # hand written voicings still come first
+    assert voicing(layers_mask('5Δ8')) == mask_voicings[layers_mask('5Δ8')]
+  finally:
+    install(None)
+    catalog.close()
+  assert voicing(unlisted) == music.mask_default_voicing(unlisted)
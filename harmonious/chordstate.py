@@ -0,0 +1,109 @@
+"""
+Chord state shared between the setter and the poller without a server process.
+
+A `Manager().list` turns every read of `notes[i]` in the playback loop into
+a round trip over a pipe to the manager process. Here the chords live in a
+fixed size block of `multiprocessing.shared_memory` instead, laid out as
+
+  seq (uint32) | pads in use (uint32) | stamp (float64) | per pad: length (uint8), notes (uint8 * max_notes)
+
+and protected by a seqlock: the single writer makes `seq` odd while it
+writes and even again when done, and a reader retries until it copied the
+block between two reads of the same even `seq`. Reads cost no IPC and
+never see a half-written chord.
+
+Only one process may write at a time (the setter); any number may read.
+The block is sized when it is created, so it must be made for the number of
+pads on the mat (the player's --pads).
+"""
+from typing import List, Optional, Sequence, Tuple
+from multiprocessing import shared_memory
+import struct
+import sys
+
+HEADER = struct.Struct('=IId')
+
+
+class SharedChordState:
+  """
+  A list of chords (lists of MIDI notes), one per pad, in shared memory.
+
+  It behaves enough like the list it replaces that the player uses it as
+  `notes[i]`, `len(notes)` and `notes[:] = chords`. Pass `name` to attach to
+  a block created by another process; objects also pickle by name.
+  """
+  def __init__(self, num_pads: int = 16, max_notes: int = 15, name: str = None):
+    self.num_pads = num_pads
+    self.max_notes = max_notes
+    self.stride = 1 + max_notes
+    size = HEADER.size + num_pads * self.stride
+    self.owner = name is None
+    self.truncated = 0
+    self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+    self.buf = self.shm.buf
+    if self.owner:
+      self.buf[:size] = bytes(size)
+      self.write([[]])
+
+  @property
+  def name(self) -> str:
+    return self.shm.name
+
+  def __reduce__(self):
+    return (SharedChordState, (self.num_pads, self.max_notes, self.name))
+
+  def _seq(self) -> int:
+    return HEADER.unpack_from(self.buf, 0)[0]
+
+  def write(self, chords: Sequence[Sequence[int]], stamp: Optional[float] = None):
+    """replace every chord; `stamp` is the latency stamp of the frame they came from"""
+    if len(chords) > self.num_pads:
+      raise ValueError(f'{len(chords)} chords do not fit in {self.num_pads} pads')
+    body = bytearray(len(chords) * self.stride)
+    for i, chord in enumerate(chords):
+      # notes past max_notes are dropped rather than failing the whole update
+      if len(chord) > self.max_notes:
+        if not self.truncated:
+          print(f'chordstate: a chord of {len(chord)} notes was cut to {self.max_notes}', file=sys.stderr)
+        self.truncated += 1
+      chord = bytes(chord[:self.max_notes])
+      body[i*self.stride] = len(chord)
+      body[i*self.stride + 1:i*self.stride + 1 + len(chord)] = chord
+    seq = self._seq()
+    stamp = 0.0 if stamp is None else stamp
+    HEADER.pack_into(self.buf, 0, seq + 1, len(chords), stamp)
+    self.buf[HEADER.size:HEADER.size + len(body)] = body
+    HEADER.pack_into(self.buf, 0, seq + 2, len(chords), stamp)
+
+  def read_stamped(self) -> Tuple[List[List[int]], Optional[float]]:
+    """A consistent snapshot of every pad's chord, and the stamp it was written with."""
+    while True:
+      seq, count, stamp = HEADER.unpack_from(self.buf, 0)
+      if seq & 1: continue
+      body = bytes(self.buf[HEADER.size:HEADER.size + count * self.stride])
+      if self._seq() == seq: break
+    return ([list(body[i+1:i+1+body[i]]) for i in range(0, len(body), self.stride)],
+            stamp if stamp != 0.0 else None)
+
+  def read(self) -> List[List[int]]:
+    """A consistent snapshot of every pad's chord."""
+    return self.read_stamped()[0]
+
+  def __len__(self) -> int:
+    return len(self.read())
+
+  def __getitem__(self, i):
+    return self.read()[i]
+
+  def __setitem__(self, i, chords):
+    if i != slice(None):
+      raise TypeError('only whole assignment (notes[:] = chords) is supported')
+    self.write(chords)
+
+  def __repr__(self):
+    return repr(self.read())
+
+  def close(self):
+    self.buf = None
+    self.shm.close()
+    if self.owner: self.shm.unlink()
@@ -0,0 +1,72 @@
+from multiprocessing import Process
+import pickle
+import pytest
+from harmonious.chordstate import SharedChordState
+
+
+def test_write_and_read_back():
+  notes = SharedChordState(num_pads=4, max_notes=6)
+  try:
+    assert notes[:] == [[]]
+    notes[:] = [[48, 55, 64], [], [50, 57, 65, 72]]
+    assert len(notes) == 3
+    assert notes[0] == [48, 55, 64]
+    assert notes[:] == [[48, 55, 64], [], [50, 57, 65, 72]]
+    with pytest.raises(ValueError):
+      notes[:] = [[]] * 5
+  finally:
+    notes.close()
+
+
+def test_long_chords_are_cut_and_counted(capsys):
+  notes = SharedChordState(num_pads=1, max_notes=3)
+  try:
+    notes[:] = [[48, 52, 55, 59, 62]]
+    notes[:] = [[48, 52, 55, 59]]
+    assert notes[:] == [[48, 52, 55]]
+    assert notes.truncated == 2
+    assert capsys.readouterr().err.count('cut to 3') == 1
+  finally:
+    notes.close()
+
+
+def test_attach_by_name():
+  notes = SharedChordState(num_pads=2)
+  try:
+    other = pickle.loads(pickle.dumps(notes))
+    notes[:] = [[60, 64]]
+    assert other[:] == [[60, 64]]
+    other.close()
+  finally:
+    notes.close()
+
+
+def test_stamp_travels_with_the_chords():
+  notes = SharedChordState(num_pads=2)
+  try:
+    notes.write([[60]], 12.5)
+    assert notes.read_stamped() == ([[60]], 12.5)
+    notes[:] = [[62]]
+    assert notes.read_stamped() == ([[62]], None)
+  finally:
+    notes.close()
+
+
+def churn(notes, rounds):
+  for i in range(rounds):
+    n = 40 + i % 40
+    notes[:] = [[n] * (1 + i % 10), [n] * (10 - i % 10)]
+
+
+def test_reader_never_sees_a_torn_chord():
+  notes = SharedChordState(num_pads=2, max_notes=10)
+  try:
+    p = Process(target=churn, args=(notes, 20000))
+    p.start()
+    while p.is_alive():
+      chords = notes[:]
+      # every note written in one update is the same, so a mix means a torn read
+      assert len(set(n for c in chords for n in c)) <= 1
+    p.join()
+  finally:
+    notes.close()
@@ -1,13 +1,10 @@
 from liblo import *
-import time
-import os
-from pythonosc import udp_client
-from datetime import datetime
-import toolz as t
-import toolz.curried as tc
+import argparse
 import sys
-import math
-import simplejson as json
+from harmonious.latency import latency
+from harmonious.pads import FramePump, PadLayout
+from harmonious.wire import FORMATS, Writer, open_output
+from harmonious.tuio import TuioSession
 
 """
 py3tuio is a very basic implementation of a TUIO 1.x client written in Python 3 using pyliblo.
@@ -21,138 +18,70 @@ class TuioClient(ServerThread):
     """
     def __init__(self, port):
         ServerThread.__init__(self, port)
-        self.tuio2DCursors = []
-        self.tuio2DObjects = []
-        self.tuio2DBlobs = []
-        self._aliveObjectIds = set([])
-        self._tuioObjectsNew = []
-        self._tuioObjectsOld = []
-        self.fseq = 0
+        self.session = TuioSession()
+
+    # snapshots of each profile; list() of a dict is atomic, so these are safe to
+    # read from other threads while the server thread applies frames.
+    tuio2DCursors = property(lambda self: list(self.session.profiles["/tuio/2Dcur"].objects.values()))
+    tuio2DObjects = property(lambda self: list(self.session.profiles["/tuio/2Dobj"].objects.values()))
+    tuio2DBlobs = property(lambda self: list(self.session.profiles["/tuio/2Dblb"].objects.values()))
+
+    def addFrameListener(self, listener):
+        """call listener(diff) with a FrameDiff from the server thread each time a frame is accepted"""
+        self.session.frameListeners.append(listener)
 
     @make_method(None, None)
     def handleObjectMessage(self, path, args, types, src):
        """process the incoming TUIO/OSC messages"""
-       messageType = args.pop(0)
-       if messageType == "alive":
-           self._aliveObjectIds = []
-           for sessionId in args:
-               self._aliveObjectIds.append(sessionId)
-       elif messageType == "set":
-           tuioObject = None
-           if (path == "/tuio/2Dcur"):
-               tuioObject = Tuio2DCursor(args)
-               self._tuioObjectsOld = self.tuio2DCursors
-           elif (path == "/tuio/2Dobj"):
-               tuioObject = Tuio2DObject(args)
-               self._tuioObjectsOld = self.tuio2DObjects
-           elif (path == "/tuio/2Dblb"):
-               tuioObject = Tuio2DBlob(args)
-               self._tuioObjectsOld = self.tuio2DBlobs
-           if (tuioObject):
-               self._tuioObjectsNew.append(tuioObject)
-               self._aliveObjectIds.remove(tuioObject.sessionId)
-       elif messageType == "fseq":
-           if ((args[0] == -1) | (self.fseq < args[0])):
-               self.fseq = args[0]
-               # add all objects which didn't change but are still alive
-               for o in self._tuioObjectsOld:
-                   if (o.sessionId in self._aliveObjectIds):
-                       self._tuioObjectsNew.append(o)
-               if (path == "/tuio/2Dcur"):
-                   self.tuio2DCursors = self._tuioObjectsNew
-               elif (path == "/tuio/2Dobj"):
-                   self.tuio2DObjects = self._tuioObjectsNew
-               elif (path == "/tuio/2Dblb"):
-                   self.tuio2DBlob = self._tuioObjectsNew
-           self._tuioObjectsNew = []
-
-class TuioObject:
-    """this represents a TUIO object"""
-    def __init__(self, args, argsLength):
-        if (len(args) != argsLength):
-            raise ValueError("TUIO Message: wrong number of arguments")
-    def __repr__(self):
-      return repr(self.__dict__)
-
-class Tuio2DCursor(TuioObject):
-    """this represents a TUIO 2D cursor"""
-    def __init__(self, args):
-        super(Tuio2DCursor, self).__init__(args, 6)
-        self.sessionId, self.x, self.y, self.xVelocity, self.yVelocity, self.acceleration = args[0:6]
-
-class Tuio2DObject(TuioObject):
-    """this represents a TUIO 2D object"""
-    def __init__(self, args):
-        super(Tuio2DObject, self).__init__(args, 10)
-        self.sessionId, self.markerId, self.x, self.y, self.angle, self.xVelocity, self.yVelocity, self.rotationSpeed, self.acceleration, self.rotationAcceleration = args[0:10]
-
-class Tuio2DBlob(TuioObject):
-    """this represents a TUIO 2D blob"""
-    def __init__(self, args):
-        super(Tuio2DBlob, self).__init__(args, 12)
-        self.sessionId, self.x, self.y, self.angle, self.width, self.height, self.area, self.xVelocity, self.yVelocity, self.rotationSpeed, self.acceleration, self.rotationAcceleration = args[0:12]
+       self.session.handle(path, args)
 
 
 
 
 # ^ Everything above here was taken from a github gist: https://github.com/arminbw/py3tuio/blob/master/py3tuio.py
+# (the session state and object classes have since moved to harmonious.tuio)
 
-def make_debouncer(sender, i:int=0):
+def demo(NUM_PADS, min_interval=0.0, timeout=0.2, layout=None, format='json', socket_path=None, port=3333):
     """
-    Create a cache to throttle events coming from the TUIO server, and output diffs of what changes.
-
-    :param sender: should take data (in json form) and send it (by printing, sending to a socket, etc)
-    :param i:
-    :return: a function that does the debouncing
+    Send changes to each pad to the player, as soon as the tracker finishes a frame.
+
+    :param min_interval: if set, frames that arrive sooner than this after the last update are
+        coalesced into the next one.
+    :param timeout: without frames, update this often anyway so that lost towers still expire.
+    :param layout: the PadLayout of the mat, NUM_PADS vertical strips by default.
+    :param format: json lines or binary frames, see :wire:.
+    :param socket_path: send to the player's Unix socket instead of stdout.
+    :param port: the UDP port to take TUIO on (the tracker's, or a :tuiolog: recorder's forward port).
     """
-    d = {}
-    def debounce(objects):
-        changed = False
-        for o in objects:
-            if o.markerId not in d or d[o.markerId][3] != round(o.angle) % 6:
-                changed = True
-            d[o.markerId] = (datetime.now(), o.x, o.y, round(o.angle) % 6)
-        
-        old = t.valfilter(lambda x: (datetime.now() - x[0]).seconds > 0.2, d)
-        for o in old:
-            d.pop(o)
-        
-        # at this position - either we changed, or we lost a tower
-        if changed or len(old) > 0:
-          if len(d) == 0:
-            # no towers at this position
-            o = next(iter(old))
-            sender(json.dumps({i: {}}))
-          else:
-            sender( json.dumps({i: {k:[v[-2], v[-1]] for k,v in d.items()}}) )
-        
-        #print(f"{i} :", d)
-    return debounce
-
-
-def demo(NUM_PADS):
+    layout = layout or PadLayout.strips(NUM_PADS)
     try:
-        client = TuioClient(3333)
+        client = TuioClient(port)
+        
+        writer = Writer(open_output(socket_path), format)
         
-        # 4 senders for four positions independently.
-        debounce_senders = [make_debouncer(lambda x: print(x, flush=True), i) for i in range(NUM_PADS)]
-        for i in range(NUM_PADS):
-          print(json.dumps({i: {}}), flush=True)
+        # one debouncer per pad, each only seeing the objects on its pad.
+        pump = FramePump(layout, writer.write, lambda: client.tuio2DObjects, min_interval, timeout)
+        for i in range(len(layout)):
+          writer.write({i: {}})
     except ServerError as err:
         sys.exit(str(err))
+    client.addFrameListener(pump.on_frame)
     client.start()
     while (True):
-        time.sleep(0.1)
         try:
-          #print("\033[H\033[J") # clear screen
-          #print(client.tuio2DObjects)
-          for i in range(len(debounce_senders)):
-            # send to corresponding cache if the position has changed.
-            debounce_senders[i](o for o in client.tuio2DObjects if math.floor(NUM_PADS*o.x) == NUM_PADS-1-i)
+          pump.step()
+          latency.maybe_report()
             
         except:
             client.stop()
             sys.exit()
 
 if __name__ == '__main__':
-  demo(int(sys.argv[1]))
+  parser = argparse.ArgumentParser(description='send the towers on each pad to the player')
+  parser.add_argument('pads', type=int, help='number of pads (vertical strips) on the mat')
+  parser.add_argument('--min-interval', type=float, default=0.0, help='coalesce frames closer together than this (s)')
+  parser.add_argument('--format', choices=FORMATS, default='json', help='format of the pad changes')
+  parser.add_argument('--socket', help="send to the player's Unix socket instead of stdout")
+  parser.add_argument('--port', type=int, default=3333, help='UDP port to take TUIO on')
+  args = parser.parse_args()
+  demo(args.pads, args.min_interval, format=args.format, socket_path=args.socket, port=args.port)
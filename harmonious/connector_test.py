@@ -0,0 +1,28 @@
+import socket
+import time
+import pytest
+from harmonious.testing import tuio_bundle
+
+pytest.importorskip('liblo')
+from harmonious.connector import TuioClient
+from harmonious.pads import FramePump, PadLayout
+
+
+def test_bundles_sent_to_the_client_are_debounced():
+  with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+  client = TuioClient(port)
+  sent = []
+  pump = FramePump(PadLayout.strips(2), sent.append, lambda: client.tuio2DObjects, timeout=0.05)
+  client.addFrameListener(pump.on_frame)
+  client.start()
+  try:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+      s.sendto(tuio_bundle(1, [(1, 12, 0.75, 0.0), (2, 29, 0.25, 3.0)]), ('127.0.0.1', port))
+    deadline = time.monotonic() + 5
+    while len(sent) < 2 and time.monotonic() < deadline:
+      pump.step()
+  finally:
+    client.stop()
+  assert sorted(sent, key=lambda c: min(c)) == [{0: {12: [0.5, 0]}}, {1: {29: [0.5, 3]}}]
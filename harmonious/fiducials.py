@@ -1,6 +1,5 @@
-from harmonious.music import note_midi, chord
-import toolz as t
-import toolz.curried as tc
+from typing import Set
+from harmonious.music import note_midi, normalize_layers, layers_mask, chord
 
 roots = {
   # individual roots - not to be used with any other chord description.
@@ -21,13 +20,13 @@ roots = {
 
 layers = {
   # prebuilt chord types for diatonic chords 1-7
-  (1, True):  '5∆8', (4, True):  '5∆8', (5, True):  '5∆*', (7, True): "o-8",
-  (1, False): '5∆8', (4, False): '5∆8', (5, False): '5∆*', (7, False): 'o-8',
+  (1, True):  '5Δ8', (4, True):  '5Δ8', (5, True):  '5Δ*', (7, True): "o-8",
+  (1, False): '5Δ8', (4, False): '5Δ8', (5, False): '5Δ*', (7, False): 'o-8',
   (6, True):  '5-8', (2, True):  '5-8', (3, True):  '5-8',
   (6, False): '5-8', (2, False): '5-8', (3, False): '5-8',
   
   #individual layers to play with
-  (33, True):   '∆',   (25, True):   '5',   (27, True):   '?',   (29, True):   '9',
+  (33, True):   'Δ',   (25, True):   '5',   (27, True):   '?',   (29, True):   '9',
   (33, False):  '-',   (25, False):  '5',   (27, False):  '*',   (29, False):  '9',
   (24, True):   '^',   (26, True):   'o',   (28, True):   '=',   (30, True):  '<',
   (24, False):  '_',   (26, False):  '+',   (28, False):  '@',   (30, False): '>',
@@ -36,26 +35,95 @@ layers = {
   (31, False): '!',
 }
 
-def make_fiducial_chord_builder(roots, layers):
+def flipped(fiducial) -> bool:
+  """Whether a fiducial's [position, angle bucket] puts it upside down."""
+  return 2 <= fiducial[1] <= 5
+
+
+def reachable_masks(layers) -> Set[int]:
+  """
+  The :layers_mask: of every stack the layer pieces can make on one pad.
+  
+  Each marker is on the pad or not, either way up, and its (marker, flipped)
+  symbols are or'ed into the stack.
+  """
+  reachable = {0}
+  for marker in set(k for k, _ in layers):
+    options = {0} | {layers_mask(layers[k]) for k in ((marker, True), (marker, False)) if k in layers}
+    reachable = {m | o for m in reachable for o in options}
+  return reachable
+
+
+def compile_fiducial_chords(layers):
+  """
+  Precompute the chord for every combination of layer pieces that can be on a pad.
+  
+  The quality of a chord only depends on which layer symbols are present, so
+  each (marker, flipped) piece is reduced to a :layers_mask: of its symbols and
+  the :reachable_masks: are enumerated. The table maps `mask << 1 | inverted`
+  to the chord's notes relative to its root.
+  
+  :return: (marker masks keyed by (marker, flipped), table)
+  """
+  marker_masks = {k: layers_mask(v) for k, v in layers.items()}
+  table = {}
+  for mask in reachable_masks(layers):
+    for inverted in (False, True):
+      table[mask << 1 | inverted] = (tuple(chord(0, mask, inverted))
+                                     if mask != 0 else (0,))
+  return marker_masks, table
+
+
+def make_fiducial_chord_builder(roots, layers, compiled: bool = False):
+  """
+  Create the function that turns the fiducials on a pad into the notes of a chord.
+  
+  :param roots: marker id -> midi value of the root that marker sets.
+  :param layers: (marker id, flipped) -> layer symbols that marker adds.
+  :param compiled: precompute every reachable chord up front so each call is a table lookup.
+  """
   def fiducial_chord(fiducial_map):
     """
+    Build the chord for a pad from a map of marker id -> [position, angle bucket].
     
+    The first root marker on the pad sets the root, and flipping it inverts the chord.
+    Every marker on the pad (including the root) may add layers to the chord's quality.
     """
     # look for roots
-    # roots = t.pipe(fiducial_map, tc.keyfilter(lambda k: k in roots), lambda d: {k:(v[1])})
     r = [k for k in fiducial_map if k in roots]
     if len(r) == 0: return []
     # look for layers and qualities
-    quality = t.pipe([(k, (2 <= fiducial_map[k][1] <= 5)) for k in fiducial_map],
-      lambda _: t.get(_, layers, None),
-      lambda _: t.filter(None, _),
-      ''.join,
-      set,
-      ''.join)
+    quality = normalize_layers(''.join(
+      filter(None, (layers.get((k, flipped(v))) for k, v in fiducial_map.items()))))
     
     if quality == '': return [roots[r[0]]]
-    return chord(roots[r[0]], quality, 2 <= fiducial_map[r[0]][1] <= 5)
-
-  return fiducial_chord
+    return chord(roots[r[0]], quality, flipped(fiducial_map[r[0]]))
+  
+  if not compiled: return fiducial_chord
+  
+  marker_masks, table = compile_fiducial_chords(layers)
+  
+  def fiducial_spec(fiducial_map):
+    """The (root, layers mask, inverted) of a pad's chord, or None if it has no root."""
+    mask = 0
+    root = None
+    for k, v in fiducial_map.items():
+      flip = flipped(v)
+      mask |= marker_masks.get((k, flip), 0)
+      if root is None and k in roots:
+        root, inverted = roots[k], flip
+    if root is None: return None
+    return root, mask, inverted
+  
+  def compiled_fiducial_chord(fiducial_map):
+    spec = fiducial_spec(fiducial_map)
+    if spec is None: return []
+    root, mask, inverted = spec
+    return [root + x for x in table[mask << 1 | inverted]]
+  
+  compiled_fiducial_chord.__doc__ = fiducial_chord.__doc__
+  compiled_fiducial_chord.table = table
+  compiled_fiducial_chord.spec = fiducial_spec
+  return compiled_fiducial_chord
 
 fiducial_chord = make_fiducial_chord_builder(roots, layers)
@@ -0,0 +1,28 @@
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.fiducials import roots, layers, fiducial_chord, make_fiducial_chord_builder
+
+compiled_fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+
+markers = sorted(set(roots) | set(k for k, _ in layers) | {0, 99})
+
+
+# the compiled table must agree with building the chord on the fly
+@given(st.dictionaries(st.sampled_from(markers),
+                       st.tuples(st.floats(0, 1), st.integers(min_value=0, max_value=5)),
+                       max_size=8))
+def test_compiled_matches_dynamic(fiducial_map):
+  assert compiled_fiducial_chord(fiducial_map) == fiducial_chord(fiducial_map)
+
+
+def test_every_single_tower_matches():
+  for root in roots:
+    for angle in range(6):
+      for k, flipped in layers:
+        fiducial_map = {root: [0.5, angle], k: [0.5, 3 if flipped else 0]}
+        assert compiled_fiducial_chord(fiducial_map) == fiducial_chord(fiducial_map)
+
+
+def test_no_root_is_silent():
+  assert compiled_fiducial_chord({25: [0.5, 0]}) == fiducial_chord({25: [0.5, 0]}) == []
+  assert compiled_fiducial_chord({12: [0.5, 0]}) == [48]
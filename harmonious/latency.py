@@ -0,0 +1,102 @@
+"""
+Latency from a tower landing on the mat to the synth playing it.
+
+Each accepted TUIO frame is stamped with the monotonic clock, and the stamp
+travels with the pad changes it caused: through the debouncer, across the
+pipe to the setter (as the STAMP key of the changes), into the shared chord
+state and out of the poller's next send. Every stage records the time since
+the frame into a histogram:
+
+debounce  frame accepted -> the debouncer sends the changes
+received  frame -> the setter has read the changes (pipe, parsing, queueing)
+chord     frame -> the pad's chord is rebuilt by fiducial_chord
+note_on   frame -> the first send to the synth after the new chord is in place
+send      time spent inside one send to the synth
+
+All but `send` are measured from the frame, so the cost of a stage is the
+difference from the one before it.
+
+The monotonic clock is shared by all processes on a host, so stamps can be
+compared across the connector and player. Histograms have fixed log-scale
+buckets, so recording is a log and an increment, cheap enough to leave on.
+Set HARMONIOUS_LATENCY=1 to turn it on; percentiles are then printed to
+stderr every `interval` seconds by whichever loop calls :Latency.maybe_report:.
+"""
+from typing import Dict, Optional
+import math
+import os
+import sys
+import time
+
+"""The key that carries a frame's stamp in a dict of pad changes."""
+STAMP = 't'
+
+clock = time.monotonic
+
+
+class Histogram:
+  """counts of durations in log-scale buckets, from 1µs up to ~10s"""
+  PER_DECADE = 10
+  LOWEST = 1e-6
+
+  def __init__(self, decades: int = 7):
+    self.counts = [0] * (decades * self.PER_DECADE + 1)
+    self.total = 0
+    self.max = 0.0
+
+  def record(self, seconds: float):
+    i = (0 if seconds <= self.LOWEST
+         else min(len(self.counts) - 1, int(math.log10(seconds / self.LOWEST) * self.PER_DECADE) + 1))
+    self.counts[i] += 1
+    self.total += 1
+    if seconds > self.max: self.max = seconds
+
+  def percentile(self, p: float) -> float:
+    """the upper edge of the bucket holding the p-th percentile (0-100)"""
+    if self.total == 0: return 0.0
+    rank = math.ceil(self.total * p / 100)
+    seen = 0
+    for i, n in enumerate(self.counts):
+      seen += n
+      if seen >= rank:
+        return min(self.max, self.LOWEST * 10 ** (i / self.PER_DECADE))
+    return self.max
+
+
+class Latency:
+  """a histogram per stage, and a periodic report of their percentiles"""
+  def __init__(self, enabled: bool = False, interval: float = 10.0, out=sys.stderr):
+    self.enabled = enabled
+    self.interval = interval
+    self.out = out
+    self.stages : Dict[str, Histogram] = {}
+    self._reported = clock()
+
+  def stamp(self) -> Optional[float]:
+    """the time now if enabled, to carry along with what happens next"""
+    return clock() if self.enabled else None
+
+  def record(self, stage: str, since: Optional[float]):
+    """record the time since a stamp (nothing if there is no stamp)"""
+    if since is None or not self.enabled: return
+    self.record_duration(stage, clock() - since)
+
+  def record_duration(self, stage: str, seconds: float):
+    if not self.enabled: return
+    h = self.stages.get(stage)
+    if h is None: h = self.stages[stage] = Histogram()
+    h.record(seconds)
+
+  def report(self) -> Dict[str, Dict[str, float]]:
+    return {stage: {'count': h.total, 'p50': h.percentile(50), 'p99': h.percentile(99), 'max': h.max}
+            for stage, h in self.stages.items()}
+
+  def maybe_report(self):
+    if not self.enabled or clock() - self._reported < self.interval: return
+    self._reported = clock()
+    for stage, r in self.report().items():
+      print(f"latency {stage}: n={r['count']} p50={1000*r['p50']:.2f}ms "
+            f"p99={1000*r['p99']:.2f}ms max={1000*r['max']:.2f}ms", file=self.out)
+
+
+latency = Latency(enabled=os.environ.get('HARMONIOUS_LATENCY', '') not in ('', '0'))
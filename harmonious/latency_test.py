@@ -0,0 +1,34 @@
+import io
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.latency import Histogram, Latency
+
+
+@given(st.lists(st.floats(min_value=0, max_value=10), min_size=1))
+def test_percentiles_bound_the_samples(samples):
+  h = Histogram()
+  for s in samples:
+    h.record(s)
+  assert h.total == len(samples)
+  assert h.percentile(50) <= h.percentile(99) <= h.max == max(samples)
+  # a bucket's upper edge is within one bucket (~26%) of the true percentile
+  assert h.percentile(100) >= max(samples) / 10 ** (1 / Histogram.PER_DECADE) - 1e-12
+
+
+def test_disabled_latency_records_nothing():
+  out = io.StringIO()
+  l = Latency(enabled=False, interval=0, out=out)
+  assert l.stamp() is None
+  l.record('chord', 0.0)
+  l.maybe_report()
+  assert l.stages == {} and out.getvalue() == ''
+
+
+def test_enabled_latency_reports_each_stage():
+  out = io.StringIO()
+  l = Latency(enabled=True, interval=0, out=out)
+  l.record('chord', l.stamp())
+  l.record('note_on', None)
+  l.maybe_report()
+  assert set(l.report()) == {'chord'}
+  assert out.getvalue().startswith('latency chord: n=1')
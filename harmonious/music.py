@@ -26,18 +26,16 @@ See :player: for details about how the chords are played.
 Progressions are just represented as an array of notes that are to be played
 in sequence there.
 """
-from aenum import Enum, unique, IntEnum
-from bidict import bidict
-import sys
-import regex as re
-import toolz as t
-from typing import List, Iterable, Union, Mapping, Optional
+from enum import IntEnum
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, List, Iterable, Union, Mapping, Optional
 
 """
 Simple mapping of note name to MIDI value mod 12.
 MIDI 0th octave begins at 12 + this value. (so C0 = 12, A0 = 21, etc)
 """
-NoteValue : 'NoteValue' = IntEnum('NoteValue', {
+NOTE_VALUES : Mapping[str, int] = {
   # note, this order is NOT random
   # raw note names are preferred to enharmonic equivalents
   # flats are preferrable to sharps (jazz musician here)
@@ -46,7 +44,8 @@ NoteValue : 'NoteValue' = IntEnum('NoteValue', {
   'C#':1, 'D#':3, 'G#':8, 'A#':10,  'F#': 6,
   # these are just weird, so they exist only as aliases for B/C E/F respectively.
   'Fb':4,'E#':5,'B#':0, 'Cb':11
-})
+}
+NoteValue : 'NoteValue' = IntEnum('NoteValue', NOTE_VALUES)
 
 
 """
@@ -63,7 +62,7 @@ b7 7        * !
 11 #11      ~ ?
 b13 13      @ =
 """
-LayerInterval : 'LayerInterval' = IntEnum('LayerInterval', {
+LAYER_VALUES : Mapping[str, int] = {
   '0':-12,
   '1': 0,
   '_': 2, '-': 3, 'Δ': 4, '^': 5, # Δ is not ascii, but it's from music theory, so it's allowed
@@ -77,7 +76,8 @@ LayerInterval : 'LayerInterval' = IntEnum('LayerInterval', {
   '~': 17, '!': 18,
   # TODO consider better symbol options for 13/b13.
   '@': 20, '=': 21, # same question for 13/b13 and 6/+.
-})
+}
+LayerInterval : 'LayerInterval' = IntEnum('LayerInterval', LAYER_VALUES)
 LayerInterval.__str__ = lambda self: self.name
 
 """
@@ -195,7 +195,17 @@ layers_voicings = {
 }
 
 
-def note_midi(note: str, octave: Optional[int] = None) -> int:
+"""
+The MIDI value of every note name with an octave (0-6) that :note_midi:
+reads, keyed both as text and as ASCII bytes, so reading one is a lookup.
+"""
+NOTE_MIDI : Mapping[Union[str, bytes], int] = {}
+for _name, _value in NOTE_VALUES.items():
+  for _octave in range(7):
+    NOTE_MIDI[f'{_name}{_octave}'] = NOTE_MIDI[f'{_name}{_octave}'.encode('ascii')] = _value + 12*(_octave+1)
+
+
+def note_midi(note: Union[str, bytes], octave: Optional[int] = None) -> int:
   """
   Returns absolute midi value of a note specified as pitch+octave, eg: A3
   
@@ -213,13 +223,12 @@ def note_midi(note: str, octave: Optional[int] = None) -> int:
   45
   >>> note_midi('A0')
   21
+  >>> note_midi(b'A0')
+  21
   """
   if octave is not None:
-    return NoteValue[note] + 12*(octave+1)
-  elif re.match('[A-G][#b]?[0-6]', note):
-    return NoteValue[note[:-1]] + 12*(int(note[-1]) + 1)
-  else:
-    return None
+    return NOTE_VALUES[note] + 12*(octave+1)
+  return NOTE_MIDI.get(note)
 
 
 def normalize_layers(layers: Union[str, List[LayerInterval]]) -> str:
@@ -244,23 +253,11 @@ def normalize_layers(layers: Union[str, List[LayerInterval]]) -> str:
   >>> normalize_layers('9o5+*')
   'o5+*9'
   """
-  #first, make a consistent format (str, because the rest is a mess)
-  base = (set(LayerInterval(x) for x in layers)
-          if not isinstance(layers, str)
-          else set(LayerInterval[x] for x in layers))
-  #strategy - remove the 1/5, sort the rest, append the 5 in front.
-  base.discard(0)
-  [has6, has7, has8] = [LayerInterval(x) in base for x in (6,7,8)]
-  for x in range(6, 8+1):
-    base.discard(x)
-  
-  return (
-    (LayerInterval(6).name if has6 else '') +
-    (LayerInterval(7).name if has7 else '') +
-    (LayerInterval(8).name if has8 else '') +
-    ''.join(x.name for x in sorted(base))
-  )
-  
+  return _caches['normalize_layers'](layers if isinstance(layers, str) else tuple(layers))
+
+
+def _normalize_layers(layers) -> str:
+  return mask_layers(layers_mask(layers) & ~ROOT_BIT)
 
 
 def tone_to_voicing(tones: Iterable[Union[int, str]]) -> List[int]:
@@ -284,17 +281,82 @@ def tone_to_voicing(tones: Iterable[Union[int, str]]) -> List[int]:
   [0, 7, 9, 12, 16, 19, 26]
   >>> tone_to_voicing([1, '*', 'Δ', '='])
   [0, 10, 16, 21]
+  >>> tone_to_voicing(encode_tones('1561Δ5_'))
+  [0, 7, 9, 12, 16, 19, 26]
   
-  :param tones: a list of numbers or symbols corresponding to layer symbols (values of interval_layer).
+  :param tones: a list of numbers or symbols corresponding to layer symbols (values of interval_layer),
+    or the bytes of :encode_tones:.
   :return: a list of absolute voicings that can be used by :build_chord:.
   """
+  if isinstance(tones, bytes): return list(encoded_voicing(tones))
+  return list(_caches['tone_to_voicing'](tones if isinstance(tones, str) else tuple(map(str, tones))))
+
+
+def _tone_to_voicing(tones) -> tuple:
+  return _stack_tones([LAYER_VALUES[x] for x in tones])
+
+
+def _stack_tones(values) -> tuple:
   l = []
-  for tone in t.get(list(map(str, tones)), LayerInterval):
+  for tone in values:
     if len(l) == 0 or tone > l[-1]:
-      l.append(int(tone))
+      l.append(tone)
     else:
       l.append( (1+(l[-1] - tone)//12)*12 + tone )
-  return l
+  return tuple(l)
+
+
+"""
+The code of each layer symbol in :encode_tones:, its interval plus 12 so
+that every code (the low bass '0' included) fits in a byte.
+"""
+TONE_CODES : Mapping[str, int] = {name: value + 12 for name, value in LAYER_VALUES.items()}
+
+
+def encode_tones(tones: Iterable[Union[int, str]]) -> bytes:
+  """
+  A stack of chord tones, as :tone_to_voicing: reads them, encoded one byte per tone.
+  
+  Encode stacks once, where they are written down, and :encoded_voicing:
+  voices them without looking up or allocating anything per tone.
+  
+  >>> encode_tones('15Δ')
+  b'\\x0c\\x13\\x10'
+  """
+  return bytes(TONE_CODES[x] for x in (tones if isinstance(tones, str) else map(str, tones)))
+
+
+"""
+The voicings :encoded_voicing: has worked out. Encodings are written down by
+hand or come from the catalog, so in play there are only ever a few hundred,
+and a plain dict is cheaper to hit than an LRU cache. It is bounded like the
+other voicing caches (see :configure_cache:), but emptied when it fills up
+rather than evicting one entry at a time.
+"""
+_encoded_voicings : Dict[bytes, tuple] = {}
+
+
+def encoded_voicing(codes: Union[bytes, Iterable[int]]) -> tuple:
+  """
+  :tone_to_voicing: of tones encoded by :encode_tones: (as bytes, or any
+  sequence of the same codes as ints), as a tuple that is shared, not copied.
+  
+  >>> encoded_voicing(encode_tones('1561Δ5_'))
+  (0, 7, 9, 12, 16, 19, 26)
+  >>> encoded_voicing([12, 19])
+  (0, 7)
+  """
+  try:
+    return _encoded_voicings[codes]
+  except (KeyError, TypeError):
+    codes = bytes(codes)
+    if codes in _encoded_voicings: return _encoded_voicings[codes]
+    voicing = _stack_tones([c - 12 for c in codes])
+    if _maxsize is not None and len(_encoded_voicings) >= _maxsize:
+      _encoded_voicings.clear()
+    if _maxsize != 0:
+      _encoded_voicings[codes] = voicing
+    return voicing
 
 
 def default_voicing(layers: str):
@@ -307,26 +369,287 @@ def default_voicing(layers: str):
   return [LayerInterval[x] for x in layers]
 
 
-def voicing(layers: str, inversion: bool = False):
-  base = (tone_to_voicing(next(iter(layers_voicings[layers])))
-          if layers in layers_voicings
-          else default_voicing(layers))
+def voicing(layers: Union[str, int], inversion: bool = False):
+  return list(_caches['voicing'](layers, inversion))
+
+
+def _voicing(layers: Union[str, int], inversion: bool = False) -> tuple:
+  if isinstance(layers, int):
+    layers &= ~ROOT_BIT
+    base = (list(mask_voicings[layers])
+            if layers in mask_voicings
+            else list(next(iter(catalog_voicings(layers)), None) or mask_default_voicing(layers)))
+  else:
+    base = (tone_to_voicing(next(iter(layers_voicings[layers])))
+            if layers in layers_voicings
+            else list(next(iter(catalog_voicings(layers_mask(layers))), None) or default_voicing(layers)))
   # naive inversion - if inverted, drop the root at the front of the chord
   # ideally we'd have separate voicings for the inversions.
-  return base[1:] + [base[0]+12] if inversion else base
+  return tuple(base[1:] + [base[0]+12] if inversion else base)
 
 
 def build_chord(voicing, root):
   return list(map(lambda v: root+v, voicing))
 
 
-def chord(root: Union[int, str], layers: str, inversion: bool = False):
-  return build_chord(
-    [0, *voicing(layers, inversion)],
-    int(root)
-    if isinstance(root, int) or root.isnumeric()
-    else note_midi(root) or 48)
+def chord(root: Union[int, str], layers: Union[str, int], inversion: bool = False):
+  return build_chord([0, *voicing(layers, inversion)], _root_midi(root))
 
 
 def symbol_chord(root, symbol):
-  return chord(root, symbol_layers.get(symbol, '5Δ8'))
+  return chord(root, symbol_masks.get(symbol, symbol_masks['']))
+
+
+"""
+Layer stacks as bitmasks.
+
+Strings of layer symbols need a set and a sort to compare, so the hot paths
+can use an int instead: bit n is set when the interval of n semitones is in
+the stack, and the low bass (-12) lives on bit 23, so a whole stack fits in 24
+bits. Normalizing is clearing the root bit, a union is `|`, containment is
+`&`, and masks hash like any int. Masks stand for normalized stacks, so two
+layer strings give the same mask exactly when they normalize the same.
+"""
+LAYER_BITS : Mapping[str, int] = {name: (value if value >= 0 else 23) for name, value in LAYER_VALUES.items()}
+ROOT_BIT = 1 << LAYER_BITS['1']
+
+
+def layers_mask(layers: Union[str, int, Iterable[Union[int, LayerInterval]]]) -> int:
+  """
+  Convert a stack of layers (symbols, intervals, or a mask) into a mask.
+  
+  >>> layers_mask('5Δ8') == layers_mask('8Δ55')
+  True
+  >>> bin(layers_mask('1Δ'))
+  '0b10001'
+  """
+  if isinstance(layers, int): return layers
+  mask = 0
+  if isinstance(layers, str):
+    for x in layers:
+      mask |= 1 << LAYER_BITS[x]
+  else:
+    for x in layers:
+      mask |= 1 << LAYER_BITS[LayerInterval(x).name]
+  return mask
+
+
+def mask_contains(mask: int, layers: Union[str, int]) -> bool:
+  """Whether every layer in `layers` is in the mask."""
+  other = layers_mask(layers)
+  return mask & other == other
+
+
+def _mask_table(bits: List[int]):
+  """
+  Names and values of the layers in every combination of `bits`, in order,
+  indexed by the bits' packed value.
+  
+  Each bit doubles the table: the combinations with it are those without it,
+  plus it on the end, so every entry costs one concatenation (this runs at import).
+  """
+  by_bit = {b: name for name, b in LAYER_BITS.items()}
+  names, values = [''], [[]]
+  for b in bits:
+    # some bits (16, 19) are no layer and never set, so they add nothing
+    name = by_bit.get(b, '')
+    names += [n + name for n in names]
+    values += [v + [LAYER_VALUES[name]] if name else v for v in values]
+  return names, values
+
+# normalized order is the 5s (o5+) first, then the rest by interval, so a mask is
+# split into three runs of bits and each is looked up in a precomputed table.
+(_FIVE_NAMES, _FIVE_VALUES), (_LOW_NAMES, _LOW_VALUES), (_HIGH_NAMES, _HIGH_VALUES) = (
+  _mask_table([6, 7, 8]), _mask_table([23, 2, 3, 4, 5]), _mask_table(list(range(9, 22))))
+
+
+def _low(mask: int) -> int:
+  return (mask >> 23 & 1) | (mask >> 1 & 0b11110)
+
+
+def mask_layers(mask: int) -> str:
+  """
+  The normalized string of layer symbols for a mask.
+  
+  >>> mask_layers(layers_mask('9!Δ5_'))
+  '5_Δ9!'
+  """
+  return _FIVE_NAMES[mask >> 6 & 7] + _LOW_NAMES[_low(mask)] + _HIGH_NAMES[mask >> 9 & 0x1fff]
+
+
+def mask_default_voicing(mask: int) -> List[int]:
+  """:default_voicing: of the normalized stack for a mask, as plain ints."""
+  return _FIVE_VALUES[mask >> 6 & 7] + _LOW_VALUES[_low(mask)] + _HIGH_VALUES[mask >> 9 & 0x1fff]
+
+
+"""The first voicing of each entry in :layers_voicings:, keyed by mask."""
+mask_voicings : Mapping[int, List[int]] = {
+  layers_mask(k): list(_tone_to_voicing(next(iter(v)))) for k, v in layers_voicings.items()}
+
+"""The layers of each entry in :symbol_layers:, as masks."""
+symbol_masks : Mapping[str, int] = {k: layers_mask(v) for k, v in symbol_layers.items()}
+
+
+
+def _root_midi(root: Union[int, str]) -> int:
+  return int(root) if isinstance(root, int) or root.isnumeric() else note_midi(root) or 48
+
+
+def _batch_tone_to_voicing(tones, lengths):
+  """
+  :tone_to_voicing: over the rows of a padded matrix of intervals.
+  
+  Each tone depends on the one before it, so this walks the columns, but
+  every row of a column is computed at once.
+  """
+  import numpy as np
+  v = tones.copy()
+  for j in range(1, tones.shape[1]):
+    prev, tone = v[:, j-1], tones[:, j]
+    bumped = (1 + (prev - tone)//12)*12 + tone
+    v[:, j] = np.where((tone > prev) | (j >= lengths), tone, bumped)
+  return v
+
+
+def batch_chords(roots: Iterable[Union[int, str]], layers: Iterable[Union[str, int]],
+                 inversions: Optional[Iterable[bool]] = None, pad: int = -1):
+  """
+  Build many chords at once, giving the same notes as calling :chord: on each.
+  
+  >>> notes, lengths = batch_chords([48, 'A2'], ['5Δ8', layers_mask('5-*')], [False, True])
+  >>> notes.tolist()
+  [[48, 48, 55, 60, 64], [45, 48, 55, 64, -1]]
+  >>> lengths.tolist()
+  [5, 4]
+  
+  :param roots: midi values or note names, as accepted by :chord:.
+  :param layers: layer stacks as strings or masks.
+  :param inversions: whether each chord is inverted (default: none are).
+  :param pad: value of the unused cells at the end of short rows.
+  :return: an (n, width) matrix of notes padded with `pad`, and the number of notes in each row.
+  """
+  import numpy as np
+  roots = np.array([_root_midi(r) for r in roots], dtype=np.int64)
+  layers = list(layers)
+  inversions = (np.zeros(len(layers), dtype=bool) if inversions is None
+                else np.asarray(list(inversions), dtype=bool))
+  if not len(roots) == len(layers) == len(inversions):
+    raise ValueError('roots, layers and inversions must have the same length')
+  
+  # voice each distinct stack once: the tones of its first listed voicing, its
+  # catalog voicing, or its layers in order
+  keys = {}
+  index = np.array([keys.setdefault(x, len(keys)) for x in layers], dtype=np.int64)
+  rows, needs_voicing = [], []
+  for x in keys:
+    if isinstance(x, int):
+      x &= ~ROOT_BIT
+      cataloged = next(iter(catalog_voicings(x)), None) if x not in mask_voicings else None
+      needs_voicing.append(False)
+      rows.append(mask_voicings[x] if x in mask_voicings else cataloged or mask_default_voicing(x))
+    else:
+      cataloged = next(iter(catalog_voicings(layers_mask(x))), None) if x not in layers_voicings else None
+      # listed string voicings are tones that still need voicing, the rest are stacked in order
+      needs_voicing.append(x in layers_voicings)
+      rows.append(list(cataloged) if cataloged else
+                  [LAYER_VALUES[v] for v in (next(iter(layers_voicings[x])) if x in layers_voicings else x)])
+  width = max([len(r) for r in rows] + [0])
+  tones = np.zeros((len(rows), width), dtype=np.int64)
+  unique_lengths = np.array([len(r) for r in rows], dtype=np.int64)
+  for i, r in enumerate(rows):
+    tones[i, :len(r)] = r
+  needs_voicing = np.array(needs_voicing, dtype=bool)
+  voiced = np.where(needs_voicing[:, None], _batch_tone_to_voicing(tones, unique_lengths), tones)
+  
+  base, lengths = voiced[index], unique_lengths[index]
+  if np.any(inversions & (lengths == 0)):
+    raise IndexError('an empty voicing cannot be inverted')
+  # naive inversion, as in :voicing: - the lowest tone moves up an octave to the top
+  inverted = np.roll(base, -1, axis=1)
+  if width > 0:
+    inverted[np.arange(len(base)), np.maximum(lengths - 1, 0)] = base[:, 0] + 12
+  base = np.where(inversions[:, None], inverted, base)
+  
+  notes = np.concatenate([np.zeros((len(base), 1), dtype=np.int64), base], axis=1) + roots[:, None]
+  lengths = lengths + 1
+  notes[np.arange(width + 1)[None, :] >= lengths[:, None]] = pad
+  return notes, lengths
+
+
+"""
+Caching.
+
+The same few chords are voiced over and over (every bar, on every pad), so
+:normalize_layers:, :tone_to_voicing: and :voicing: keep their results in
+LRU caches. Cached values are immutable and the public functions hand out
+fresh lists, so callers can still modify what they get back.
+"""
+_caches = {}
+_maxsize : Optional[int] = 1024
+
+def configure_cache(maxsize: Optional[int] = 1024):
+  """
+  Replace the voicing caches (dropping their contents).
+  
+  :param maxsize: entries per cache before the least recently used is evicted
+    (or, for :encoded_voicing:, before it is emptied); None never evicts, and
+    0 turns caching off.
+  """
+  global _maxsize
+  _maxsize = maxsize
+  _encoded_voicings.clear()
+  for name, f in (('normalize_layers', _normalize_layers),
+                  ('tone_to_voicing', _tone_to_voicing),
+                  ('voicing', _voicing)):
+    _caches[name] = lru_cache(maxsize=maxsize)(f) if maxsize != 0 else f
+
+
+def cache_size() -> Optional[int]:
+  """The `maxsize` the voicing caches were last configured with."""
+  return _maxsize
+
+
+def cache_info() -> Mapping[str, tuple]:
+  """Hits, misses, maximum and current size of each voicing cache."""
+  return {name: f.cache_info() for name, f in _caches.items() if hasattr(f, 'cache_info')}
+
+
+"""
+Generated voicings.
+
+A :catalog.Catalog: ranks voicings for every stack a tower can make. Once
+installed, stacks missing from :layers_voicings: are voiced with the
+catalog's best instead of :default_voicing:.
+"""
+_catalog = None
+
+def use_catalog(catalog):
+  """Voice unlisted stacks from `catalog` (None to stop), dropping cached voicings; returns the one it replaces."""
+  global _catalog
+  previous, _catalog = _catalog, catalog
+  for f in _caches.values():
+    if hasattr(f, 'cache_clear'): f.cache_clear()
+  return previous
+
+
+def catalog_voicings(mask: int) -> List[tuple]:
+  """The installed catalog's voicings of a stack, best first (none without a catalog)."""
+  if _catalog is None: return []
+  return _catalog.get(mask & ~ROOT_BIT, [])
+
+
+def warm_up():
+  """
+  Voice every chord in :symbol_layers: and :layers_voicings: so that the
+  first chord played at startup is served from the cache like the rest.
+  """
+  for layers in chain(symbol_layers.values(), layers_voicings):
+    normalize_layers(layers)
+    for inversion in (False, True):
+      voicing(layers, inversion)
+      voicing(layers_mask(layers), inversion)
+  for voicings in layers_voicings.values():
+    for tones in voicings:
+      tone_to_voicing(tones)
+
+configure_cache()
@@ -1,6 +1,10 @@
-from hypothesis import given
+from hypothesis import given, settings
 import hypothesis.strategies as st
-from harmonious.music import LayerInterval, note_midi, normalize_layers, tone_to_voicing
+from harmonious import music
+from harmonious.catalog import install, rank_voicings
+from harmonious.music import LayerInterval, note_midi, normalize_layers, tone_to_voicing, \
+  voicing, chord, symbol_chord, symbol_layers, layers_mask, mask_layers, mask_contains, \
+  configure_cache, cache_info, warm_up, batch_chords, layers_voicings, encode_tones, encoded_voicing, LAYER_VALUES
 
 
 # notes an octave apart should normalize to the same value when mod by 12.
@@ -11,6 +15,16 @@ def test_note_midi_octaves_correct(letter, accidental, octave):
   assert note_midi(letter + accidental, -1) == note_midi(letter+accidental, octave) % 12
 
 
+# the table of names with octaves agrees with the computed value, as text and as bytes
+@given(st.text(alphabet='ABCDEFG', min_size=1, max_size=1),
+       st.sampled_from(['', 'b', '#']),
+       st.integers(min_value=0, max_value=9))
+def test_note_midi_table_matches_octave(letter, accidental, octave):
+  name = f'{letter}{accidental}{octave}'
+  expected = note_midi(letter + accidental, octave) if octave <= 6 else None
+  assert note_midi(name) == note_midi(name.encode('ascii')) == expected
+
+
 #rotating the input should not change the output
 @given(st.text(alphabet=[x.name for x in LayerInterval]), st.integers(min_value=1))
 def test_normalize_layers_rotation(layers, rotation):
@@ -47,8 +61,109 @@ def test_tone_to_voicing_monotonic(tones):
     assert voicing[i] < voicing[i+1]
 
 
+@given(st.lists(st.sampled_from([x.name for x in LayerInterval] + [n for n in range(10) if str(n) in LAYER_VALUES])))
+def test_encoded_voicing_matches_tone_to_voicing(tones):
+  codes = encode_tones(tones)
+  assert list(encoded_voicing(codes)) == list(encoded_voicing(list(codes))) == tone_to_voicing(tones)
+  assert tone_to_voicing(codes) == tone_to_voicing(tones)
+
+
 @given(st.integers(min_value = 2, max_value=11), st.integers(min_value = 2, max_value = 11))
 def test_tone_to_voicing_octave_bumps_up_values(left, right):
   low, high = (LayerInterval(left), LayerInterval(right)) if left < right else (LayerInterval(right) , LayerInterval(left))
   assert tone_to_voicing([low, high])[-1] + (12 if left != right else 0) == tone_to_voicing([low, '1', high])[-1]
   
+
+
+@given(st.text(alphabet=[x.name for x in LayerInterval]))
+def test_mask_round_trips_to_normalized_layers(layers):
+  assert mask_layers(layers_mask(layers)) == normalize_layers(layers + '1')
+  assert layers_mask(normalize_layers(layers)) == layers_mask(layers) & ~layers_mask('1')
+
+
+@given(st.text(alphabet=[x.name for x in LayerInterval]), st.text(alphabet=[x.name for x in LayerInterval]))
+def test_mask_union_and_contains(left, right):
+  union = layers_mask(left) | layers_mask(right)
+  assert union == layers_mask(left + right)
+  assert mask_contains(union, left) and mask_contains(union, right)
+
+
+# a mask voices the same as the normalized string it stands for
+@given(st.text(alphabet=[x.name for x in LayerInterval], min_size=1), st.booleans())
+def test_mask_voicing_matches_string(layers, inversion):
+  normalized = normalize_layers(layers)
+  if normalized == '': return
+  assert voicing(layers_mask(layers), inversion) == voicing(normalized, inversion)
+  assert chord('C3', layers_mask(layers), inversion) == chord('C3', normalized, inversion)
+
+
+def test_symbol_chord_uses_masks():
+  for symbol, layers in symbol_layers.items():
+    assert symbol_chord('A2', symbol) == chord('A2', layers)
+
+
+def test_warm_up_serves_first_chord_from_cache():
+  configure_cache(512)
+  warm_up()
+  before = cache_info()['voicing']
+  chord('C3', symbol_layers['m7'])
+  after = cache_info()['voicing']
+  assert after.hits == before.hits + 1 and after.misses == before.misses
+  assert after.maxsize == 512
+  configure_cache()
+
+
+def test_encoded_voicings_are_bounded_by_configure_cache():
+  stacks = [encode_tones(t) for t in ('15', '15Δ', '158', '15Δ8')]
+  try:
+    configure_cache(2)
+    voicings = [encoded_voicing(c) for c in stacks]
+    assert len(music._encoded_voicings) <= 2
+    assert [encoded_voicing(c) for c in stacks] == voicings
+    configure_cache(0)
+    assert [encoded_voicing(c) for c in stacks] == voicings and not music._encoded_voicings
+  finally:
+    configure_cache()
+
+
+def test_cached_voicings_can_be_modified_by_callers():
+  v = voicing('5Δ8')
+  v.append(99)
+  assert voicing('5Δ8') == tone_to_voicing('151Δ')
+
+
+batched_chords = st.lists(st.tuples(st.integers(min_value=0, max_value=100),
+                                    st.one_of(st.sampled_from(list(layers_voicings) + list(symbol_layers.values())),
+                                              st.text(alphabet=[x.name for x in LayerInterval], min_size=1)),
+                                    st.booleans(),
+                                    st.booleans()),
+                          max_size=20)
+
+# ranked voicings for every named stack, as a catalog would hand them out
+cataloged = {mask & ~music.ROOT_BIT: rank_voicings(mask, k=1)
+             for mask in map(layers_mask, [*symbol_layers.values(), *layers_voicings])}
+
+
+@given(batched_chords)
+def test_batch_chords_matches_chord(chords):
+  check_batch_chords(chords)
+
+
+@settings(max_examples=30)
+@given(batched_chords)
+def test_batch_chords_matches_chord_with_a_catalog(chords):
+  try:
+    install(cataloged)
+    check_batch_chords(chords + [(48, symbol_layers['m9'], False, True), (48, symbol_layers['m9'], True, False)])
+  finally:
+    install(None)
+
+
+def check_batch_chords(chords):
+  chords = [(root, layers_mask(layers) if as_mask else layers, inversion)
+            for root, layers, inversion, as_mask in chords if normalize_layers(layers) != '']
+  notes, lengths = batch_chords([c[0] for c in chords], [c[1] for c in chords], [c[2] for c in chords])
+  assert len(notes) == len(lengths) == len(chords)
+  for row, length, c in zip(notes.tolist(), lengths.tolist(), chords):
+    assert row[:length] == chord(*c)
+    assert all(x == -1 for x in row[length:])
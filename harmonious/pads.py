@@ -0,0 +1,218 @@
+"""
+Pads: the regions of the mat that each hold one chord.
+
+Objects from the tracker have x/y positions normalized to 0..1. A layout
+assigns each object to the pad whose region contains it, once per frame,
+so each pad's debouncer only ever sees its own objects. To keep that cheap
+for layouts with many pads, the unit square is divided into a grid and each
+cell remembers the few regions that overlap it.
+
+The debouncer then turns the noisy stream of objects on a pad into changes
+of the pad's state: a marker appears, turns to a different angle bucket, or
+has not been seen for a while and is dropped. A :FramePump: runs every
+pad's debouncer once per frame from the tracker.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import heapq
+import math
+import queue
+import time
+
+from harmonious.latency import STAMP, latency
+
+Region = Tuple[float, float, float, float]
+
+
+class PadLayout:
+  """
+  Pads as regions (x0, y0, x1, y1), each containing x0 <= x < x1 and y0 <= y < y1.
+
+  Regions may overlap; a point belongs to the first pad that contains it.
+  """
+  def __init__(self, regions: Sequence[Region], resolution: int = 16):
+    self.regions = [tuple(r) for r in regions]
+    self.resolution = resolution
+    self.cells : List[Tuple[int, ...]] = []
+    for cy in range(resolution):
+      for cx in range(resolution):
+        x0, y0 = cx / resolution, cy / resolution
+        x1, y1 = (cx+1) / resolution, (cy+1) / resolution
+        self.cells.append(tuple(i for i, (rx0, ry0, rx1, ry1) in enumerate(self.regions)
+                                if rx0 < x1 and x0 < rx1 and ry0 < y1 and y0 < ry1))
+
+  @classmethod
+  def strips(cls, n: int) -> 'PadLayout':
+    """
+    n equal vertical strips, numbered right to left, as on the original mat.
+
+    >>> PadLayout.strips(4).pad(0.9, 0.5)
+    0
+    """
+    return StripLayout(n)
+
+  @classmethod
+  def grid(cls, columns: int, rows: int) -> 'PadLayout':
+    """columns x rows equal pads, numbered left to right, top to bottom."""
+    return cls([(c/columns, r/rows, (c+1)/columns, (r+1)/rows)
+                for r in range(rows) for c in range(columns)])
+
+  def __len__(self):
+    return len(self.regions)
+
+  def pad(self, x: float, y: float) -> Optional[int]:
+    """the pad containing a point, or None"""
+    if 0 <= x < 1 and 0 <= y < 1:
+      candidates = self.cells[int(y*self.resolution)*self.resolution + int(x*self.resolution)]
+    else:
+      candidates = range(len(self.regions))
+    for i in candidates:
+      x0, y0, x1, y1 = self.regions[i]
+      if x0 <= x < x1 and y0 <= y < y1:
+        return i
+    return None
+
+  def partition(self, objects: Iterable) -> List[list]:
+    """the objects (anything with .x and .y) on each pad"""
+    pads = [[] for _ in self.regions]
+    for o in objects:
+      i = self.pad(o.x, o.y)
+      if i is not None:
+        pads[i].append(o)
+    return pads
+
+
+class StripLayout(PadLayout):
+  """equal vertical strips, where the pad is computed from x directly"""
+  def __init__(self, n: int):
+    super().__init__([((n-1-i)/n, -math.inf, (n-i)/n, math.inf) for i in range(n)], resolution=1)
+    self.n = n
+
+  def pad(self, x: float, y: float) -> Optional[int]:
+    i = self.n - 1 - math.floor(self.n * x)
+    return i if 0 <= i < self.n else None
+
+
+def angle_bucket(angle: float) -> int:
+  """which of the 6 orientations a marker's angle (in radians) is in"""
+  return round(angle) % 6
+
+
+def make_debouncer(sender: Callable[[dict], None], i: int = 0, timeout: float = 0.2,
+                   angle_hysteresis: float = 0.1, position_hysteresis: Optional[float] = None,
+                   clock: Callable[[], float] = time.monotonic):
+  """
+  Create a cache to throttle events coming from the TUIO server, and output diffs of what changes.
+  
+  Each call passes the objects currently on the pad. Markers that turned into a
+  new angle bucket (by more than `angle_hysteresis` radians past its edge), moved
+  more than `position_hysteresis` (if set), appeared, or haven't been seen for
+  `timeout` seconds are sent as `{i: {marker: [y, angle bucket] or None}}`, where
+  None means the marker left the pad. Only the changed markers are sent.
+  
+  Deadlines live on a min-heap, and a marker that is seen again only moves
+  its deadline in place; the heap entry is fixed up if it reaches the top.
+  
+  If the objects come with the stamp of their frame, it is passed on with
+  the changes under :latency.STAMP:.
+  
+  :param sender: takes the diff and sends it (by printing, sending to a socket, etc)
+  :param i: the pad number
+  :return: a function that does the debouncing
+  """
+  d : Dict[int, list] = {}  # marker -> [deadline, y, angle bucket]
+  deadlines : List[Tuple[float, int]] = []
+  def debounce(objects, stamp: Optional[float] = None):
+    now = clock()
+    changes = {}
+    for o in objects:
+      entry = d.get(o.markerId)
+      if entry is None:
+        entry = d[o.markerId] = [now + timeout, o.y, angle_bucket(o.angle)]
+        heapq.heappush(deadlines, (entry[0], o.markerId))
+        changes[o.markerId] = entry[1:]
+        continue
+      entry[0] = now + timeout
+      changed = False
+      bucket = angle_bucket(o.angle)
+      # only switch buckets once the angle is clearly inside the new one
+      if (bucket != entry[2] and angle_bucket(o.angle - angle_hysteresis) == bucket
+          and angle_bucket(o.angle + angle_hysteresis) == bucket):
+        entry[2] = bucket
+        changed = True
+      if position_hysteresis is not None and abs(o.y - entry[1]) > position_hysteresis:
+        entry[1] = o.y
+        changed = True
+      if changed:
+        changes[o.markerId] = entry[1:]
+    
+    while deadlines and deadlines[0][0] <= now:
+      _, marker = heapq.heappop(deadlines)
+      entry = d.get(marker)
+      if entry is None: continue
+      if entry[0] > now:
+        # seen since this entry was pushed
+        heapq.heappush(deadlines, (entry[0], marker))
+      else:
+        del d[marker]
+        changes[marker] = None
+    
+    if changes:
+      if stamp is None:
+        sender({i: changes})
+      else:
+        latency.record('debounce', stamp)
+        sender({i: changes, STAMP: stamp})
+  return debounce
+
+
+class FramePump:
+  """
+  Debounces every pad of a mat once per completed TUIO frame.
+
+  :meth:`on_frame` is the session's frame listener: it runs on the server
+  thread and only queues the frame. :meth:`step` waits for a frame (or
+  `timeout`, so that lost towers still expire) and passes the objects from
+  `objects()` to each pad's debouncer. Frames that arrive while a step is
+  busy, or sooner than `min_interval` after the last step, are coalesced
+  into the next one, which is stamped with the oldest frame it covers.
+
+  :param sender: takes each pad's changes, as :make_debouncer:'s sender does.
+  :param objects: returns the objects currently on the mat.
+  """
+  def __init__(self, layout, sender: Callable[[dict], None], objects: Callable[[], Iterable],
+               min_interval: float = 0.0, timeout: float = 0.2,
+               clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+    self.layout = layout
+    self.objects = objects
+    self.min_interval = min_interval
+    self.timeout = timeout
+    self.clock = clock
+    self.sleep = sleep
+    self.debouncers = [make_debouncer(sender, i, clock=clock) for i in range(len(layout))]
+    self.frames : queue.Queue = queue.Queue()
+    self.last = clock()
+    self.coalesced = 0
+
+  def on_frame(self, diff):
+    if diff.profile == "/tuio/2Dobj":
+      self.frames.put(diff)
+
+  def step(self) -> int:
+    """update every pad once, returning how many frames the update covers"""
+    try:
+      stamp = self.frames.get(timeout=self.timeout).time
+      covered = 1
+    except queue.Empty:
+      stamp, covered = None, 0
+    if self.min_interval > 0:
+      self.sleep(max(0.0, self.last + self.min_interval - self.clock()))
+    # anything that arrived while we were busy is covered by this update
+    while not self.frames.empty():
+      self.frames.get_nowait()
+      covered += 1
+    self.coalesced += max(0, covered - 1)
+    self.last = self.clock()
+    # each pad's debouncer only sees the objects on that pad
+    for debounce, objects in zip(self.debouncers, self.layout.partition(self.objects())):
+      debounce(objects, stamp)
+    return covered
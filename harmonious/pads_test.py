@@ -0,0 +1,134 @@
+import math
+import pytest
+from types import SimpleNamespace
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.latency import STAMP
+from harmonious.pads import FramePump, PadLayout, make_debouncer
+from harmonious.testing import feed, tuio_bundle
+from harmonious.tuio import TuioSession
+
+
+# strips assign objects exactly as the connector's original floor(n*x) == n-1-i test did
+@given(st.integers(min_value=1, max_value=40),
+       st.floats(min_value=-0.5, max_value=1.5), st.floats(min_value=-0.5, max_value=1.5))
+def test_strips_match_floor(n, x, y):
+  expected = n-1-math.floor(n*x)
+  assert PadLayout.strips(n).pad(x, y) == (expected if 0 <= expected < n else None)
+
+
+@given(st.lists(st.tuples(st.floats(0, 0.999), st.floats(0, 0.999)), max_size=50))
+def test_partition_matches_scanning_every_pad(points):
+  layout = PadLayout([(0, 0, 0.5, 0.5), (0.25, 0.25, 1, 1), (0, 0.6, 0.3, 1), (0.9, 0, 1, 0.1)], resolution=8)
+  objects = [SimpleNamespace(x=x, y=y) for x, y in points]
+  pads = layout.partition(objects)
+  for o in objects:
+    first = next((i for i, (x0, y0, x1, y1) in enumerate(layout.regions)
+                  if x0 <= o.x < x1 and y0 <= o.y < y1), None)
+    assert [i for i, p in enumerate(pads) if o in p] == ([first] if first is not None else [])
+
+
+def test_grid():
+  layout = PadLayout.grid(3, 2)
+  assert len(layout) == 6
+  assert layout.pad(0.1, 0.1) == 0 and layout.pad(0.5, 0.9) == 4
+
+
+def tower(markerId, angle=0.0, y=0.5):
+  return SimpleNamespace(markerId=markerId, angle=angle, x=0.5, y=y)
+
+
+def make_test_debouncer(**options):
+  now = [0.0]
+  sent = []
+  return make_debouncer(sent.append, 3, clock=lambda: now[0], **options), now, sent
+
+
+def test_debouncer_sends_only_changes():
+  debounce, now, sent = make_test_debouncer()
+  debounce([tower(25), tower(29, angle=3.0)])
+  assert sent == [{3: {25: [0.5, 0], 29: [0.5, 3]}}]
+  now[0] = 0.05
+  debounce([tower(25), tower(29, angle=3.0)])
+  assert len(sent) == 1
+  debounce([tower(25, angle=2.0), tower(29, angle=3.0)])
+  assert sent[-1] == {3: {25: [0.5, 2]}}
+
+
+def test_debouncer_expires_after_timeout_not_whole_seconds():
+  debounce, now, sent = make_test_debouncer(timeout=0.2)
+  debounce([tower(25), tower(29)])
+  for step in range(1, 4):
+    now[0] = 0.1*step
+    debounce([tower(25)])
+  # 29 was last seen at 0, so by 0.3 it is gone; 25 is still being refreshed
+  assert sent[-1] == {3: {29: None}}
+  now[0] = 0.55
+  debounce([])
+  assert sent[-1] == {3: {25: None}}
+  assert len(sent) == 3
+
+
+def test_debouncer_angle_hysteresis():
+  debounce, now, sent = make_test_debouncer(angle_hysteresis=0.2)
+  debounce([tower(25, angle=0.4)])
+  # just across the edge between buckets 0 and 1: not yet
+  debounce([tower(25, angle=0.6)])
+  assert len(sent) == 1
+  debounce([tower(25, angle=0.8)])
+  assert sent[-1] == {3: {25: [0.5, 1]}}
+
+
+def test_debouncer_position_hysteresis():
+  debounce, now, sent = make_test_debouncer(position_hysteresis=0.05)
+  debounce([tower(25, y=0.5)])
+  debounce([tower(25, y=0.53)])
+  assert len(sent) == 1
+  debounce([tower(25, y=0.6)])
+  assert sent[-1] == {3: {25: [0.6, 0]}}
+
+
+def pumped_mat(pads=2, **options):
+  session = TuioSession()
+  sent, now = [], [0.0]
+  objects = lambda: list(session.profiles["/tuio/2Dobj"].objects.values())
+  pump = FramePump(PadLayout.strips(pads), sent.append, objects, clock=lambda: now[0], **options)
+  session.frameListeners.append(pump.on_frame)
+  return session, pump, sent, now
+
+
+def pad_changes(sent):
+  return [{k: v for k, v in changes.items() if k != STAMP} for changes in sent]
+
+
+def test_frames_are_debounced_per_pad():
+  session, pump, sent, now = pumped_mat(timeout=0.01)
+  # pad 0 is the right half of the mat
+  feed(session, tuio_bundle(1, [(1, 12, 0.75, 0.0), (2, 29, 0.25, 3.0)]))
+  assert pump.step() == 1
+  assert pad_changes(sent) == [{0: {12: [0.5, 0]}}, {1: {29: [0.5, 3]}}]
+  feed(session, tuio_bundle(2, [(1, 12, 0.75, 0.0), (2, 29, 0.25, 3.0)]))
+  pump.step()
+  assert len(sent) == 2
+  # a tower that left is dropped once the debouncer times out, even without frames
+  feed(session, tuio_bundle(3, [(1, 12, 0.75, 0.0)]))
+  pump.step()
+  assert len(sent) == 2
+  now[0] = 1.0
+  assert pump.step() == 0
+  assert pad_changes(sent)[2:] == [{1: {29: None}}]
+
+
+def test_frames_that_arrive_while_busy_are_coalesced():
+  slept = []
+  session, pump, sent, now = pumped_mat(1, min_interval=0.5, sleep=slept.append)
+  now[0] = 0.2
+  for fseq, angle in enumerate([0.0, 1.5, 3.0], 1):
+    feed(session, tuio_bundle(fseq, [(1, 12, 0.5, angle)]))
+  assert pump.step() == 3
+  assert pump.coalesced == 2
+  # only the last state of the tower is sent
+  assert pad_changes(sent) == [{0: {12: [0.5, 3]}}]
+  # and not until min_interval after the last update
+  assert slept == [pytest.approx(0.3)]
+
@@ -1,82 +1,271 @@
-from typing import List, Iterable, Union
+from typing import Dict, Iterable, Optional, Set
+import argparse
 import sys
 import time
-from multiprocessing import Process, Lock, Manager
-import socket
+from multiprocessing import Process
 
-import simplejson as json
-from pythonosc import udp_client
-import toolz as t
+from harmonious.music import symbol_chord, warm_up
+from harmonious.fiducials import roots, layers, make_fiducial_chord_builder
+from harmonious.latency import STAMP, latency
+from harmonious.synth import SynthPool
+from harmonious.voiceleading import lead
+from harmonious.wire import FORMATS, BatchReader, open_input
+from harmonious.catalog import DEFAULT_PATH as DEFAULT_CATALOG, load as load_catalog
+from harmonious.chordstate import SharedChordState
+from harmonious.scheduler import BeatScheduler, BAR, TEMPO, pattern_steps
 
-from harmonious.music import note_midi, voicing, symbol_chord, chord
-from harmonious.fiducials import fiducial_chord
+def play_note(value, channel=0, velocity=100):
+  return f"noteon {channel} {value} {velocity}"
 
-def play_note(value):
-  return f"noteon 0 {value} 100"
+def end_note(value, channel=0):
+  return f"noteoff {channel} {value}"
 
-def end_note(value):
-  return f"noteoff 0 {value}"
+def play_chord(values, channel=0):
+  return '\n'.join(play_note(x, channel) for x in values)
 
-def play_chord(values):
-  return '\n'.join(play_note(x) for x in values)
+def stop_chord(values, channel=0):
+  return '\n'.join(end_note(x, channel) for x in values)
 
-def stop_chord(values):
-  return '\n'.join(end_note(x) for x in values)
+
+class NoteTracker:
+  """
+  The notes sounding on each channel of the synth, so only changes are sent.
+  
+  Fluidsynth starts a new voice for every noteon, even for a note that is
+  still ringing, so striking a chord every step without noteoffs piles up
+  voices for as long as the session runs. Here a note sounds from its strike
+  until it is struck again (which ends the old voice first) or the chord moves
+  on without it, and each step is one block of commands, so one write.
+  
+  `channels` are the channels the tracker plays on; :all_off: silences those
+  and any other it struck notes on, and leaves the rest of the synth alone.
+  
+  >>> notes = NoteTracker()
+  >>> notes.strike([55, 64], [48, 55, 64])
+  'noteon 0 55 100\\nnoteon 0 64 100'
+  >>> notes.strike([48], [48, 55, 64])
+  'noteon 0 48 100'
+  >>> notes.strike([50], [50, 57])
+  'noteoff 0 48\\nnoteoff 0 55\\nnoteoff 0 64\\nnoteon 0 50 100'
+  """
+  def __init__(self, velocity: int = 100, channels: Iterable[int] = (0,)):
+    self.velocity = velocity
+    self.channels = tuple(channels)
+    self.sounding : Dict[int, Set[int]] = {}
+  
+  def strike(self, notes: Iterable[int], chord: Optional[Iterable[int]] = None, channel: int = 0) -> str:
+    """
+    The commands to strike `notes` on a channel where `chord` is now playing.
+    
+    Sounding notes outside the chord (or outside `notes`, without a chord) are ended.
+    """
+    notes = list(dict.fromkeys(notes))
+    sounding = self.sounding.setdefault(channel, set())
+    keep = set(notes if chord is None else chord)
+    # re-struck notes need their old voice ended too
+    ending = sorted(n for n in sounding if n not in keep or n in notes)
+    sounding.difference_update(ending)
+    sounding.update(notes)
+    return '\n'.join([*(end_note(n, channel) for n in ending),
+                      *(play_note(n, channel, self.velocity) for n in notes)])
+  
+  def all_off(self) -> str:
+    """End every note, tracked or not (All Notes Off on each channel used), for shutdown."""
+    channels = sorted(self.sounding.keys() | set(self.channels))
+    commands = [end_note(n, c) for c in channels for n in sorted(self.sounding.get(c, ()))]
+    commands += [f"cc {c} 123 0" for c in channels]
+    self.sounding.clear()
+    return '\n'.join(commands)
 
 
 HOST = '127.0.0.1'  # The synth's hostname or IP address
 PORT = 8000         # The port used by the synth
 
 
+# connections are opened lazily, so each process that sends gets its own sockets.
+synths = SynthPool()
+
 def send(HOST, PORT, msg):
-  if msg.strip() == '': return
-  with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    #s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    s.connect((HOST, PORT))
-    totalsent = 0
-    while totalsent < len(msg):
-      sent = s.send(msg[totalsent:].encode('utf-8'))
-      if sent == 0:
-        raise RuntimeError("socket connection broken")
-      totalsent = totalsent + sent
-
-
-oscsender = udp_client.SimpleUDPClient('192.168.43.149', 3335)
-
-def bar(notes):
-  for i in range(2):
-      send(HOST, PORT, play_chord(notes[1:]))
-      time.sleep(0.3)
-      send(HOST, PORT, play_chord(notes[0:1]))
-      time.sleep(0.3)
-      send(HOST, PORT, play_chord(notes[1:]))
-      time.sleep(0.3)
-      send(HOST, PORT, play_chord(notes[0:1]))
-      time.sleep(0.3)
-
-
-def poller(notes):
+  if not latency.enabled: return synths.send(HOST, PORT, msg)
+  start = latency.stamp()
+  sent = synths.send(HOST, PORT, msg)
+  latency.record('send', start)
+  return sent
+
+
+def __getattr__(name):
+  # the OSC client pulls in asyncio, which a player that never lights the mat doesn't need
+  if name == 'oscsender':
+    global oscsender
+    from pythonosc import udp_client
+    oscsender = udp_client.SimpleUDPClient('192.168.43.149', 3335)
+    return oscsender
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def bar(notes, pattern=BAR, tracker=None, channel=0):
+  """
+  The synth messages for each step of one bar of a chord.
+  
+  They only end and start what changed since the tracker's last message, so
+  they must be sent in order.
+  """
+  tracker = tracker if tracker is not None else NoteTracker()
+  return [tracker.strike(step, notes, channel) for step in pattern_steps(notes, pattern)]
+
+
+def make_late_reporter(every=5.0, clock=time.monotonic, out=sys.stderr):
+  """
+  Create the scheduler's `on_late` callback for the poller.
+  
+  Printing every late step would flood stderr just when the loop is behind,
+  so late steps are counted and summed up at most once every `every` seconds.
+  """
+  steps, worst, reported = 0, 0.0, clock()
+  def report_late(deadline, lateness):
+    nonlocal steps, worst, reported
+    steps += 1
+    worst = max(worst, lateness)
+    if clock() - reported < every: return
+    print(f'poller: {steps} steps late in {clock() - reported:.0f}s, worst by {1000*worst:.1f}ms', file=out)
+    steps, worst, reported = 0, 0.0, clock()
+  return report_late
+
+
+def poller(notes, tempo=TEMPO, pattern=BAR, lookahead=0.1):
   print('poller is active')
-  i = 0
-  while True:
-    if i >= len(notes): i = 0
-    #oscsender.send_message('/light', [i, (i-1) % len(notes)])
-    bar(notes[i])
-    i += 1
+  tracker = NoteTracker()
+  def play(msg, stamp):
+    send(HOST, PORT, msg)
+    latency.record('note_on', stamp)
+    latency.maybe_report()
+  def steps():
+    beat = 0
+    i = 0
+    last_stamp = None
+    while True:
+      # one snapshot per bar, so the chord count can't change under us
+      chords, stamp = notes.read_stamped()
+      if stamp == last_stamp:
+        stamp = None
+      else:
+        last_stamp = stamp
+      if i >= len(chords): i = 0
+      #oscsender.send_message('/light', [i, (i-1) % len(chords)])
+      for msg in bar(chords[i], pattern, tracker):
+        # only the first send after new chords arrived counts for note_on
+        yield beat, play, (msg, stamp)
+        stamp = None
+        beat += 1
+      i += 1
+  try:
+    BeatScheduler(tempo, lookahead, on_late=make_late_reporter()).run(steps())
+  finally:
+    send(HOST, PORT, tracker.all_off())
 
 
-def setter(notes):
-  stdin = open(0)
+def setter(notes, format='json', socket_path=None, report_every=5.0, voice_leading=False,
+           catalog=DEFAULT_CATALOG):
+  """
+  Keep the chord of every pad up to date with the changes coming from the connector.
+  
+  Changes are read in batches of everything that is waiting and merged, so a
+  burst costs one update of the chords, and chords are only rebuilt for pads
+  whose fiducials changed. The number of updates that were coalesced into a
+  batch or had no effect on any chord is reported to stderr.
+  
+  With `voice_leading`, the pads are voiced together by :voiceleading.lead:
+  in the order they are played, and an upright root leaves the choice of
+  inversion to it (a flipped one still inverts).
+  
+  Stacks without a hand written voicing are voiced from the :catalog: at
+  `catalog`, if it has been built.
+  """
+  load_catalog(catalog)
+  # the setter runs for the whole session, so pay for the chord table once up front
+  fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+  warm_up()
+  reader = BatchReader(open_input(socket_path), format)
   state = {0: {}}
+  fiducials = {}
+  chords = {0: []}
+  specs = {}
+  stats = {'updates': 0, 'coalesced': 0, 'dropped': 0}
+  reported = time.monotonic()
   print('setter is active')
-  for line in stdin:
-    state = t.merge(state, json.loads(line,
-      object_hook=lambda d: {int(k) if k.lstrip('-').isdigit() else k: v for k, v in d.items()}))
-    notes[:] = t.get(list(range(max(state.keys())+1)), t.valmap(fiducial_chord, state), default=[])
-    print('notes = ', notes)
+  while True:
+    batch = reader.read_batch()
+    if batch is None: break
+    stats['updates'] += len(batch)
+    changed = set()
+    stamp = None
+    for changes in batch:
+      if changes.get(STAMP) is not None:
+        latency.record('received', changes[STAMP])
+        stamp = changes[STAMP] if stamp is None else min(stamp, changes[STAMP])
+      state = apply_changes(state, changes)
+      changed.update(pad for pad in changes if pad != STAMP)
+    # only the markers and their angle buckets matter to the chord
+    changed = {pad for pad in changed
+               if {k: v[1] for k, v in state[pad].items()} != fiducials.get(pad)}
+    # every update counts once: all dropped if the batch changed nothing, else all but one coalesced
+    if changed:
+      stats['coalesced'] += len(batch) - 1
+    else:
+      stats['dropped'] += len(batch)
+    for pad in changed:
+      fiducials[pad] = {k: v[1] for k, v in state[pad].items()}
+      if voice_leading:
+        specs[pad] = lead_spec(fiducial_chord.spec(state[pad]))
+      else:
+        chords[pad] = fiducial_chord(state[pad])
+    pads = list(range(max(state.keys())+1))
+    if changed and voice_leading:
+      chords = dict(zip(pads, lead([specs.get(pad) for pad in pads])))
+    latency.record('chord', stamp)
+    if changed:
+      notes.write([chords.get(pad, []) for pad in pads], stamp)
+      print('notes = ', notes)
+    latency.maybe_report()
+    if report_every and time.monotonic() - reported > report_every and stats['coalesced'] + stats['dropped']:
+      reported = time.monotonic()
+      print('setter: {updates} updates, {coalesced} coalesced, {dropped} dropped'.format(**stats), file=sys.stderr)
+  return stats
+
+
+def lead_spec(spec):
+  """a pad's (root, mask, inverted) as :voiceleading.lead: takes it"""
+  if spec is None: return None
+  root, mask, inverted = spec
+  return root, mask, True if inverted else None
+
+
+def apply_changes(state, changes):
+  """
+  Apply the changes from the connector's debouncers to the state of each pad.
+  
+  A marker set to None has left its pad, and an empty pad clears it.
+  
+  >>> apply_changes({0: {25: [0.5, 1]}}, {0: {25: None, 29: [0.5, 0]}, 1: {}})
+  {0: {29: [0.5, 0]}, 1: {}}
+  """
+  state = dict(state)
+  for pad, markers in changes.items():
+    if pad == STAMP: continue
+    if not markers:
+      state[pad] = {}
+      continue
+    state[pad] = pad_state = dict(state.get(pad, {}))
+    for marker, value in markers.items():
+      if value is None:
+        pad_state.pop(marker, None)
+      else:
+        pad_state[marker] = value
+  return state
 
 
-def symbol_setter(notes):
+def symbol_setter(notes, catalog=DEFAULT_CATALOG):
+  load_catalog(catalog)
+  warm_up()
   stdin = open(0)
   print('symbol_setter is active')
   for line in stdin:
@@ -84,10 +273,25 @@ def symbol_setter(notes):
 
 
 if __name__ == '__main__':
-  manager = Manager()
-  notes = manager.list([[]])
-  p1 = Process(target = poller, args=(notes,))
-  p2 = Process(target = (setter if len(sys.argv) <= 1 else symbol_setter), args=(notes,))
-  p1.start()
-  p2.start()
-  p2.join()
+  parser = argparse.ArgumentParser(description='play the chords on the pads')
+  parser.add_argument('symbols', nargs='?', help='read "root symbol" lines instead of pad changes')
+  parser.add_argument('--format', choices=FORMATS, default='json', help='format of the pad changes')
+  parser.add_argument('--socket', help='listen for pad changes on this Unix socket instead of stdin')
+  parser.add_argument('--pads', type=int, default=16, help='most pads the connector will send changes for')
+  parser.add_argument('--catalog', default=DEFAULT_CATALOG,
+                      help='voicing catalog to use, see harmonious.catalog (skipped if missing)')
+  parser.add_argument('--voice-leading', action='store_true',
+                      help='voice the pads to move as little as possible from one to the next')
+  args = parser.parse_args()
+  
+  notes = SharedChordState(num_pads=args.pads)
+  try:
+    p1 = Process(target = poller, args=(notes,))
+    p2 = (Process(target = setter, args=(notes, args.format, args.socket, 5.0, args.voice_leading, args.catalog))
+          if args.symbols is None else
+          Process(target = symbol_setter, args=(notes, args.catalog)))
+    p1.start()
+    p2.start()
+    p2.join()
+  finally:
+    notes.close()
@@ -0,0 +1,137 @@
+import io
+import os
+import threading
+import time
+from multiprocessing import Process
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.chordstate import SharedChordState
+from harmonious.fiducials import fiducial_chord
+from harmonious import player
+from harmonious.player import NoteTracker, apply_changes, make_late_reporter, setter
+from harmonious.wire import encode_json, open_output
+
+notes = st.lists(st.integers(min_value=21, max_value=108), max_size=6)
+
+
+def voices_after(commands, voices):
+  """what fluidsynth does with the commands: every noteon is a new voice, a noteoff ends all of its note's"""
+  for c in filter(None, commands.split('\n')):
+    kind, channel, note, *_ = c.split()
+    if kind == 'noteon': voices.append((int(channel), int(note)))
+    elif kind == 'noteoff': voices[:] = [v for v in voices if v != (int(channel), int(note))]
+    elif kind == 'cc': voices[:] = [v for v in voices if v[0] != int(channel)]
+  return voices
+
+
+@given(st.lists(st.tuples(notes, notes, st.integers(0, 2)), max_size=30))
+def test_voices_never_pile_up(strikes):
+  tracker = NoteTracker()
+  voices = []
+  for step, chord, channel in strikes:
+    voices_after(tracker.strike(step, step + chord, channel), voices)
+    # one voice per sounding note, and only notes of the chord ring on
+    assert len(voices) == len(set(voices))
+    assert {n for c, n in voices if c == channel} <= set(step + chord)
+    assert set(voices) == {(c, n) for c, ns in tracker.sounding.items() for n in ns}
+  assert voices_after(tracker.all_off(), voices) == []
+
+
+def test_apply_changes_ignores_the_stamp():
+  assert apply_changes({0: {}}, {0: {25: [0.5, 1]}, 't': 1.5}) == {0: {25: [0.5, 1]}}
+
+
+def setter_on_stdin(read_fd, write_fd, notes):
+  # the connector's pipe is the setter's fd 0, as in `connector | player`
+  os.dup2(read_fd, 0)
+  os.close(write_fd)
+  setter(notes, report_every=0, catalog=None)
+
+
+def test_setter_reads_the_pipe_on_stdin():
+  notes = SharedChordState(num_pads=2)
+  read_fd, write_fd = os.pipe()
+  try:
+    p = Process(target=setter_on_stdin, args=(read_fd, write_fd, notes))
+    p.start()
+    os.close(read_fd)
+    with os.fdopen(write_fd, 'wb') as pipe:
+      pipe.write(encode_json({0: {12: [0.5, 0], 29: [0.5, 0]}, 1: {}}))
+    p.join(10)
+    assert p.exitcode == 0
+    assert notes[:] == [fiducial_chord({12: [0.5, 0], 29: [0.5, 0]}), []]
+  finally:
+    notes.close()
+
+
+def test_setter_builds_only_the_latest_state_of_each_pad(tmp_path, monkeypatch):
+  built = []
+  make_builder = player.make_fiducial_chord_builder
+  def counting_builder(*args, **kwargs):
+    fiducial_chord = make_builder(*args, **kwargs)
+    def counted(fiducial_map):
+      built.append(dict(fiducial_map))
+      return fiducial_chord(fiducial_map)
+    counted.spec = fiducial_chord.spec
+    return counted
+  monkeypatch.setattr(player, 'make_fiducial_chord_builder', counting_builder)
+
+  path = str(tmp_path / 'player.sock')
+  notes = SharedChordState(num_pads=2)
+  stats = []
+  t = threading.Thread(target=lambda: stats.append(setter(notes, socket_path=path, report_every=0, catalog=None)))
+  t.start()
+  try:
+    # a tower turning through every bucket on pad 0, and one that lands on pad 1 and moves
+    burst = [{0: {12: [0.5, bucket]}} for bucket in range(6)]
+    burst += [{1: {29: [0.2, 0]}}, {1: {29: [0.7, 0]}}]
+    stream = open_output(path)
+    # written in one go, so the setter reads it as one batch
+    stream.write(b''.join(encode_json(changes) for changes in burst))
+    stream.close()
+    t.join(10)
+    assert stats == [{'updates': 8, 'coalesced': 7, 'dropped': 0}]
+    assert built == [{12: [0.5, 5]}, {29: [0.7, 0]}]
+    assert notes[:] == [fiducial_chord({12: [0.5, 5]}), fiducial_chord({29: [0.5, 0]})]
+  finally:
+    notes.close()
+
+
+def test_setter_counts_a_batch_that_changes_nothing_as_dropped(tmp_path):
+  path = str(tmp_path / 'player.sock')
+  notes = SharedChordState(num_pads=1)
+  stats = []
+  t = threading.Thread(target=lambda: stats.append(setter(notes, socket_path=path, report_every=0, catalog=None)))
+  t.start()
+  try:
+    stream = open_output(path)
+    stream.write(encode_json({0: {12: [0.5, 0]}}))
+    stream.flush()
+    deadline = time.monotonic() + 10
+    while notes[:] != [fiducial_chord({12: [0.5, 0]})] and time.monotonic() < deadline:
+      time.sleep(0.01)
+    # the tower only slides along its pad, which changes no chord
+    stream.write(b''.join(encode_json({0: {12: [y, 0]}}) for y in (0.6, 0.7, 0.8)))
+    stream.close()
+    t.join(10)
+    assert stats == [{'updates': 4, 'coalesced': 0, 'dropped': 3}]
+  finally:
+    notes.close()
+
+
+def test_all_off_only_silences_the_tracker_channels():
+  tracker = NoteTracker(channels=(3,))
+  assert tracker.all_off() == 'cc 3 123 0'
+  tracker.strike([60], channel=5)
+  assert tracker.all_off() == 'noteoff 5 60\ncc 3 123 0\ncc 5 123 0'
+  assert NoteTracker().all_off() == 'cc 0 123 0'
+
+
+def test_late_steps_are_summed_up_not_printed_one_by_one():
+  now = [0.0]
+  out = io.StringIO()
+  report_late = make_late_reporter(every=5.0, clock=lambda: now[0], out=out)
+  for i in range(100):
+    now[0] = i * 0.1
+    report_late(now[0], 0.010 if i != 42 else 0.030)
+  assert out.getvalue() == 'poller: 51 steps late in 5s, worst by 30.0ms\n'
@@ -0,0 +1,226 @@
+"""
+Recognizing chords: from sounding MIDI notes back to a root, a layer stack and a symbol.
+
+:symbol_layers: and :layers_voicings: go from names to notes; this goes the
+other way, for analysing what students build and for logging. Octaves and
+doublings don't change what a chord is, so notes are reduced to their
+pitch-class set, 12 bits with bit n set when a note n semitones above C is
+sounding. With the lowest note's pitch class, that is one of 4096 * 12
+keys, and every key's answer is worked out once up front:
+
+  - each pitch class in the set is tried as the root, and the set is
+    rotated so that root is bit 0
+  - the rotated set is matched to the symbol whose chord has the closest
+    set (fewest pitch classes in one and not the other), and to the
+    smallest layer stack a tower can make with exactly that set
+  - the root whose symbol matches most closely wins, then the one in the
+    bass, then the one needing fewer layers
+
+so recognizing a chord is building its set and one lookup, cheap enough
+for every frame. :recognize_many: does whole sessions at once with numpy.
+
+  $ python -m harmonious.recognize session.tuio --pads 4
+  $ echo '48 52 55 59' | python -m harmonious.recognize -
+"""
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+import argparse
+import sys
+from array import array
+
+from harmonious.fiducials import layers, reachable_masks
+from harmonious.music import NoteValue, ROOT_BIT, mask_default_voicing, mask_layers, symbol_masks
+
+"""The name of each pitch class, preferring flats like :NoteValue: does."""
+PITCH_NAMES = [next(n for n in NoteValue.__members__ if NoteValue[n] == pc) for pc in range(12)]
+
+
+class Chord(NamedTuple):
+  root: int            # the lowest sounding note of the root's pitch class
+  layers: str          # the normalized layer stack
+  mask: int            # the same stack as a :layers_mask:
+  symbol: str          # the closest name in :symbol_layers:
+  exact: bool          # whether the symbol's chord has exactly these pitch classes
+
+  @property
+  def name(self) -> str:
+    return PITCH_NAMES[self.root % 12] + self.symbol + ('' if self.exact else '?')
+
+
+def pitch_classes(mask: int) -> int:
+  """
+  the pitch-class set of a stack's chord, relative to its root
+
+  >>> bin(pitch_classes(symbol_masks['7']))
+  '0b10010010001'
+  """
+  pcs = 1
+  for n in mask_default_voicing(mask & ~ROOT_BIT):
+    pcs |= 1 << n % 12
+  return pcs
+
+
+def _rotate(pcs: int, n: int) -> int:
+  """the set transposed down n semitones"""
+  return (pcs >> n | pcs << (12 - n)) & 0xFFF
+
+
+class Index:
+  """
+  The answer for every (pitch-class set, bass pitch class), in flat arrays
+  indexed by `pcs * 12 + bass`; a root of -1 means no chord.
+  """
+  def __init__(self):
+    symbols = {}
+    for name, mask in symbol_masks.items():
+      pcs = pitch_classes(mask)
+      # '' and 'M' are the same chord, the name is more use in a log
+      if pcs not in symbols or symbols[pcs][0] == '': symbols[pcs] = (name, mask)
+    stacks = {}
+    for mask in reachable_masks(layers):
+      pcs = pitch_classes(mask)
+      if pcs not in stacks or (bin(mask).count('1'), mask) < (bin(stacks[pcs]).count('1'), stacks[pcs]):
+        stacks[pcs] = mask
+    order = {name: i for i, name in enumerate(symbol_masks)}
+    self.symbols = sorted(set(name for name, _ in symbols.values()), key=order.get)
+    # for each set with the root (bit 0): (distance to the closest symbol, symbol, layers);
+    # ties go to the symbol listed first in :symbol_layers:
+    rooted = {}
+    for pcs in range(1, 1 << 12, 2):
+      distance, _, name = min((bin(pcs ^ s).count('1'), order[name], name) for s, (name, _) in symbols.items())
+      rooted[pcs] = (distance, name, stacks[pcs] if pcs in stacks else self._nearest_stack(pcs, stacks))
+
+    symbol_ids = {name: i for i, name in enumerate(self.symbols)}
+    n = (1 << 12) * 12
+    self.root = array('b', [-1]) * n
+    self.mask = array('I', [0]) * n
+    self.symbol = array('b', [0]) * n
+    self.distance = array('b', [0]) * n
+    for pcs in range(1, 1 << 12):
+      roots = [(rooted[_rotate(pcs, r)], r) for r in range(12) if pcs >> r & 1]
+      closest = min(x[0] for x, _ in roots)
+      roots = [(x, r) for x, r in roots if x[0] == closest]
+      fewest = min(roots, key=lambda xr: (bin(xr[0][2]).count('1'), xr[1]))
+      for bass in range(12):
+        if not pcs >> bass & 1: continue
+        # the bass is the root when it matches as well as any other
+        (distance, name, mask), r = next(((x, r) for x, r in roots if r == bass), fewest)
+        i = pcs * 12 + bass
+        self.root[i] = r
+        self.mask[i] = mask
+        self.symbol[i] = symbol_ids[name]
+        self.distance[i] = distance
+
+  @staticmethod
+  def _nearest_stack(pcs, stacks):
+    # not every rooted set can be built from the pieces on the mat, so take
+    # the reachable stack that comes closest
+    return min((bin(pcs ^ s).count('1'), bin(m).count('1'), m) for s, m in stacks.items())[2]
+
+  def lookup(self, notes: Sequence[int]) -> Optional[Chord]:
+    if not notes: return None
+    pcs = 0
+    for n in notes:
+      pcs |= 1 << n % 12
+    bass = min(notes)
+    i = pcs * 12 + bass % 12
+    r = self.root[i]
+    root = min(n for n in notes if n % 12 == r)
+    return Chord(root, mask_layers(self.mask[i]), self.mask[i], self.symbols[self.symbol[i]],
+                 self.distance[i] == 0)
+
+
+_index : Optional[Index] = None
+
+def index() -> Index:
+  """the shared index, built on first use (it takes a second or two)"""
+  global _index
+  if _index is None: _index = Index()
+  return _index
+
+
+def recognize(notes: Sequence[int]) -> Optional[Chord]:
+  """
+  The chord some notes make, or None for silence.
+
+  >>> recognize([48, 52, 55, 59]).name
+  'CM7'
+  >>> c = recognize([45, 60, 64, 67])
+  >>> c.name, c.layers
+  ('Am7', '5-*')
+  """
+  return index().lookup(notes)
+
+
+def recognize_many(chords: Iterable[Sequence[int]]) -> List[Optional[Chord]]:
+  """
+  :recognize: for many chords at once; sets and lookups are done as numpy arrays.
+  """
+  import numpy as np
+  chords = [list(c) for c in chords]
+  ix = index()
+  lengths = np.array([len(c) for c in chords])
+  if not chords or lengths.max() == 0: return [None] * len(chords)
+  notes = np.full((len(chords), lengths.max()), -1, dtype=np.int64)
+  for i, c in enumerate(chords):
+    notes[i, :len(c)] = c
+  present = notes >= 0
+  pcs = np.bitwise_or.reduce(np.where(present, 1 << (notes % 12), 0), axis=1)
+  bass = np.where(present, notes, 1 << 30).min(axis=1) % 12
+  keys = pcs * 12 + bass
+  root = np.frombuffer(ix.root, dtype=np.int8)[keys]
+  mask = np.frombuffer(ix.mask, dtype=np.uint32)[keys]
+  symbol = np.frombuffer(ix.symbol, dtype=np.int8)[keys]
+  distance = np.frombuffer(ix.distance, dtype=np.int8)[keys]
+  # the lowest note of the root's pitch class
+  low = np.where(present & (notes % 12 == root[:, None]), notes, 1 << 30).min(axis=1)
+  return [Chord(int(low[i]), mask_layers(int(mask[i])), int(mask[i]), ix.symbols[symbol[i]],
+                bool(distance[i] == 0)) if lengths[i] else None
+          for i in range(len(chords))]
+
+
+def session_chords(path: str, pads: int):
+  """
+  (time, pad, notes) every time a pad's chord changes in a TUIO log (see
+  :tuiolog:), resolved from the raw frames without debouncing.
+  """
+  from pythonosc.osc_packet import OscPacket, ParseError
+  from harmonious.fiducials import roots, make_fiducial_chord_builder
+  from harmonious.pads import PadLayout, angle_bucket
+  from harmonious.tuio import TuioSession
+  from harmonious.tuiolog import read_log
+  fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+  layout = PadLayout.strips(pads)
+  session = TuioSession()
+  objects = session.profiles["/tuio/2Dobj"].objects
+  chords = [[] for _ in range(pads)]
+  with open(path, 'rb') as f:
+    data = f.read()
+  for t, datagram in read_log(data):
+    try:
+      messages = OscPacket(bytes(datagram)).messages
+    except ParseError:
+      continue
+    diffs = [session.handle(m.message.address, m.message.params) for m in messages]
+    if not any(d is not None and d.profile == "/tuio/2Dobj" for d in diffs): continue
+    for pad, on_pad in enumerate(layout.partition(objects.values())):
+      notes = fiducial_chord({o.markerId: [o.y, angle_bucket(o.angle)] for o in on_pad})
+      if notes != chords[pad]:
+        chords[pad] = notes
+        yield t, pad, notes
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='name the chords in a recorded session')
+  parser.add_argument('input', help="a TUIO log, or '-' for lines of MIDI notes on stdin")
+  parser.add_argument('--pads', type=int, default=4, help='number of pads (vertical strips) on the mat')
+  args = parser.parse_args()
+
+  if args.input == '-':
+    chords = [[int(n) for n in line.split()] for line in sys.stdin]
+    labels = [''] * len(chords)
+  else:
+    changes = list(session_chords(args.input, args.pads))
+    chords = [notes for _, _, notes in changes]
+    labels = [f'{t:.3f} pad {pad}\t' for t, pad, _ in changes]
+  for label, notes, chord in zip(labels, chords, recognize_many(chords)):
+    print(f'{label}{notes}\t' + (f'{chord.name}\t{chord.layers}' if chord else '-'))
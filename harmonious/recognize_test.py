@@ -0,0 +1,53 @@
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.fiducials import fiducial_chord, layers, reachable_masks
+from harmonious.music import symbol_chord, symbol_layers
+from harmonious.recognize import index, pitch_classes, recognize, recognize_many, session_chords
+from harmonious.tuiolog import LogWriter
+from harmonious.testing import tuio_bundle
+
+# built up front, or the first example would blow hypothesis' deadline
+index()
+
+
+def pcs(notes):
+  return {n % 12 for n in notes}
+
+
+@given(st.integers(min_value=36, max_value=60), st.sampled_from(sorted(symbol_layers)))
+def test_symbol_chords_are_recognized(root, symbol):
+  notes = symbol_chord(root, symbol)
+  chord = recognize(notes)
+  assert chord.exact
+  assert pcs(symbol_chord(chord.root, chord.symbol)) == pcs(notes)
+  assert {(chord.root + n) % 12 for n in range(12) if pitch_classes(chord.mask) >> n & 1} == pcs(notes)
+  # the root is in the bass and matches exactly, so nothing beats it
+  assert chord.root == root
+
+
+def test_recognized_stacks_can_be_built_on_the_mat():
+  assert set(index().mask) <= reachable_masks(layers)
+  assert recognize([48, 55, 57]).mask in reachable_masks(layers)
+
+
+@given(st.lists(st.lists(st.integers(min_value=21, max_value=108), max_size=8), max_size=20))
+def test_batch_matches_one_at_a_time(chords):
+  assert recognize_many(chords) == [recognize(c) for c in chords]
+  for notes, chord in zip(chords, recognize_many(chords)):
+    assert (chord is None) == (not notes)
+    if chord: assert chord.root in notes
+
+
+def test_session_chords_follow_the_log(tmp_path):
+  path = str(tmp_path / 'session.tuio')
+  with LogWriter(path) as log:
+    log.write(tuio_bundle(1, [(1, 12, 0.75, 0.0)]), 1.0)
+    log.write(tuio_bundle(2, [(1, 12, 0.75, 0.0)]), 1.1)
+    log.write(tuio_bundle(3, [(1, 12, 0.75, 0.0), (2, 29, 0.8, 0.0)]), 1.2)
+    log.write(b'not osc', 1.3)
+    log.write(tuio_bundle(4, []), 1.4)
+  assert list(session_chords(path, 2)) == [
+    (1.0, 0, fiducial_chord({12: [0.5, 0]})),
+    (1.2, 0, fiducial_chord({12: [0.5, 0], 29: [0.5, 0]})),
+    (1.4, 0, []),
+  ]
@@ -0,0 +1,203 @@
+"""
+Rendering progressions to Standard MIDI Files, as fast as they can be computed.
+
+A progression is a text file with one entry per line, either
+
+  C3 M7             a root and symbol (a major triad if left out), as :symbol_setter: reads
+  {"0": {"25": [0.5, 1]}}   pad changes as the connector sends them
+
+A symbol is one bar of its chord. Pad changes are applied to the pads like
+the setter does, and then every pad is played for a bar in turn, as the
+poller would before the next change. Bars go through the same :bar: and
+:NoteTracker: as the live player, so a render has exactly the noteons and
+noteoffs the synth would have been sent, with one step per quarter note at
+the given tempo. Stacks without a hand written voicing are voiced from the
+same :catalog: the player loads, so a render sounds like the live mat.
+
+  $ python -m harmonious.render progression.txt -o progression.mid
+  $ python -m harmonious.render progressions/*.txt -o rendered/ --jobs 8
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+import argparse
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from harmonious.catalog import DEFAULT_PATH as DEFAULT_CATALOG, load as load_catalog, loaded as loaded_catalog
+from harmonious.fiducials import roots, layers, make_fiducial_chord_builder
+from harmonious.music import symbol_chord, symbol_masks
+from harmonious.player import NoteTracker, apply_changes, bar, lead_spec
+from harmonious.scheduler import BAR, TEMPO, step_seconds
+from harmonious.voiceleading import lead
+from harmonious.wire import decode_json
+
+"""Ticks per quarter note, and so per step."""
+DIVISION = 480
+
+Event = Tuple[int, bytes]  # (tick, MIDI message)
+
+
+def progression_chords(lines: Iterable[str], voice_leading: bool = False) -> List[List[int]]:
+  """
+  The chord of each bar of a progression.
+
+  With `voice_leading` the whole progression is voiced by :voiceleading.lead:,
+  which may invert any chord that wasn't inverted by a flipped root.
+
+  >>> progression_chords(['C3 M7', 'G2 7'])
+  [[48, 48, 55, 60, 64, 71], [43, 43, 50, 53, 59]]
+  """
+  fiducial_chord = None
+  state = {0: {}}
+  chords = []
+  specs = []
+  for line in lines:
+    line = line.strip()
+    if not line or line.startswith('#'): continue
+    if not line.startswith('{'):
+      root, *symbol = line.split()
+      symbol = symbol[0] if symbol else ''
+      chords.append(symbol_chord(root, symbol))
+      specs.append((root, symbol_masks.get(symbol, symbol_masks['']), None))
+      continue
+    if fiducial_chord is None:
+      fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+    state = apply_changes(state, decode_json(line))
+    pads = [state.get(pad, {}) for pad in range(max(state.keys()) + 1)]
+    chords.extend(fiducial_chord(p) for p in pads)
+    specs.extend(lead_spec(fiducial_chord.spec(p)) for p in pads)
+  return lead(specs) if voice_leading else chords
+
+
+def command_events(tick: int, commands: str) -> List[Event]:
+  """
+  the MIDI messages for a block of synth shell commands, as made by :NoteTracker:
+
+  >>> command_events(0, 'noteon 0 128 100')
+  Traceback (most recent call last):
+  ...
+  ValueError: noteon 0 128 100: notes and values are 0-127
+  """
+  events = []
+  for command in commands.split('\n'):
+    if not command: continue
+    kind, *args = command.split()
+    args = [int(a) for a in args]
+    # a data byte over 127 would be read as a status byte, and corrupt the file
+    if not all(0 <= a < 128 for a in args[1:]): raise ValueError(f'{command}: notes and values are 0-127')
+    if kind == 'noteon':
+      events.append((tick, bytes([0x90 | args[0], args[1], args[2]])))
+    elif kind == 'noteoff':
+      events.append((tick, bytes([0x80 | args[0], args[1], 0])))
+    elif kind == 'cc':
+      events.append((tick, bytes([0xB0 | args[0], args[1], args[2]])))
+  return events
+
+
+def chord_events(chords: Sequence[Sequence[int]], pattern=BAR, channel: int = 0) -> List[Event]:
+  """every step of every bar as MIDI messages, ending with all notes off"""
+  tracker = NoteTracker(channels=(channel,))
+  events = []
+  step = 0
+  for notes in chords:
+    for commands in bar(notes, pattern, tracker, channel):
+      events.extend(command_events(step * DIVISION, commands))
+      step += 1
+  events.extend(command_events(step * DIVISION, tracker.all_off()))
+  return events
+
+
+def varlen(n: int) -> bytes:
+  """
+  a MIDI variable length quantity
+
+  >>> varlen(0x7F), varlen(0x80), varlen(0x3FFF)
+  (b'\\x7f', b'\\x81\\x00', b'\\xff\\x7f')
+  """
+  out = [n & 0x7F]
+  n >>= 7
+  while n:
+    out.append(0x80 | n & 0x7F)
+    n >>= 7
+  return bytes(reversed(out))
+
+
+def smf(events: Iterable[Event], tempo: float = TEMPO) -> bytes:
+  """a format 0 Standard MIDI File of the events, one step per quarter note at `tempo` steps per minute"""
+  track = bytearray(b'\x00\xFF\x51\x03' + round(step_seconds(tempo) * 1e6).to_bytes(3, 'big'))
+  last = 0
+  for tick, message in events:
+    track += varlen(tick - last)
+    track += message
+    last = tick
+  track += b'\x00\xFF\x2F\x00'
+  return (b'MThd' + struct.pack('>IHHH', 6, 0, 1, DIVISION) +
+          b'MTrk' + struct.pack('>I', len(track)) + bytes(track))
+
+
+def render(lines: Iterable[str], tempo: float = TEMPO, pattern=BAR, channel: int = 0,
+           voice_leading: bool = False) -> bytes:
+  """a progression's text as the bytes of a MIDI file"""
+  return smf(chord_events(progression_chords(lines, voice_leading), pattern, channel), tempo)
+
+
+def render_file(path: str, out: str, tempo: float = TEMPO, voice_leading: bool = False,
+                catalog: Optional[str] = DEFAULT_CATALOG) -> str:
+  with loaded_catalog(catalog):
+    return _render_file((path, out, tempo, voice_leading))
+
+
+def _render_file(job):
+  path, out, tempo, voice_leading = job
+  with open(path, encoding='utf-8') as f:
+    data = render(f, tempo, voice_leading=voice_leading)
+  with open(out, 'wb') as f:
+    f.write(data)
+  return out
+
+
+def render_files(paths: Sequence[str], out_dir: str, tempo: float = TEMPO,
+                 jobs: Optional[int] = None, voice_leading: bool = False,
+                 catalog: Optional[str] = DEFAULT_CATALOG) -> List[str]:
+  """
+  Render many progressions into out_dir (as name.mid) across a pool of processes.
+
+  Each worker loads the catalog and builds its voicing caches once and keeps
+  them for every file it is handed, so large batches go in chunks rather
+  than a file at a time.
+  """
+  os.makedirs(out_dir, exist_ok=True)
+  work = [(p, os.path.join(out_dir, os.path.splitext(os.path.basename(p))[0] + '.mid'), tempo,
+           voice_leading) for p in paths]
+  if jobs == 1 or len(work) == 1:
+    with loaded_catalog(catalog):
+      return [_render_file(w) for w in work]
+  with ProcessPoolExecutor(jobs, initializer=load_catalog, initargs=(catalog,)) as pool:
+    chunksize = max(1, len(work) // (4 * (jobs or os.cpu_count() or 1)))
+    return list(pool.map(_render_file, work, chunksize=chunksize))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='render progressions to MIDI files')
+  parser.add_argument('progressions', nargs='+', help="progression files, or '-' for stdin")
+  parser.add_argument('-o', '--output', required=True,
+                      help='the .mid file for one progression, or a directory for several')
+  parser.add_argument('--tempo', type=float, default=TEMPO, help='steps per minute')
+  parser.add_argument('--jobs', type=int, help='worker processes (default: one per CPU)')
+  parser.add_argument('--voice-leading', action='store_true',
+                      help='voice each chord to move as little as possible from the one before')
+  parser.add_argument('--catalog', default=DEFAULT_CATALOG,
+                      help='voicing catalog to use, see harmonious.catalog (skipped if missing)')
+  args = parser.parse_args()
+
+  if args.progressions == ['-']:
+    load_catalog(args.catalog)
+    with open(args.output, 'wb') as f:
+      f.write(render(sys.stdin, args.tempo, voice_leading=args.voice_leading))
+  elif len(args.progressions) == 1 and not os.path.isdir(args.output):
+    render_file(args.progressions[0], args.output, args.tempo, args.voice_leading, args.catalog)
+  else:
+    rendered = render_files(args.progressions, args.output, args.tempo, args.jobs, args.voice_leading,
+                            args.catalog)
+    print(f'rendered {len(rendered)} progressions to {args.output}', file=sys.stderr)
@@ -0,0 +1,105 @@
+import struct
+import pytest
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.catalog import generate, loaded, write_index
+from harmonious.music import layers_mask, symbol_layers, symbol_masks
+from harmonious.render import (DIVISION, chord_events, command_events, progression_chords, render, render_file, render_files,
+                               varlen)
+from harmonious.voiceleading import lead
+
+
+def read_varlen(data, i):
+  n = 0
+  while True:
+    n = n << 7 | data[i] & 0x7F
+    i += 1
+    if not data[i-1] & 0x80: return n, i
+
+
+@given(st.integers(min_value=0, max_value=0x0FFFFFFF))
+def test_varlen_round_trips(n):
+  assert read_varlen(varlen(n), 0) == (n, len(varlen(n)))
+
+
+def events(data):
+  """the (tick, status, data...) of a format 0 file's track"""
+  assert data[:4] == b'MThd' and struct.unpack('>IHHH', data[4:14]) == (6, 0, 1, DIVISION)
+  assert data[14:18] == b'MTrk'
+  track = data[22:22 + struct.unpack('>I', data[18:22])[0]]
+  i, tick, out = 0, 0, []
+  while i < len(track):
+    delta, i = read_varlen(track, i)
+    tick += delta
+    if track[i] == 0xFF:
+      out.append((tick, 'meta', track[i+1]))
+      i += 3 + track[i+2]
+    else:
+      out.append((tick, *track[i:i+3]))
+      i += 3
+  return out
+
+
+@given(st.lists(st.tuples(st.sampled_from(['C3', 'D3', 'G2', 'A2']), st.sampled_from(sorted(symbol_layers))),
+                min_size=1, max_size=8))
+def test_every_note_is_ended(progression):
+  sounding = set()
+  for tick, *message in events(render(f'{r} {s}' for r, s in progression)):
+    if message[0] == 0x90: sounding.add(message[1])
+    elif message[0] == 0x80: sounding.discard(message[1])
+  assert sounding == set()
+
+
+def test_render_matches_the_live_player():
+  data = render(['C3 M', '', '# a comment', '{"0": {"12": [0.5, 0], "29": [0.5, 0]}}'])
+  out = events(data)
+  assert out[0] == (0, 'meta', 0x51) and out[-1][1:] == ('meta', 0x2F)
+  # two bars of 8 steps, then all notes off
+  assert out[-2][0] == 16 * DIVISION
+  expected = chord_events([[48, 48, 55, 60, 64], [48, 62]])
+  assert out[1:-1] == [(tick, *message) for tick, message in expected]
+
+
+def test_render_files(tmp_path):
+  paths = []
+  for i in range(3):
+    p = tmp_path / f'p{i}.txt'
+    p.write_text('C3 M\nG2 7\n')
+    paths.append(str(p))
+  out = render_files(paths, str(tmp_path / 'out'), jobs=2)
+  assert [open(o, 'rb').read() for o in out] == [render(['C3 M', 'G2 7'])] * 3
+
+
+def test_voice_leading_voices_the_whole_progression():
+  lines = ['C3 M', 'F3 M', 'G2 7', '{"0": {"12": [0.5, 0], "29": [0.5, 0]}, "1": {}}']
+  chords = progression_chords(lines, voice_leading=True)
+  assert chords[:4] == lead([('C3', symbol_masks['M'], None), ('F3', symbol_masks['M'], None),
+                             ('G2', symbol_masks['7'], None), (48, layers_mask('9'), None)])
+  assert chords[4] == []
+  assert len(chords) == len(progression_chords(lines))
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_renders_voice_from_the_catalog(tmp_path, jobs):
+  # m9 has no hand written voicing, so the catalog voices it
+  catalog = str(tmp_path / 'voicings.idx')
+  write_index(catalog, generate([symbol_masks['m9']], processes=1))
+  progression = tmp_path / 'p.txt'
+  progression.write_text('C3 m9\nD3 m9\n')
+  uncataloged = render(['C3 m9', 'D3 m9'])
+  out = render_files([str(progression)] * 2, str(tmp_path / 'out'), jobs=jobs, catalog=catalog)
+  single = render_file(str(progression), str(tmp_path / 'p.mid'), catalog=catalog)
+  # rendering doesn't leave its catalog installed
+  assert render(['C3 m9', 'D3 m9']) == uncataloged
+  with loaded(catalog):
+    cataloged = render(['C3 m9', 'D3 m9'])
+  with open(out[0], 'rb') as a, open(single, 'rb') as b:
+    assert a.read() == b.read() == cataloged != uncataloged
+
+
+def test_notes_out_of_midi_range_are_refused():
+  assert command_events(0, 'noteon 0 127 100') == [(0, bytes([0x90, 127, 100]))]
+  with pytest.raises(ValueError):
+    command_events(0, 'noteon 0 60 100\nnoteoff 0 128')
+  with pytest.raises(ValueError):
+    chord_events([[100, 124, 131]])
@@ -0,0 +1,180 @@
+"""
+The whole of harmonious in one process, on one asyncio event loop.
+
+Normally the connector, the player's setter and its poller are separate
+processes joined by a pipe, shared memory and the synth's TCP port. Here the
+TUIO/OSC datagrams are parsed as they arrive, each completed frame goes
+straight through the pad layout and debouncers to :fiducial_chord:, and a
+beat task plays the current chords on a non-blocking synth connection. There
+are no hops between processes, so a tower is heard as soon as the next beat
+after the tracker sees it.
+
+  $ python -m harmonious.runtime 4
+
+A runtime plays one mat; to run several from one host, see :supervisor:.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+import argparse
+import asyncio
+import sys
+import time
+
+from pythonosc.osc_packet import OscPacket, ParseError
+
+from harmonious.catalog import DEFAULT_PATH as DEFAULT_CATALOG, load as load_catalog
+from harmonious.latency import STAMP, latency
+from harmonious.fiducials import roots, layers, make_fiducial_chord_builder
+from harmonious.music import warm_up
+from harmonious.pads import PadLayout, make_debouncer
+from harmonious.player import HOST, PORT, NoteTracker, apply_changes
+from harmonious.scheduler import BAR, TEMPO, pattern_steps, step_seconds
+from harmonious.synth import AsyncSynthConnection
+from harmonious.tuio import FrameDiff, TuioSession
+
+
+class TuioProtocol(asyncio.DatagramProtocol):
+  """feeds the OSC messages in each datagram to a TuioSession"""
+  def __init__(self, session: TuioSession):
+    self.session = session
+    self.errors = 0
+
+  def datagram_received(self, data, addr):
+    try:
+      messages = OscPacket(data).messages
+    except ParseError:
+      self.errors += 1
+      return
+    for m in messages:
+      self.session.handle(m.message.address, m.message.params)
+
+
+class Runtime:
+  """
+  TUIO intake, chord resolution and playback for one mat.
+
+  :param layout: the pads of the mat.
+  :param send: called with each step's synth commands.
+  :param channel: the MIDI channel the mat plays on.
+  """
+  def __init__(self, layout: PadLayout, send: Callable[[str], None],
+               tempo: float = TEMPO, pattern: Sequence[slice] = BAR, timeout: float = 0.2,
+               channel: int = 0):
+    self.layout = layout
+    self.send = send
+    self.channel = channel
+    self.tempo = tempo
+    self.pattern = pattern
+    self.timeout = timeout
+    self.session = TuioSession()
+    self.session.frameListeners.append(self.on_frame)
+    self.fiducial_chord = make_fiducial_chord_builder(roots, layers, compiled=True)
+    self.debouncers = [make_debouncer(self.on_changes, i, timeout) for i in range(len(layout))]
+    self.state = {i: {} for i in range(len(layout))}
+    self.chords : List[List[int]] = [[] for _ in range(len(layout))]
+    self.notes = NoteTracker(channels=(channel,))
+    self.stamp = None  # of the frame behind the latest chord change, until it is played
+    self.late = 0
+    self.frames = 0
+    self.changes = 0
+    self.steps = 0
+
+  def stats(self) -> Dict[str, int]:
+    """running totals: frames seen, pad changes applied, steps played and steps played late"""
+    return {'frames': self.frames, 'changes': self.changes, 'steps': self.steps, 'late': self.late}
+
+  def on_frame(self, diff: FrameDiff):
+    if diff.profile == "/tuio/2Dobj":
+      self.frames += 1
+      self.update(diff.time)
+
+  def update(self, stamp=None):
+    objects = self.session.profiles["/tuio/2Dobj"].objects.values()
+    for debounce, pad in zip(self.debouncers, self.layout.partition(objects)):
+      debounce(pad, stamp)
+
+  def on_changes(self, changes):
+    self.changes += 1
+    self.state = apply_changes(self.state, changes)
+    for pad in changes:
+      if pad == STAMP: continue
+      self.chords[pad] = self.fiducial_chord(self.state[pad])
+    if changes.get(STAMP) is not None:
+      latency.record('chord', changes[STAMP])
+      if self.stamp is None: self.stamp = changes[STAMP]
+
+  async def expire(self):
+    """update even without frames, so towers that were lost still time out"""
+    while True:
+      await asyncio.sleep(self.timeout)
+      self.update()
+      latency.maybe_report()
+
+  async def play(self):
+    """play each pad's chord for a bar in turn, on absolute step deadlines"""
+    loop = asyncio.get_running_loop()
+    step = step_seconds(self.tempo)
+    deadline = loop.time()
+    i = 0
+    while True:
+      if i >= len(self.chords): i = 0
+      chord = self.chords[i]
+      for notes in pattern_steps(chord, self.pattern):
+        await asyncio.sleep(deadline - loop.time())
+        if loop.time() - deadline > 0.005: self.late += 1
+        self.send(self.notes.strike(notes, chord, self.channel))
+        self.steps += 1
+        if self.stamp is not None:
+          latency.record('note_on', self.stamp)
+          self.stamp = None
+        deadline += step
+      i += 1
+
+
+async def report_stats(runtime: Runtime, protocol: TuioProtocol, synth: AsyncSynthConnection,
+                       report: Callable[[dict], None], every: float = 1.0):
+  """call `report` every `every` seconds with the runtime's totals, its parse errors and its synth's health"""
+  while True:
+    await asyncio.sleep(every)
+    report({**runtime.stats(), 'errors': protocol.errors, 'connected': synth.connected,
+            'dropped': synth.dropped, 'reconnects': synth.reconnects, 'time': time.monotonic()})
+
+
+async def main(layout: PadLayout, port: int = 3333, host: str = HOST, synth_port: int = PORT,
+               tempo: float = TEMPO, catalog: Optional[str] = DEFAULT_CATALOG, channel: int = 0,
+               report: Optional[Callable[[dict], None]] = None, report_every: float = 1.0):
+  loop = asyncio.get_running_loop()
+  load_catalog(catalog)
+  # connects in the background on the first send, so the synth can start later
+  synth = AsyncSynthConnection(host, synth_port)
+  warm_up()
+  runtime = Runtime(layout, synth.send, tempo, channel=channel)
+  transport, protocol = await loop.create_datagram_endpoint(
+    lambda: TuioProtocol(runtime.session), local_addr=('0.0.0.0', port))
+  print('runtime is active')
+  tasks = [runtime.expire(), runtime.play()]
+  if report is not None: tasks.append(report_stats(runtime, protocol, synth, report, report_every))
+  try:
+    await asyncio.gather(*tasks)
+  finally:
+    transport.close()
+    synth.send(runtime.notes.all_off())
+    await synth.drain()
+    synth.close()
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='run the connector and player in one process')
+  parser.add_argument('pads', type=int, help='number of pads (vertical strips) on the mat')
+  parser.add_argument('--port', type=int, default=3333, help='TUIO port to listen on')
+  parser.add_argument('--synth', default=f'{HOST}:{PORT}', help="the synth's shell host:port")
+  parser.add_argument('--tempo', type=float, default=TEMPO, help='steps per minute')
+  parser.add_argument('--channel', type=int, default=0, help='MIDI channel to play on')
+  parser.add_argument('--catalog', default=DEFAULT_CATALOG,
+                      help='voicing catalog to use, see harmonious.catalog (skipped if missing)')
+  args = parser.parse_args()
+  host, synth_port = args.synth.rsplit(':', 1)
+  try:
+    asyncio.run(main(PadLayout.strips(args.pads), args.port, host, int(synth_port), args.tempo,
+                     args.catalog, args.channel))
+  except KeyboardInterrupt:
+    sys.exit()
@@ -0,0 +1,47 @@
+import asyncio
+from harmonious.fiducials import fiducial_chord
+from harmonious.pads import PadLayout
+from harmonious.runtime import Runtime, TuioProtocol
+from harmonious.testing import tuio_bundle
+
+
+def test_datagrams_resolve_to_chords():
+  runtime = Runtime(PadLayout.strips(2), lambda msg: None)
+  protocol = TuioProtocol(runtime.session)
+  # pad 0 is the right half of the mat
+  protocol.datagram_received(tuio_bundle(1, [(1, 12, 0.75, 0.0), (2, 29, 0.8, 0.0), (3, 1, 0.25, 3.0)]), None)
+  assert runtime.chords[0] == fiducial_chord({12: [0.5, 0], 29: [0.5, 0]})
+  assert runtime.chords[1] == fiducial_chord({1: [0.5, 3]})
+  protocol.datagram_received(b'not osc', None)
+  assert protocol.errors == 1
+
+
+def test_play_sends_steps_on_time():
+  sent = []
+  runtime = Runtime(PadLayout.strips(1), sent.append, tempo=6000)
+  runtime.chords[0] = [48, 55, 64]
+  async def run():
+    task = asyncio.ensure_future(runtime.play())
+    await asyncio.sleep(0.1)
+    task.cancel()
+  asyncio.run(run())
+  assert sent[:2] == ['noteon 0 55 100\nnoteon 0 64 100', 'noteon 0 48 100']
+  # struck again, so the old voices end first
+  assert sent[2] == 'noteoff 0 55\nnoteoff 0 64\nnoteon 0 55 100\nnoteon 0 64 100'
+  assert len(sent) >= 8
+  assert runtime.stats()['steps'] == len(sent)
+
+
+def test_play_on_the_mat_channel():
+  sent = []
+  runtime = Runtime(PadLayout.strips(1), sent.append, tempo=6000, channel=3)
+  runtime.chords[0] = [48, 55, 64]
+  async def run():
+    task = asyncio.ensure_future(runtime.play())
+    await asyncio.sleep(0.05)
+    task.cancel()
+  asyncio.run(run())
+  assert sent[0] == 'noteon 3 55 100\nnoteon 3 64 100'
+  # stopping this mat silences its own channel, not the mats on the others
+  off = runtime.notes.all_off().split('\n')
+  assert [m for m in off if m.startswith('cc')] == ['cc 3 123 0']
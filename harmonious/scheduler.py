@@ -0,0 +1,107 @@
+"""
+Beat scheduling for playback.
+
+Sleeping for a fixed time after each send lets every send's latency leak into
+the beat, so the tempo drifts under load. The scheduler here instead keeps an
+absolute deadline for every beat on a monotonic clock, pulls upcoming events
+from a source a short lookahead before they are due, keeps them on a heap,
+and fires each one at its deadline. Events fired later than a tolerance are
+counted and reported rather than silently shifting the rest of the bar.
+
+Rhythm is described by a pattern: a sequence of slices into the chord, one
+per step. The default pattern is the one the player has always used, the
+upper voices and the bass alternating four times a bar, twice.
+"""
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+import heapq
+import itertools
+import time
+
+UPPER = slice(1, None)
+BASS = slice(0, 1)
+
+"""The default rhythm: upper voices and bass alternating, eight steps per bar."""
+BAR : Sequence[slice] = (UPPER, BASS, UPPER, BASS) * 2
+
+"""Steps per minute. 200 is the 0.3s step the player originally slept for."""
+TEMPO = 200
+
+
+def step_seconds(tempo: float) -> float:
+  return 60.0 / tempo
+
+
+def pattern_steps(notes: Sequence[int], pattern: Sequence[slice] = BAR) -> Iterator[List[int]]:
+  """
+  The notes sounded on each step of a pattern.
+
+  >>> list(pattern_steps([48, 60, 64], (UPPER, BASS)))
+  [[60, 64], [48]]
+  """
+  for step in pattern:
+    yield list(notes[step])
+
+
+class BeatScheduler:
+  """
+  Fires callbacks at absolute beat deadlines.
+
+  Events are (beat, callback, args) tuples; beat n is due at
+  start + n*step_seconds(tempo). Events can come from `schedule` or be pulled
+  from a source iterable by `run`, which only takes an event from the source
+  once it is due within `lookahead` seconds, so the source can read the
+  latest state as late as possible.
+  """
+  def __init__(self, tempo: float = TEMPO, lookahead: float = 0.1, tolerance: float = 0.005,
+               on_late: Optional[Callable[[float, float], None]] = None,
+               clock: Callable[[], float] = time.monotonic,
+               sleep: Callable[[float], None] = time.sleep):
+    self.tempo = tempo
+    self.lookahead = lookahead
+    self.tolerance = tolerance
+    self.on_late = on_late
+    self.clock = clock
+    self.sleep = sleep
+    self.start = None
+    self.queue : List[Tuple[float, int, Callable, tuple]] = []
+    self._seq = itertools.count()
+    self.fired = 0
+    self.late = 0
+    self.max_lateness = 0.0
+
+  def deadline(self, beat: float) -> float:
+    if self.start is None: self.start = self.clock()
+    return self.start + beat * step_seconds(self.tempo)
+
+  def schedule(self, beat: float, callback: Callable, *args):
+    heapq.heappush(self.queue, (self.deadline(beat), next(self._seq), callback, args))
+
+  def _fire(self):
+    deadline, _, callback, args = heapq.heappop(self.queue)
+    wait = deadline - self.clock()
+    if wait > 0: self.sleep(wait)
+    lateness = self.clock() - deadline
+    callback(*args)
+    self.fired += 1
+    if lateness > self.tolerance:
+      self.late += 1
+      self.max_lateness = max(self.max_lateness, lateness)
+      if self.on_late is not None: self.on_late(deadline, lateness)
+
+  def run(self, source: Iterable[Tuple[float, Callable, tuple]] = ()):
+    """
+    Run until both the source and the queue are exhausted.
+    """
+    source = iter(source)
+    pending = next(source, None)
+    while pending is not None or self.queue:
+      # queue everything from the source that is due within the lookahead
+      while pending is not None and self.deadline(pending[0]) <= self.clock() + self.lookahead:
+        self.schedule(pending[0], pending[1], *pending[2])
+        pending = next(source, None)
+      pull_at = self.deadline(pending[0]) - self.lookahead if pending is not None else float('inf')
+      if self.queue and self.queue[0][0] <= pull_at:
+        self._fire()
+      else:
+        # nothing due before the next event enters the lookahead window
+        self.sleep(max(0.0, pull_at - self.clock()))
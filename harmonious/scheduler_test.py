@@ -0,0 +1,61 @@
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.scheduler import BeatScheduler, BAR, UPPER, BASS, pattern_steps
+
+
+class FakeClock:
+  def __init__(self, cost=0.0):
+    self.now = 0.0
+    self.cost = cost
+  def __call__(self):
+    return self.now
+  def sleep(self, seconds):
+    self.now += seconds
+
+
+@given(st.floats(min_value=0, max_value=0.2))
+def test_send_latency_does_not_drift_the_beat(cost):
+  clock = FakeClock()
+  fired = []
+  def send(beat):
+    fired.append((beat, clock.now))
+    clock.now += cost  # time spent in the send itself
+  s = BeatScheduler(tempo=200, clock=clock, sleep=clock.sleep)
+  s.run((b, send, (b,)) for b in range(32))
+  assert [b for b, _ in fired] == list(range(32))
+  for b, at in fired:
+    assert abs(at - 0.3*b) < 1e-9
+  assert s.late == 0
+
+
+def test_late_events_are_reported():
+  clock = FakeClock()
+  late = []
+  def stall():
+    clock.now += 1.0
+  s = BeatScheduler(tempo=60, clock=clock, sleep=clock.sleep, on_late=lambda d, l: late.append(l))
+  s.run((b, stall, ()) for b in range(3))
+  assert s.fired == 3
+  assert s.late == 0
+  s = BeatScheduler(tempo=120, clock=clock, sleep=clock.sleep, on_late=lambda d, l: late.append(l))
+  s.run((b, stall, ()) for b in range(3))
+  assert s.late == 2
+  assert late == [0.5, 1.0]
+
+
+def test_source_is_read_within_lookahead():
+  clock = FakeClock()
+  pulled = []
+  def source():
+    for b in range(4):
+      pulled.append(clock.now)
+      yield b, (lambda: None), ()
+  BeatScheduler(tempo=60, lookahead=0.25, clock=clock, sleep=clock.sleep).run(source())
+  # the source is advanced once the previous event is queued, so each event is
+  # read at most one step plus the lookahead before it is due.
+  assert pulled == [0.0, 0.0, 0.75, 1.75]
+
+
+def test_default_pattern_alternates_upper_and_bass():
+  assert list(pattern_steps([48, 55, 64], BAR)) == [[55, 64], [48]] * 4
+  assert list(pattern_steps([], (UPPER, BASS))) == [[], []]
@@ -0,0 +1,247 @@
+"""
+Running a room of mats from one host: one :runtime: per mat, each in a process of its own.
+
+A runtime is a whole mat (TUIO intake, chords and playback) on one event
+loop, so mats share nothing but the synth and scale across cores by running
+side by side. The supervisor starts a worker process per mat, pins each to a
+CPU in turn, gives each its own TUIO port and its own MIDI channel or synth,
+and restarts any that die, waiting twice as long after each quick death (up
+to `max_backoff` seconds) so a mat that can't start doesn't fork in a loop.
+Workers report their totals over a queue every
+`report_every` seconds, and the supervisor prints the health and throughput
+of every mat and of the room.
+
+A mat is given as `port:pads[:channel][@host:port]`: the TUIO port its
+tracker sends to, the number of pads on it, the MIDI channel it plays on
+(its position in the list by default) and the synth to play it on (--synth
+by default).
+
+  $ python -m harmonious.supervisor 3333:4 3334:4 3335:2:9@10.0.0.5:4560
+
+The voicing catalog is memory mapped, so every worker shares one copy of it.
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from multiprocessing import Process, Queue
+from queue import Empty
+
+from harmonious import runtime
+from harmonious.catalog import DEFAULT_PATH as DEFAULT_CATALOG
+from harmonious.pads import PadLayout
+from harmonious.player import HOST, PORT
+from harmonious.scheduler import TEMPO
+
+
+class Mat(NamedTuple):
+  port: int         # TUIO port its tracker sends to
+  pads: int         # number of pads (vertical strips)
+  channel: int      # MIDI channel it plays on
+  host: str         # the synth's shell host and port
+  synth_port: int
+
+
+def parse_mat(text: str, index: int = 0, host: str = HOST, synth_port: int = PORT) -> Mat:
+  """
+  A mat from `port:pads[:channel][@host:port]`; the channel defaults to its index.
+
+  >>> parse_mat('3334:4', 1)
+  Mat(port=3334, pads=4, channel=1, host='127.0.0.1', synth_port=8000)
+  >>> parse_mat('3335:2:9@10.0.0.5:4560')
+  Mat(port=3335, pads=2, channel=9, host='10.0.0.5', synth_port=4560)
+  """
+  mat, _, synth = text.partition('@')
+  port, pads, *channel = (int(x) for x in mat.split(':'))
+  if synth:
+    host, synth_port = synth.rsplit(':', 1)
+  channel = channel[0] if channel else index % 16
+  if not 0 <= channel < 16: raise ValueError(f'{text}: MIDI channels are 0-15')
+  return Mat(port, pads, channel, host, int(synth_port))
+
+
+def worker(mat: Mat, queue: Queue, cpu: Optional[int] = None, tempo: float = TEMPO,
+           catalog: Optional[str] = DEFAULT_CATALOG, report_every: float = 1.0):
+  """run one mat's runtime, pinned to `cpu`, putting (port, totals) on `queue`"""
+  if cpu is not None and hasattr(os, 'sched_setaffinity'):
+    os.sched_setaffinity(0, {cpu})
+  pid = os.getpid()
+  report = lambda stats: queue.put((mat.port, {**stats, 'pid': pid, 'cpu': cpu}))
+  try:
+    asyncio.run(runtime.main(PadLayout.strips(mat.pads), mat.port, mat.host, mat.synth_port, tempo,
+                             catalog, mat.channel, report, report_every))
+  except KeyboardInterrupt:
+    pass
+
+
+"""The totals that are also reported per second."""
+RATES = ('frames', 'changes', 'steps')
+TOTALS = ('frames', 'changes', 'steps', 'late', 'errors', 'dropped', 'reconnects')
+
+
+class Supervisor:
+  """
+  Starts, watches and restarts a worker per mat, and keeps the latest totals
+  and rates each one reported.
+
+  :param pin: pin each worker to one of the CPUs this process may use, in turn.
+  :param backoff: seconds to wait before restarting a worker that died; it
+    doubles each time one dies again within `max_backoff` seconds of starting.
+  """
+  def __init__(self, mats: Sequence[Mat], tempo: float = TEMPO, catalog: Optional[str] = DEFAULT_CATALOG,
+               report_every: float = 1.0, pin: bool = True, backoff: float = 1.0, max_backoff: float = 60.0):
+    if len({m.port for m in mats}) != len(mats): raise ValueError('every mat needs its own TUIO port')
+    self.mats = {m.port: m for m in mats}
+    self.tempo = tempo
+    self.catalog = catalog
+    self.report_every = report_every
+    cpus = sorted(os.sched_getaffinity(0)) if pin and hasattr(os, 'sched_getaffinity') else []
+    self.cpus = {port: cpus[i % len(cpus)] if cpus else None for i, port in enumerate(self.mats)}
+    self.queue = Queue()
+    self.processes : Dict[int, Process] = {}
+    self.restarts = {port: 0 for port in self.mats}
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.started : Dict[int, float] = {}
+    self.delays : Dict[int, float] = {}
+    self.pending : Dict[int, float] = {}  # when each dead worker is due to be restarted
+    self.latest : Dict[int, dict] = {}
+    self.rates : Dict[int, Dict[str, float]] = {}
+
+  def start_mat(self, port: int, now: Optional[float] = None):
+    p = Process(target=worker, name=f'mat-{port}', daemon=True,
+                args=(self.mats[port], self.queue, self.cpus[port], self.tempo, self.catalog, self.report_every))
+    p.start()
+    self.processes[port] = p
+    self.started[port] = time.monotonic() if now is None else now
+
+  def start(self):
+    for port in self.mats:
+      self.start_mat(port)
+
+  def receive(self, port: int, stats: dict):
+    """take a worker's report; rates are worked out against its previous one"""
+    before = self.latest.get(port)
+    if before is not None and before['pid'] == stats['pid'] and stats['time'] > before['time']:
+      seconds = stats['time'] - before['time']
+      self.rates[port] = {k: (stats[k] - before[k]) / seconds for k in RATES}
+    else:
+      # a restarted worker counts from zero again
+      self.rates.pop(port, None)
+    self.latest[port] = stats
+
+  def collect(self, timeout: float = 0.0):
+    """take every waiting report, waiting up to `timeout` for the first"""
+    try:
+      report = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+      while True:
+        self.receive(*report)
+        report = self.queue.get_nowait()
+    except Empty:
+      pass
+
+  def check(self, now: Optional[float] = None) -> List[int]:
+    """schedule a restart for each worker that died, and restart those that are due, returning their ports"""
+    now = time.monotonic() if now is None else now
+    for port, p in self.processes.items():
+      if p.is_alive() or port in self.pending: continue
+      # a worker that stayed up a while starts over from the shortest wait
+      quick = now - self.started.get(port, now) < self.max_backoff
+      delay = min(2 * self.delays[port], self.max_backoff) if quick and port in self.delays else self.backoff
+      self.delays[port] = delay
+      self.pending[port] = now + delay
+      print(f'supervisor: mat {port} exited with {p.exitcode}, restarting in {delay:g}s', file=sys.stderr)
+    due = [port for port, at in self.pending.items() if at <= now]
+    for port in due:
+      del self.pending[port]
+      self.restarts[port] += 1
+      self.start_mat(port, now)
+    return due
+
+  def health(self, now: Optional[float] = None) -> Dict[int, dict]:
+    """
+    For each mat: its channel, CPU and restarts, whether its worker is alive
+    and reporting (stale after three missed reports), its synth connection,
+    and its latest totals and rates.
+    """
+    now = time.monotonic() if now is None else now
+    health = {}
+    for port, mat in self.mats.items():
+      latest = self.latest.get(port, {})
+      p = self.processes.get(port)
+      health[port] = {
+        'channel': mat.channel, 'cpu': self.cpus[port], 'restarts': self.restarts[port],
+        'alive': p is not None and p.is_alive(),
+        'stale': not latest or now - latest['time'] > 3 * self.report_every,
+        'connected': latest.get('connected', False),
+        **{k: latest.get(k, 0) for k in TOTALS},
+        **{f'{k}/s': self.rates.get(port, {}).get(k, 0.0) for k in RATES}}
+    return health
+
+  def totals(self, health: Dict[int, dict]) -> dict:
+    """the room: mats up and reporting, and the sum of every total and rate"""
+    keys = [*TOTALS, *(f'{k}/s' for k in RATES), 'restarts']
+    return {'mats': len(health), 'up': sum(h['alive'] and not h['stale'] for h in health.values()),
+            **{k: sum(h[k] for h in health.values()) for k in keys}}
+
+  def stop(self, timeout: float = 2.0):
+    """interrupt every worker, so each ends its notes, and kill those that don't exit in time"""
+    for p in self.processes.values():
+      if p.is_alive(): os.kill(p.pid, signal.SIGINT)
+    for p in self.processes.values():
+      p.join(timeout)
+      if p.is_alive(): p.terminate()
+
+  def run(self, every: float = 5.0, out=sys.stderr):
+    """start every mat, then watch them, printing a report every `every` seconds until interrupted"""
+    self.start()
+    printed = time.monotonic()
+    try:
+      while True:
+        self.collect(timeout=min(every, self.report_every))
+        self.check()
+        if time.monotonic() - printed >= every:
+          printed = time.monotonic()
+          health = self.health()
+          print(format_report(health, self.totals(health)), file=out)
+    finally:
+      self.stop()
+
+
+def format_report(health: Dict[int, dict], totals: dict) -> str:
+  lines = []
+  for port, h in health.items():
+    status = ('down' if not h['alive'] else 'stale' if h['stale'] else
+              'no synth' if not h['connected'] else 'ok')
+    lines.append(f"mat {port} ch {h['channel']:2} cpu {h['cpu']}: {status:8} "
+                 f"{h['frames/s']:6.1f} frames/s {h['steps/s']:5.1f} steps/s "
+                 f"late {h['late']} errors {h['errors']} dropped {h['dropped']} restarts {h['restarts']}")
+  t = totals
+  lines.append(f"room: {t['up']}/{t['mats']} mats up, {t['frames/s']:.1f} frames/s, {t['steps/s']:.1f} steps/s, "
+               f"{t['late']} late, {t['errors']} errors, {t['dropped']} dropped, {t['restarts']} restarts")
+  return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='run a runtime per mat, each in its own process')
+  parser.add_argument('mats', nargs='+', help='port:pads[:channel][@host:port] for each mat')
+  parser.add_argument('--synth', default=f'{HOST}:{PORT}', help="the default synth's shell host:port")
+  parser.add_argument('--tempo', type=float, default=TEMPO, help='steps per minute')
+  parser.add_argument('--catalog', default=DEFAULT_CATALOG,
+                      help='voicing catalog to use, see harmonious.catalog (skipped if missing)')
+  parser.add_argument('--report-every', type=float, default=5.0, help='seconds between health reports')
+  parser.add_argument('--no-pin', action='store_true', help="don't pin each mat to a CPU")
+  parser.add_argument('--max-backoff', type=float, default=60.0,
+                      help='most seconds to wait before restarting a mat that keeps dying')
+  args = parser.parse_args()
+  host, synth_port = args.synth.rsplit(':', 1)
+  mats = [parse_mat(m, i, host, int(synth_port)) for i, m in enumerate(args.mats)]
+  supervisor = Supervisor(mats, args.tempo, args.catalog, report_every=min(1.0, args.report_every),
+                          pin=not args.no_pin, max_backoff=args.max_backoff)
+  try:
+    supervisor.run(args.report_every)
+  except KeyboardInterrupt:
+    sys.exit()
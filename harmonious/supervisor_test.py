@@ -0,0 +1,75 @@
+import socket
+import time
+import pytest
+from harmonious.supervisor import Supervisor, format_report, parse_mat
+
+
+def free_udp_port():
+  with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+
+def test_mats_default_to_their_own_channels():
+  mats = [parse_mat(m, i) for i, m in enumerate(['3333:4', '3334:2', '3335:4:9'])]
+  assert [m.channel for m in mats] == [0, 1, 9]
+  with pytest.raises(ValueError):
+    parse_mat('3333:4:16')
+  with pytest.raises(ValueError):
+    Supervisor([mats[0], mats[0]._replace(channel=1)])
+
+
+def test_rates_and_totals_from_reports():
+  supervisor = Supervisor([parse_mat('3333:4', 0), parse_mat('3334:4', 1)], report_every=1.0)
+  report = {'frames': 0, 'changes': 0, 'steps': 0, 'late': 0, 'errors': 0, 'dropped': 0,
+            'reconnects': 1, 'connected': True, 'pid': 1, 'time': 10.0}
+  supervisor.receive(3333, report)
+  supervisor.receive(3333, {**report, 'frames': 120, 'steps': 8, 'late': 1, 'time': 12.0})
+  health = supervisor.health(now=12.5)
+  assert health[3333]['frames/s'] == 60 and health[3333]['steps/s'] == 4
+  assert not health[3333]['stale'] and health[3334]['stale']
+  totals = supervisor.totals(health)
+  assert totals['frames'] == 120 and totals['late'] == 1 and totals['up'] == 0
+  # a restarted worker starts counting again, so there is no rate until its second report
+  supervisor.receive(3333, {**report, 'pid': 2, 'time': 13.0})
+  assert supervisor.health(now=13.0)[3333]['frames/s'] == 0
+  assert 'room: 0/2 mats up' in format_report(health, totals)
+
+
+class DeadWorker:
+  exitcode = 1
+  def is_alive(self): return False
+
+
+def test_dead_workers_are_restarted_with_backoff():
+  supervisor = Supervisor([parse_mat('3333:4', 0)], backoff=1.0, max_backoff=4.0)
+  started = []
+  def start_mat(port, now=None):
+    started.append(now)
+    supervisor.processes[port] = DeadWorker()
+    supervisor.started[port] = now
+  supervisor.start_mat = start_mat
+  start_mat(3333, 0.0)
+  restarted = [t for t in [x / 2 for x in range(35)] if supervisor.check(now=t)]
+  # the wait doubles each time the worker dies straight away, up to max_backoff
+  assert restarted == [1.0, 3.5, 8.0, 12.5, 17.0]
+  assert supervisor.restarts[3333] == 5 and started[1:] == restarted
+  # a worker that ran for a while before dying is restarted after the shortest wait again
+  assert supervisor.check(now=30.0) == []
+  assert supervisor.check(now=30.5) == [] and supervisor.check(now=31.0) == [3333]
+
+
+def test_workers_report_and_stop():
+  # no synth is listening, so the worker plays into the void and reports it
+  supervisor = Supervisor([parse_mat(f'{free_udp_port()}:2@127.0.0.1:9', 0)], catalog=None, report_every=0.1)
+  supervisor.start()
+  try:
+    deadline = time.monotonic() + 10
+    while not supervisor.latest and time.monotonic() < deadline:
+      supervisor.collect(timeout=0.1)
+    health = supervisor.health()
+    (mat,) = health.values()
+    assert mat['alive'] and not mat['stale'] and not mat['connected']
+  finally:
+    supervisor.stop()
+  assert not any(p.is_alive() for p in supervisor.processes.values())
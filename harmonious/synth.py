@@ -0,0 +1,197 @@
+"""
+Connections to the synth (fluidsynth's shell port).
+
+Fluidsynth is started with `-o shell.port=8000` and accepts text commands
+(`noteon 0 60 100`) over TCP. Opening a socket per command costs a connect,
+a teardown and a Nagle delay on every chord hit, which is audible as jitter,
+so connections here are long lived, have TCP_NODELAY set, and reconnect on
+their own when the synth goes away.
+
+A synth that is down should not stop the player, so a failed send is
+dropped (and reported by returning False) and the next attempt to connect
+waits out an exponential backoff instead of blocking the beat.
+"""
+from typing import Dict, List, Tuple, Callable
+import socket
+import threading
+import time
+
+
+class SynthConnection:
+  """
+  A single long-lived connection to a synth's shell port.
+
+  The socket is opened lazily on the first send, so a connection can be
+  created before a fork without sharing a socket between processes.
+  """
+  def __init__(self, host: str, port: int, timeout: float = 1.0,
+               backoff: float = 0.05, max_backoff: float = 2.0,
+               clock: Callable[[], float] = time.monotonic):
+    self.host = host
+    self.port = port
+    self.timeout = timeout
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.clock = clock
+    self.lock = threading.Lock()
+    self._sock = None
+    self._delay = 0.0
+    self._retry_at = 0.0
+    self.reconnects = 0
+    self.dropped = 0
+
+  @property
+  def connected(self) -> bool:
+    return self._sock is not None
+
+  def connect(self) -> bool:
+    """Open the socket unless we are still backing off from a failure."""
+    if self._sock is not None: return True
+    if self.clock() < self._retry_at: return False
+    try:
+      s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+      s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+      self._fail()
+      return False
+    self._sock = s
+    self._delay = 0.0
+    self.reconnects += 1
+    return True
+
+  def _fail(self):
+    self.close()
+    self._delay = min(self.max_backoff, max(self.backoff, 2*self._delay))
+    self._retry_at = self.clock() + self._delay
+
+  def send(self, msg: str) -> bool:
+    """
+    Send a block of newline separated commands. Returns False if the message was dropped.
+    """
+    if msg.strip() == '': return True
+    # every command must be terminated or the shell waits for the rest of the line
+    data = (msg if msg.endswith('\n') else msg + '\n').encode('utf-8')
+    with self.lock:
+      # a socket broken since the last write only errors on the next send,
+      # so give each message one retry on a fresh connection.
+      for _ in range(2):
+        if not self.connect(): break
+        try:
+          self._sock.sendall(data)
+          return True
+        except OSError:
+          self._fail()
+          self._retry_at = 0.0
+      self.dropped += 1
+      return False
+
+  def close(self):
+    if self._sock is not None:
+      try:
+        self._sock.close()
+      except OSError:
+        pass
+    self._sock = None
+
+
+class SynthPool:
+  """
+  A small pool of connections per synth address, so several players can share one fluidsynth.
+
+  Each connection is used by one sender at a time; a sender takes the first
+  idle connection, or waits on one chosen round robin when all are busy.
+  """
+  def __init__(self, size: int = 2, **options):
+    self.size = size
+    self.options = options
+    self.lock = threading.Lock()
+    self.pools: Dict[Tuple[str, int], List[SynthConnection]] = {}
+    self._next: Dict[Tuple[str, int], int] = {}
+
+  def connections(self, host: str, port: int) -> List[SynthConnection]:
+    with self.lock:
+      if (host, port) not in self.pools:
+        self.pools[(host, port)] = [SynthConnection(host, port, **self.options) for _ in range(self.size)]
+        self._next[(host, port)] = 0
+      return self.pools[(host, port)]
+
+  def connection(self, host: str, port: int) -> SynthConnection:
+    conns = self.connections(host, port)
+    for c in conns:
+      if not c.lock.locked(): return c
+    with self.lock:
+      i = self._next[(host, port)]
+      self._next[(host, port)] = (i + 1) % len(conns)
+    return conns[i]
+
+  def send(self, host: str, port: int, msg: str) -> bool:
+    return self.connection(host, port).send(msg)
+
+  def close(self):
+    with self.lock:
+      for conns in self.pools.values():
+        for c in conns:
+          c.close()
+      self.pools.clear()
+
+
+class AsyncSynthConnection:
+  """
+  A connection to a synth's shell port for asyncio code, where a send never waits.
+
+  Messages are written into the transport's buffer; when the synth is down
+  they are dropped, and a reconnect is attempted in the background with the
+  same backoff as :SynthConnection:.
+  """
+  def __init__(self, host: str, port: int, backoff: float = 0.05, max_backoff: float = 2.0):
+    self.host = host
+    self.port = port
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self._writer = None
+    self._connecting = None
+    self._delay = 0.0
+    self.reconnects = 0
+    self.dropped = 0
+
+  @property
+  def connected(self) -> bool:
+    return self._writer is not None and not self._writer.is_closing()
+
+  async def connect(self):
+    import asyncio
+    while not self.connected:
+      try:
+        _, self._writer = await asyncio.open_connection(self.host, self.port)
+        sock = self._writer.get_extra_info('socket')
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._delay = 0.0
+        self.reconnects += 1
+      except OSError:
+        self._delay = min(self.max_backoff, max(self.backoff, 2*self._delay))
+        await asyncio.sleep(self._delay)
+    self._connecting = None
+
+  def send(self, msg: str) -> bool:
+    if msg.strip() == '': return True
+    if not self.connected:
+      if self._connecting is None:
+        import asyncio
+        self._connecting = asyncio.ensure_future(self.connect())
+      self.dropped += 1
+      return False
+    self._writer.write((msg if msg.endswith('\n') else msg + '\n').encode('utf-8'))
+    return True
+
+  async def drain(self):
+    """wait until what was sent has been handed to the OS"""
+    if self.connected:
+      try:
+        await self._writer.drain()
+      except OSError:
+        pass
+
+  def close(self):
+    if self._connecting is not None: self._connecting.cancel()
+    if self._writer is not None: self._writer.close()
+    self._writer = None
@@ -0,0 +1,63 @@
+import socket
+import threading
+from harmonious.synth import SynthConnection, SynthPool
+
+
+def make_server():
+  server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  server.bind(('127.0.0.1', 0))
+  server.listen(4)
+  received = []
+  def serve():
+    while True:
+      try:
+        conn, _ = server.accept()
+      except OSError:
+        return
+      with conn:
+        while True:
+          data = conn.recv(4096)
+          if not data: break
+          received.append(data)
+  threading.Thread(target=serve, daemon=True).start()
+  return server, received
+
+
+def test_connection_is_reused_and_lines_are_terminated():
+  server, received = make_server()
+  c = SynthConnection(*server.getsockname())
+  assert c.send('noteon 0 60 100')
+  assert c.send('noteon 0 64 100\n')
+  c.close()
+  assert c.reconnects == 1
+  assert not c.connected
+  # give the server a moment to drain
+  for _ in range(200):
+    if b''.join(received) == b'noteon 0 60 100\nnoteon 0 64 100\n': break
+    threading.Event().wait(0.01)
+  server.close()
+  assert b''.join(received) == b'noteon 0 60 100\nnoteon 0 64 100\n'
+
+
+def test_unreachable_synth_drops_and_backs_off():
+  s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  s.bind(('127.0.0.1', 0))
+  addr = s.getsockname()
+  s.close()
+  now = [0.0]
+  c = SynthConnection(*addr, backoff=0.5, clock=lambda: now[0])
+  assert not c.send('noteon 0 60 100')
+  # still backing off, so no connection attempt is made
+  assert not c.connect()
+  assert c.dropped == 1
+  now[0] = 1.0
+  assert not c.send('noteon 0 60 100')
+  assert c._delay == 1.0
+
+
+def test_pool_shares_connections_per_address():
+  pool = SynthPool(size=2)
+  a = pool.connection('127.0.0.1', 9)
+  assert a is pool.connection('127.0.0.1', 9)
+  assert len(pool.connections('127.0.0.1', 9)) == 2
+  assert pool.connection('127.0.0.1', 10) is not a
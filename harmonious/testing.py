@@ -0,0 +1,31 @@
+"""
+Helpers shared by the tests: TUIO traffic as a tracker would send it.
+"""
+from typing import Sequence, Tuple
+
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message_builder import OscMessageBuilder
+from pythonosc.osc_packet import OscPacket
+
+
+def tuio_bundle(fseq: int, objects: Sequence[Tuple[int, int, float, float]]) -> bytes:
+  """
+  One /tuio/2Dobj frame as an OSC bundle datagram: alive, a set per object
+  and fseq. Objects are (session id, marker, x, angle), all at y = 0.5.
+  """
+  b = OscBundleBuilder(IMMEDIATELY)
+  messages = [['alive', *[o[0] for o in objects]]]
+  messages += [['set', sid, marker, x, 0.5, angle, 0.0, 0.0, 0.0, 0.0, 0.0] for sid, marker, x, angle in objects]
+  messages += [['fseq', fseq]]
+  for args in messages:
+    m = OscMessageBuilder('/tuio/2Dobj')
+    for a in args:
+      m.add_arg(a)
+    b.add_content(m.build())
+  return b.build().dgram
+
+
+def feed(session, datagram: bytes):
+  """hand each message of a datagram to a TuioSession, as the connector's listener does"""
+  for m in OscPacket(datagram).messages:
+    session.handle(m.message.address, m.message.params)
@@ -0,0 +1,116 @@
+"""
+TUIO 1.x session state, independent of how the OSC messages arrive.
+
+Each profile (2Dcur, 2Dobj, 2Dblb) keeps its objects in a dict keyed by
+session id. A frame is the `alive` message, the `set` messages for objects
+that changed, and the closing `fseq`; when the frame is accepted it is
+applied to the profile as a diff of added, updated and removed objects, and
+that diff is handed to frame listeners so they don't have to recompute it
+from full snapshots.
+
+The object classes were taken from py3tuio, see :connector:.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+from harmonious.latency import latency
+
+
+class TuioObject:
+    """this represents a TUIO object"""
+    def __init__(self, args, argsLength):
+        if (len(args) != argsLength):
+            raise ValueError("TUIO Message: wrong number of arguments")
+    def __repr__(self):
+      return repr(self.__dict__)
+
+class Tuio2DCursor(TuioObject):
+    """this represents a TUIO 2D cursor"""
+    def __init__(self, args):
+        super(Tuio2DCursor, self).__init__(args, 6)
+        self.sessionId, self.x, self.y, self.xVelocity, self.yVelocity, self.acceleration = args[0:6]
+
+class Tuio2DObject(TuioObject):
+    """this represents a TUIO 2D object"""
+    def __init__(self, args):
+        super(Tuio2DObject, self).__init__(args, 10)
+        self.sessionId, self.markerId, self.x, self.y, self.angle, self.xVelocity, self.yVelocity, self.rotationSpeed, self.acceleration, self.rotationAcceleration = args[0:10]
+
+class Tuio2DBlob(TuioObject):
+    """this represents a TUIO 2D blob"""
+    def __init__(self, args):
+        super(Tuio2DBlob, self).__init__(args, 12)
+        self.sessionId, self.x, self.y, self.angle, self.width, self.height, self.area, self.xVelocity, self.yVelocity, self.rotationSpeed, self.acceleration, self.rotationAcceleration = args[0:12]
+
+
+class FrameDiff(NamedTuple):
+    """the changes one accepted frame made to a profile, keyed by session id"""
+    profile: str
+    fseq: int
+    added: Dict[int, TuioObject]
+    updated: Dict[int, TuioObject]
+    removed: Dict[int, TuioObject]
+    time: Optional[float] = None  # when the frame was accepted, if latency is being measured
+
+
+class TuioProfile:
+    """the live objects of one TUIO profile"""
+    def __init__(self, path, objectType):
+        self.path = path
+        self.objectType = objectType
+        self.objects : Dict[int, TuioObject] = {}
+        self.fseq = 0
+        self._alive : Optional[Set[int]] = None
+        self._pending : Dict[int, TuioObject] = {}
+
+    def alive(self, sessionIds):
+        self._alive = set(sessionIds)
+
+    def set(self, args):
+        o = self.objectType(args)
+        self._pending[o.sessionId] = o
+
+    def commit(self, fseq) -> Optional[FrameDiff]:
+        """apply the frame ending with fseq, or drop it if it arrived out of order"""
+        pending, self._pending = self._pending, {}
+        if not (fseq == -1 or self.fseq < fseq):
+            return None
+        self.fseq = fseq
+        alive = self._alive if self._alive is not None else self.objects.keys() | pending.keys()
+        removed = {sid: self.objects.pop(sid) for sid in self.objects.keys() - alive}
+        added, updated = {}, {}
+        for sid, o in pending.items():
+            # a set for a session that isn't alive is stale, not an error
+            if sid not in alive: continue
+            (updated if sid in self.objects else added)[sid] = o
+            self.objects[sid] = o
+        return FrameDiff(self.path, fseq, added, updated, removed, latency.stamp())
+
+
+class TuioSession:
+    """
+    the state of every profile, updated one OSC message at a time
+    """
+    def __init__(self):
+        self.profiles = {
+            "/tuio/2Dcur": TuioProfile("/tuio/2Dcur", Tuio2DCursor),
+            "/tuio/2Dobj": TuioProfile("/tuio/2Dobj", Tuio2DObject),
+            "/tuio/2Dblb": TuioProfile("/tuio/2Dblb", Tuio2DBlob),
+        }
+        self.frameListeners : List[Callable[[FrameDiff], None]] = []
+
+    def handle(self, path, args) -> Optional[FrameDiff]:
+        """process one TUIO/OSC message, returning the frame's diff if it completed one"""
+        profile = self.profiles.get(path)
+        if profile is None or len(args) == 0: return None
+        messageType = args[0]
+        if messageType == "alive":
+            profile.alive(args[1:])
+        elif messageType == "set":
+            profile.set(args[1:])
+        elif messageType == "fseq":
+            diff = profile.commit(args[1])
+            if diff is not None:
+                for listener in self.frameListeners:
+                    listener(diff)
+            return diff
+        return None
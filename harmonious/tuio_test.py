@@ -0,0 +1,49 @@
+from harmonious.tuio import TuioSession
+
+
+def obj(sessionId, markerId, x=0.5, angle=0.0):
+  return ['set', sessionId, markerId, x, 0.5, angle, 0, 0, 0, 0, 0]
+
+
+def frame(session, fseq, alive, *sets, path='/tuio/2Dobj'):
+  session.handle(path, ['alive', *alive])
+  for s in sets:
+    session.handle(path, s)
+  return session.handle(path, ['fseq', fseq])
+
+
+def test_frames_apply_as_diffs():
+  session = TuioSession()
+  diffs = []
+  session.frameListeners.append(diffs.append)
+  d = frame(session, 1, [1, 2], obj(1, 25), obj(2, 29))
+  assert sorted(d.added) == [1, 2] and d.updated == {} and d.removed == {}
+  # only the object that moved is sent again
+  d = frame(session, 2, [1, 2], obj(2, 29, angle=1.0))
+  assert d.added == {} and list(d.updated) == [2] and d.removed == {}
+  d = frame(session, 3, [2])
+  assert list(d.removed) == [1] and d.removed[1].markerId == 25
+  assert list(session.profiles['/tuio/2Dobj'].objects) == [2]
+  assert [d.fseq for d in diffs] == [1, 2, 3]
+
+
+def test_out_of_order_frames_are_dropped():
+  session = TuioSession()
+  frame(session, 5, [1], obj(1, 25))
+  assert frame(session, 4, [], obj(2, 29)) is None
+  assert list(session.profiles['/tuio/2Dobj'].objects) == [1]
+  assert frame(session, -1, []).removed.keys() == {1}
+
+
+def test_set_for_session_that_is_not_alive_is_ignored():
+  session = TuioSession()
+  d = frame(session, 1, [1], obj(1, 25), obj(7, 30))
+  assert list(d.added) == [1]
+
+
+def test_profiles_are_tracked_separately():
+  session = TuioSession()
+  frame(session, 1, [1], obj(1, 25))
+  frame(session, 1, [3], ['set', 3, 0.1, 0.2, 0, 0, 0], path='/tuio/2Dcur')
+  assert list(session.profiles['/tuio/2Dobj'].objects) == [1]
+  assert list(session.profiles['/tuio/2Dcur'].objects) == [3]
@@ -0,0 +1,180 @@
+"""
+Recording TUIO traffic and playing it back, to test the connector without a mat.
+
+The recorder sits between the tracker and the connector as a UDP proxy: every
+datagram that arrives on its port is appended to a log and forwarded to the
+connector unchanged. The log is a header followed by one record per datagram,
+
+  time (float64, seconds since the epoch) | length (uint32) | the datagram
+
+little endian, so it only ever grows and a recording killed midway loses at
+most its unwritten buffer. Appending to an existing log adds a new take.
+
+The replayer maps the log into memory and sends each datagram straight from
+the map, either at the pace it was recorded, `speed` times faster, or (speed
+0) as fast as the socket takes them.
+
+  $ python -m harmonious.tuiolog record session.tuio --port 3333 --forward 3334
+  $ python -m harmonious.connector 4 --port 3334 | python -m harmonious.player
+  $ python -m harmonious.tuiolog replay session.tuio --port 3333 --speed 4
+"""
+from typing import Callable, Iterator, Optional, Tuple
+import argparse
+import mmap
+import os
+import socket
+import struct
+import sys
+import time
+
+MAGIC = b'HTUIO\x01\n\x00'
+RECORD = struct.Struct('<dI')
+
+
+class LogWriter:
+  """appends timestamped datagrams to a log, writing the header if it is new"""
+  def __init__(self, path: str, clock: Callable[[], float] = time.time):
+    self.clock = clock
+    self.file = open(path, 'ab')
+    if self.file.tell() == 0: self.file.write(MAGIC)
+    self.records = 0
+
+  def write(self, datagram: bytes, t: Optional[float] = None):
+    self.file.write(RECORD.pack(self.clock() if t is None else t, len(datagram)))
+    self.file.write(datagram)
+    self.records += 1
+
+  def flush(self):
+    self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+def read_log(buf) -> Iterator[Tuple[float, memoryview]]:
+  """
+  the (time, datagram) records of a log held in a buffer (like an mmap),
+  without copying; a record cut short by a crash ends the log
+  """
+  view = memoryview(buf)
+  if bytes(view[:len(MAGIC)]) != MAGIC:
+    raise ValueError('not a TUIO log')
+  offset = len(MAGIC)
+  while offset + RECORD.size <= len(view):
+    t, length = RECORD.unpack_from(view, offset)
+    offset += RECORD.size
+    if offset + length > len(view): break
+    yield t, view[offset:offset + length]
+    offset += length
+
+
+def record(path: str, port: int = 3333, forward: Optional[Tuple[str, int]] = ('127.0.0.1', 3334),
+           flush_every: float = 1.0, stop: Callable[[], bool] = lambda: False) -> int:
+  """
+  Log every datagram arriving on `port`, forwarding it on if `forward` is set.
+
+  :param flush_every: seconds between flushes of the log to disk.
+  :param stop: checked between datagrams (and at least every flush_every); return True to stop.
+  :return: the number of datagrams recorded.
+  """
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  sock.bind(('0.0.0.0', port))
+  sock.settimeout(flush_every)
+  out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if forward else None
+  with LogWriter(path) as log:
+    flushed = time.monotonic()
+    try:
+      while not stop():
+        try:
+          datagram = sock.recv(65535)
+        except socket.timeout:
+          datagram = None
+        if datagram is not None:
+          # forward first, so recording adds as little as possible to the connector's latency
+          if out is not None: out.sendto(datagram, forward)
+          log.write(datagram)
+        if time.monotonic() - flushed >= flush_every:
+          log.flush()
+          flushed = time.monotonic()
+    finally:
+      sock.close()
+      if out is not None: out.close()
+    return log.records
+
+
+def replay(path: str, host: str = '127.0.0.1', port: int = 3333, speed: float = 1.0,
+           loops: int = 1, clock: Callable[[], float] = time.monotonic,
+           sleep: Callable[[float], None] = time.sleep) -> dict:
+  """
+  Send the datagrams of a log to host:port.
+
+  :param speed: how many times faster than recorded; 0 sends as fast as possible.
+  :param loops: how many times to play the whole log.
+  :return: counts, the elapsed time and rate, and how far behind schedule sends fell at worst.
+  """
+  stats = {'datagrams': 0, 'bytes': 0, 'seconds': 0.0, 'max_behind': 0.0}
+  if os.path.getsize(path) <= len(MAGIC): return stats
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  address = (host, port)
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+    start = clock()
+    offset = 0.0  # where the current pass starts on the replay timeline
+    try:
+      for _ in range(loops):
+        previous = first = None
+        position = 0.0  # recorded seconds into this pass
+        for t, datagram in read_log(buf):
+          if first is None: first = previous = t
+          # a gap backwards is the start of another take; play it right after the last
+          position += max(0.0, t - previous)
+          previous = t
+          if speed > 0:
+            due = start + offset + position / speed
+            ahead = due - clock()
+            if ahead > 0: sleep(ahead)
+            else: stats['max_behind'] = max(stats['max_behind'], -ahead)
+          sock.sendto(datagram, address)
+          stats['datagrams'] += 1
+          stats['bytes'] += len(datagram)
+          del datagram
+        if speed > 0: offset += position / speed
+    finally:
+      sock.close()
+    stats['seconds'] = clock() - start
+  stats['rate'] = stats['datagrams'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+  return stats
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='record TUIO traffic to a log, or replay one')
+  commands = parser.add_subparsers(dest='command', required=True)
+  r = commands.add_parser('record', help='proxy TUIO datagrams to the connector, logging them')
+  r.add_argument('log')
+  r.add_argument('--port', type=int, default=3333, help='port the tracker sends to')
+  r.add_argument('--forward', default='127.0.0.1:3334',
+                 help="host:port of the connector, or '' to only record")
+  p = commands.add_parser('replay', help='send a logged session to the connector')
+  p.add_argument('log')
+  p.add_argument('--host', default='127.0.0.1')
+  p.add_argument('--port', type=int, default=3333, help="the connector's TUIO port")
+  p.add_argument('--speed', type=float, default=1.0, help='times faster than recorded, 0 for flat out')
+  p.add_argument('--loops', type=int, default=1)
+  args = parser.parse_args()
+
+  try:
+    if args.command == 'record':
+      forward = args.forward.rsplit(':', 1) if args.forward else None
+      n = record(args.log, args.port, (forward[0], int(forward[1])) if forward else None)
+      print(f'recorded {n} datagrams', file=sys.stderr)
+    else:
+      stats = replay(args.log, args.host, args.port, args.speed, args.loops)
+      print(f"sent {stats['datagrams']} datagrams ({stats['bytes']} bytes) in {stats['seconds']:.3f}s, "
+            f"{stats['rate']:.0f}/s, at worst {1000*stats['max_behind']:.1f}ms behind", file=sys.stderr)
+  except KeyboardInterrupt:
+    sys.exit()
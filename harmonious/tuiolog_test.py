@@ -0,0 +1,85 @@
+import os
+import socket
+import tempfile
+import threading
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.tuiolog import LogWriter, read_log, record, replay
+
+
+@given(st.lists(st.tuples(st.floats(0, 1e9), st.binary(max_size=64)), max_size=20))
+def test_log_round_trips(records):
+  with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, 'log')
+    with LogWriter(path) as log:
+      for t, datagram in records:
+        log.write(datagram, t)
+    with open(path, 'rb') as f:
+      data = f.read()
+  assert [(t, bytes(d)) for t, d in read_log(data)] == records
+  # a record cut short ends the log instead of failing it
+  if records and records[-1][1]:
+    assert [(t, bytes(d)) for t, d in read_log(data[:-1])] == records[:-1]
+
+
+def receiver(n):
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  sock.bind(('127.0.0.1', 0))
+  sock.settimeout(2)
+  received = []
+  thread = threading.Thread(target=lambda: received.extend(sock.recv(65535) for _ in range(n)))
+  thread.start()
+  return sock, received, thread
+
+
+def test_replay_sends_every_datagram_in_order(tmp_path):
+  path = str(tmp_path / 'log')
+  with LogWriter(path) as log:
+    for i in range(50):
+      log.write(b'/tuio/2Dobj %d' % i, 100.0 + i / 100)
+  sock, received, thread = receiver(100)
+  stats = replay(path, port=sock.getsockname()[1], speed=0, loops=2)
+  thread.join()
+  sock.close()
+  assert stats['datagrams'] == 100
+  assert received == [b'/tuio/2Dobj %d' % i for i in range(50)] * 2
+
+
+def test_replay_keeps_the_recorded_pace(tmp_path):
+  path = str(tmp_path / 'log')
+  with LogWriter(path) as log:
+    for t in (10.0, 10.5, 12.0, 0.0):  # the last is a new take, played right away
+      log.write(b'x', t)
+  now = [0.0]
+  def sleep(s):
+    now[0] += s
+  sent = []
+  stats = replay(path, port=9, speed=2, loops=2, clock=lambda: now[0],
+                 sleep=lambda s: (sleep(s), sent.append(now[0])))
+  # the second pass starts where the first ended, at 2s recorded = 1s played
+  assert sent == [0.25, 1.0, 1.25, 2.0]
+  assert stats['datagrams'] == 8 and stats['max_behind'] == 0
+
+
+def test_record_forwards_and_logs(tmp_path):
+  path = str(tmp_path / 'log')
+  sink, received, thread = receiver(3)
+  probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  probe.bind(('127.0.0.1', 0))
+  port = probe.getsockname()[1]
+  probe.close()
+  counts = []
+  recorder = threading.Thread(target=lambda: counts.append(
+    record(path, port, sink.getsockname(), flush_every=0.05, stop=lambda: len(received) >= 3)))
+  recorder.start()
+  sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  while recorder.is_alive() and len(received) < 3:
+    sender.sendto(b'frame', ('127.0.0.1', port))
+    thread.join(0.02)
+  recorder.join()
+  sender.close()
+  sink.close()
+  with open(path, 'rb') as f:
+    logged = [bytes(d) for _, d in read_log(f.read())]
+  assert received == [b'frame'] * 3
+  assert len(logged) == counts[0] >= 3
@@ -0,0 +1,157 @@
+"""
+Voice leading: choosing how to voice each chord so that chord changes move as little as possible.
+
+:voicing: always plays the first voicing listed for a chord in
+:layers_voicings:, so every change of chord jumps to wherever that voicing
+happens to sit. Here every listed voicing of a chord, each with and without
+its inversion, is a candidate, and the candidate picked is the one closest to
+the chord before it:
+
+  movement   the distance each note of one chord has to go to the nearest
+             note of the other, summed both ways, in semitones
+
+A whole progression is voiced by :lead:, which is a Viterbi pass over the
+candidates of each chord: it keeps the cheapest path ending in every
+candidate and backtracks from the cheapest at the end, so it finds the
+least total movement, not just the least at each step. :VoiceLeader: makes
+the same choice one chord at a time, for the live loop, where the chords
+ahead aren't known yet.
+
+Chords are given as (root, layers, inversion), where layers is a string or
+:layers_mask: and inversion None lets the voice leading decide. Candidates
+and the cost of moving between two of them are computed once per pair of
+chord types and interval between roots, so voicing a change is a few
+cached lookups.
+
+>>> lead([(48, '5Δ8', None), (53, '5Δ8', None), (55, '5Δ*', None)])
+[[48, 55, 60, 60, 64], [53, 60, 65, 65, 69], [55, 55, 62, 65, 71]]
+"""
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from functools import lru_cache
+import bisect
+
+from harmonious.music import (catalog_voicings, layers_mask, layers_voicings, mask_default_voicing,
+                              _root_midi, _tone_to_voicing, ROOT_BIT)
+
+Spec = Tuple[Union[int, str], Union[str, int], Optional[bool]]  # (root, layers, inversion)
+
+
+"""Every voicing listed in :layers_voicings:, keyed by mask."""
+mask_all_voicings : Dict[int, List[Tuple[int, ...]]] = {}
+for _layers, _voicings in layers_voicings.items():
+  mask_all_voicings.setdefault(layers_mask(_layers), []).extend(_tone_to_voicing(v) for v in _voicings)
+
+
+@lru_cache(maxsize=None)
+def candidates(mask: int, inversion: Optional[bool] = None) -> Tuple[Tuple[int, ...], ...]:
+  """
+  The notes, relative to the root, of every way to voice a chord, as :chord: builds them.
+
+  >>> candidates(layers_mask('5Δ8'), False)
+  ((0, 0, 7, 12, 16), (0, 0, 4, 7, 12), (0, 0, 7, 12, 16, 19, 24))
+  """
+  mask &= ~ROOT_BIT
+  if mask == 0: return ((0,),)
+  voicings = (mask_all_voicings.get(mask) or catalog_voicings(mask)
+              or [tuple(mask_default_voicing(mask))])
+  out = []
+  for inverted in ((False, True) if inversion is None else (inversion,)):
+    for base in voicings:
+      # the same naive inversion as :voicing:
+      out.append(tuple(sorted((0, *(base[1:] + (base[0]+12,) if inverted else base)))))
+  return tuple(dict.fromkeys(out))
+
+
+def movement(a: Sequence[int], b: Sequence[int]) -> int:
+  """
+  How far the notes of two sorted chords move to get from one to the other.
+
+  >>> movement([48, 52, 55], [48, 53, 57])
+  6
+  """
+  if not a or not b: return 0
+  return _nearest(a, b) + _nearest(b, a)
+
+
+def _nearest(a, b):
+  total = 0
+  for x in a:
+    i = bisect.bisect_left(b, x)
+    total += min(b[i] - x if i < len(b) else 1 << 30, x - b[i-1] if i > 0 else 1 << 30)
+  return total
+
+
+@lru_cache(maxsize=4096)
+def _costs(a: Tuple[int, Optional[bool]], b: Tuple[int, Optional[bool]], interval: int):
+  """movement between every pair of candidates of two chords whose roots are `interval` apart"""
+  bs = candidates(*b)
+  return tuple(tuple(movement(x, [n + interval for n in y]) for y in bs) for x in candidates(*a))
+
+
+def _key(spec: Spec) -> Tuple[int, int, Optional[bool]]:
+  root, layers, inversion = spec
+  return _root_midi(root), layers if isinstance(layers, int) else layers_mask(layers), inversion
+
+
+def lead(progression: Sequence[Optional[Spec]]) -> List[List[int]]:
+  """
+  The notes of each chord of a progression, voiced for the least total movement.
+
+  A None in the progression is a rest, which plays nothing and doesn't tie
+  the chords on either side of it together.
+  """
+  chords : List[List[int]] = []
+  start = 0
+  for i, spec in enumerate([*progression, None]):
+    if spec is None:
+      chords.extend(_viterbi([_key(s) for s in progression[start:i]]))
+      if i < len(progression): chords.append([])
+      start = i + 1
+  return chords
+
+
+def _viterbi(keys) -> List[List[int]]:
+  if not keys: return []
+  cost = [0] * len(candidates(*keys[0][1:]))
+  back = []
+  for (r0, *a), (r1, *b) in zip(keys, keys[1:]):
+    costs = _costs(tuple(a), tuple(b), r1 - r0)
+    best = [min(range(len(cost)), key=lambda i: cost[i] + costs[i][j]) for j in range(len(costs[0]))]
+    cost = [cost[i] + costs[i][j] for j, i in enumerate(best)]
+    back.append(best)
+  j = min(range(len(cost)), key=cost.__getitem__)
+  path = [j]
+  for best in reversed(back):
+    j = best[j]
+    path.append(j)
+  return [[root + n for n in candidates(mask, inversion)[j]]
+          for (root, mask, inversion), j in zip(keys, reversed(path))]
+
+
+class VoiceLeader:
+  """
+  Voices chords one at a time, each as close as it can be to the one before.
+
+  >>> leader = VoiceLeader()
+  >>> leader.next((48, '5Δ8', None)), leader.next((53, '5Δ8', None))
+  ([48, 48, 55, 60, 64], [53, 57, 60, 65, 65])
+  """
+  def __init__(self):
+    self.previous : Optional[Tuple[int, int, Optional[bool], int]] = None
+
+  def next(self, spec: Optional[Spec]) -> List[int]:
+    if spec is None:
+      self.previous = None
+      return []
+    root, mask, inversion = _key(spec)
+    if self.previous is None:
+      j = 0
+    else:
+      r0, m0, i0, c0 = self.previous
+      row = _costs((m0, i0), (mask, inversion), root - r0)[c0]
+      j = min(range(len(row)), key=row.__getitem__)
+    self.previous = (root, mask, inversion, j)
+    return [root + n for n in candidates(mask, inversion)[j]]
+
+  def reset(self):
+    self.previous = None
@@ -0,0 +1,45 @@
+import itertools
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from harmonious.music import chord, layers_mask, layers_voicings, symbol_masks
+from harmonious.voiceleading import VoiceLeader, candidates, lead, movement
+
+specs = st.tuples(st.integers(min_value=36, max_value=60),
+                  st.sampled_from(sorted(set(symbol_masks.values())) + sorted(layers_voicings)),
+                  st.sampled_from([None, False, True]))
+
+
+def voicings(spec):
+  root, layers, inversion = spec
+  return [[root + n for n in c]
+          for c in candidates(layers if isinstance(layers, int) else layers_mask(layers), inversion)]
+
+
+@given(specs)
+def test_candidates_include_the_plain_chord(spec):
+  root, layers, inversion = spec
+  for inverted in ([False, True] if inversion is None else [inversion]):
+    if layers_mask(layers) & ~1:
+      assert sorted(chord(root, layers, inverted)) in voicings(spec)
+
+
+@settings(max_examples=50)
+@given(st.lists(specs, min_size=1, max_size=4))
+def test_lead_finds_the_least_total_movement(progression):
+  chords = lead(progression)
+  total = sum(movement(a, b) for a, b in zip(chords, chords[1:]))
+  options = [voicings(s) for s in progression]
+  assert total == min(sum(movement(a, b) for a, b in zip(p, p[1:])) for p in itertools.product(*options))
+
+
+@given(st.lists(st.one_of(st.none(), specs), max_size=8))
+def test_leader_moves_no_more_than_the_plain_voicing(progression):
+  leader = VoiceLeader()
+  previous = []
+  for spec in progression:
+    notes = leader.next(spec)
+    if spec is None:
+      assert notes == []
+    elif previous:
+      assert movement(previous, notes) == min(movement(previous, v) for v in voicings(spec))
+    previous = notes
@@ -0,0 +1,196 @@
+"""
+The stream of pad changes from the connector to the player.
+
+Changes are dicts of pad -> {marker: [y, angle bucket], or None if the marker
+left}, with an empty dict clearing the pad (see :pads.make_debouncer:). They
+can be sent in one of two formats:
+
+json    one json object per line, easy to read and to type by hand.
+binary  length-prefixed frames of fixed size records, one per marker:
+        pad (uint8), marker (uint16), angle bucket (uint8). The y position
+        is not sent (decoded as None), since chords don't depend on it.
+        A latency stamp, if any, follows the records as a float64 and is
+        flagged by the top bit of the length.
+
+and over stdout/stdin (a pipe) or a Unix domain socket that the player listens on.
+"""
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import os
+import select
+import socket
+import struct
+import sys
+import time
+
+import json
+
+from harmonious.latency import STAMP
+
+FORMATS = ('json', 'binary')
+
+LENGTH = struct.Struct('<H')
+RECORD = struct.Struct('<BHB')
+REMOVED = 0xFF  # angle bucket of a marker that left its pad
+CLEARED = 0xFE  # angle bucket of the record that clears a pad (its marker is ignored)
+STAMPED = 0x8000  # flag in the length of a frame that ends with a stamp
+TIME = struct.Struct('<d')
+
+
+def encode_binary(changes: Dict[int, dict]) -> bytes:
+  """
+  >>> decode_binary(encode_binary({0: {25: [0.5, 3], 29: None}, 2: {}})[LENGTH.size:])
+  {0: {25: [None, 3], 29: None}, 2: {}}
+  """
+  records = []
+  for pad, markers in changes.items():
+    if pad == STAMP: continue
+    if not markers:
+      records.append(RECORD.pack(pad, 0, CLEARED))
+    for marker, value in markers.items():
+      records.append(RECORD.pack(pad, marker, REMOVED if value is None else value[1]))
+  payload = b''.join(records)
+  if changes.get(STAMP) is not None:
+    payload += TIME.pack(changes[STAMP])
+    return LENGTH.pack(len(payload) | STAMPED) + payload
+  return LENGTH.pack(len(payload)) + payload
+
+
+def decode_binary(payload: bytes, stamped: bool = False) -> Dict[int, dict]:
+  """decode the payload of a frame (without its length prefix)"""
+  changes = {}
+  if stamped:
+    (changes[STAMP],) = TIME.unpack_from(payload, len(payload) - TIME.size)
+    payload = payload[:-TIME.size]
+  for pad, marker, bucket in RECORD.iter_unpack(payload):
+    markers = changes.setdefault(pad, {})
+    if bucket != CLEARED:
+      markers[marker] = None if bucket == REMOVED else [None, bucket]
+  return changes
+
+
+def _int_keys(d):
+  return {int(k) if k.lstrip('-').isdigit() else k: v for k, v in d.items()}
+
+
+def encode_json(changes: Dict[int, dict]) -> bytes:
+  return (json.dumps(changes) + '\n').encode('utf-8')
+
+
+def decode_json(line) -> Dict[int, dict]:
+  return json.loads(line, object_hook=_int_keys)
+
+
+class Writer:
+  """writes changes to a binary stream in one of the FORMATS"""
+  def __init__(self, stream: BinaryIO, format: str = 'json'):
+    if format not in FORMATS: raise ValueError(f'unknown format {format!r}')
+    self.stream = stream
+    self.encode = encode_json if format == 'json' else encode_binary
+
+  def write(self, changes: Dict[int, dict]):
+    self.stream.write(self.encode(changes))
+    self.stream.flush()
+
+
+def read_frame(stream: BinaryIO) -> Optional[Tuple[bytes, bool]]:
+  """the payload of the next binary frame and whether it is stamped, or None at the end of the stream"""
+  header = stream.read(LENGTH.size)
+  if len(header) < LENGTH.size: return None
+  (length,) = LENGTH.unpack(header)
+  payload = stream.read(length & ~STAMPED)
+  return (payload, bool(length & STAMPED)) if len(payload) == length & ~STAMPED else None
+
+
+def read_changes(stream: BinaryIO, format: str = 'json') -> Iterator[Dict[int, dict]]:
+  """the changes written to a binary stream by a :Writer:, until it ends"""
+  if format not in FORMATS: raise ValueError(f'unknown format {format!r}')
+  if format == 'json':
+    for line in stream:
+      if line.strip(): yield decode_json(line)
+  else:
+    while True:
+      frame = read_frame(stream)
+      if frame is None: return
+      yield decode_binary(*frame)
+
+
+class BatchReader:
+  """
+  Reads changes in batches: everything that is waiting, but never blocking once something is.
+  
+  Reading straight from the file descriptor lets a slow consumer take a whole
+  burst at once and keep only the latest state, instead of falling further
+  behind one message at a time.
+  """
+  def __init__(self, stream: BinaryIO, format: str = 'json', chunk: int = 1 << 16):
+    if format not in FORMATS: raise ValueError(f'unknown format {format!r}')
+    # held for as long as the reader, or closing it would close the fd under us
+    self.stream = stream
+    self.fd = stream.fileno()
+    self.format = format
+    self.chunk = chunk
+    self.buffer = bytearray()
+    self.closed = False
+  
+  def _fill(self):
+    data = os.read(self.fd, self.chunk)
+    if not data: self.closed = True
+    self.buffer += data
+  
+  def _parse(self) -> List[Dict[int, dict]]:
+    changes = []
+    if self.format == 'json':
+      end = self.buffer.rfind(b'\n') + 1
+      lines, self.buffer = bytes(self.buffer[:end]), self.buffer[end:]
+      changes = [decode_json(line) for line in lines.splitlines() if line.strip()]
+    else:
+      start = 0
+      while len(self.buffer) - start >= LENGTH.size:
+        (length,) = LENGTH.unpack_from(self.buffer, start)
+        stamped, length = bool(length & STAMPED), length & ~STAMPED
+        if len(self.buffer) - start - LENGTH.size < length: break
+        changes.append(decode_binary(bytes(self.buffer[start + LENGTH.size:start + LENGTH.size + length]), stamped))
+        start += LENGTH.size + length
+      del self.buffer[:start]
+    return changes
+  
+  def read_batch(self) -> Optional[List[Dict[int, dict]]]:
+    """block until there is at least one change, then take all that are ready; None at the end"""
+    batch = self._parse()
+    while not batch:
+      if self.closed: return None
+      self._fill()
+      batch = self._parse()
+    while not self.closed and select.select([self.fd], [], [], 0)[0]:
+      self._fill()
+      batch += self._parse()
+    return batch
+
+
+def open_output(socket_path: Optional[str] = None, retry: float = 0.5) -> BinaryIO:
+  """stdout, or a connection to the player listening on socket_path (waiting for it to start)"""
+  if socket_path is None: return sys.stdout.buffer
+  while True:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      s.connect(socket_path)
+      return s.makefile('wb')
+    except (FileNotFoundError, ConnectionRefusedError):
+      s.close()
+      time.sleep(retry)
+
+
+def open_input(socket_path: Optional[str] = None) -> BinaryIO:
+  """stdin, or the first connection to a Unix socket listening on socket_path"""
+  # fd 0 itself: a multiprocessing child's sys.stdin is /dev/null
+  if socket_path is None: return open(0, 'rb', closefd=False)
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    os.unlink(socket_path)
+  except FileNotFoundError:
+    pass
+  server.bind(socket_path)
+  server.listen(1)
+  conn, _ = server.accept()
+  server.close()
+  return conn.makefile('rb')
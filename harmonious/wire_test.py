@@ -0,0 +1,52 @@
+import io
+import os
+from hypothesis import given
+import hypothesis.strategies as st
+from harmonious.latency import STAMP
+from harmonious.wire import Writer, BatchReader, read_changes
+
+changes = st.dictionaries(
+  st.integers(min_value=0, max_value=255),
+  st.dictionaries(st.integers(min_value=0, max_value=65535),
+                  st.one_of(st.none(), st.tuples(st.just(None), st.integers(min_value=0, max_value=5)).map(list))),
+  max_size=8)
+
+
+@given(st.lists(changes, max_size=10), st.sampled_from(['json', 'binary']))
+def test_formats_round_trip(updates, format):
+  stream = io.BytesIO()
+  writer = Writer(stream, format)
+  for u in updates:
+    writer.write(u)
+  stream.seek(0)
+  assert list(read_changes(stream, format)) == updates
+
+
+def test_truncated_binary_frame_ends_the_stream():
+  stream = io.BytesIO()
+  Writer(stream, 'binary').write({0: {25: [0.5, 1]}})
+  data = stream.getvalue()
+  assert list(read_changes(io.BytesIO(data[:-1]), 'binary')) == []
+
+
+def test_batch_reader_takes_everything_waiting():
+  for format in ('json', 'binary'):
+    r, w = os.pipe()
+    with os.fdopen(w, 'wb') as out, os.fdopen(r, 'rb') as stream:
+      writer = Writer(out, format)
+      reader = BatchReader(stream, format, chunk=5)
+      for marker in range(3):
+        writer.write({0: {marker: [0.5, 1]}})
+      assert reader.read_batch() == [{0: {m: [0.5 if format == 'json' else None, 1]}} for m in range(3)]
+      writer.write({1: {}})
+      out.close()
+      assert reader.read_batch() == [{1: {}}]
+      assert reader.read_batch() is None
+
+
+@given(changes, st.floats(min_value=0, max_value=1e6), st.sampled_from(['json', 'binary']))
+def test_stamp_round_trips(update, stamp, format):
+  stream = io.BytesIO()
+  Writer(stream, format).write({**update, STAMP: stamp})
+  stream.seek(0)
+  assert list(read_changes(stream, format)) == [{**update, STAMP: stamp}]